@@ -1,24 +1,62 @@
-from flask import Flask, jsonify, request, make_response, render_template, send_from_directory
+from flask import Flask, jsonify, request, make_response, render_template, send_from_directory, g, Response
 from flask_cors import CORS
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import DataError, Error, IntegrityError
 from dotenv import load_dotenv
 import os
+import base64
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from functools import wraps
 import jwt
-from datetime import datetime, timedelta
-import bcrypt
+import numpy as np
+from datetime import datetime, timedelta, timezone
+
+import attendance
+import cache
+import compression
+import db
+import forecast
+import heatmap
+import json_provider
+import logs
+import metrics
+import passwords
+import permissions
+import slowlog
+import streaming
+import queries
+import search
+import tokens
 
 # Cargar variables de entorno
 load_dotenv()
 
-app = Flask(__name__)
+# Registro estructurado: JSON por línea, escrito desde un hilo en segundo plano
+logs.configure_logging(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    json_output=os.getenv('LOG_FORMAT', 'json') == 'json',
+    sample_rates=logs.parse_sample_rates(os.getenv('LOG_SAMPLING', 'gym.auth=0.1')),
+    queue_size=int(os.getenv('LOG_QUEUE_SIZE', 10000))
+)
+logger = logging.getLogger('gym.api')
+auth_logger = logging.getLogger('gym.auth')
+
+# /static lo sirve serve_static (con compresión y caché), no la ruta de Flask
+app = Flask(__name__, static_folder=None)
+app.json = json_provider.GymJSONProvider(app)
 
 # Configuración de la aplicación
 app.config.update(
     # Configuración de JWT
     SECRET_KEY=os.getenv('SECRET_KEY', 'clave_secreta_predeterminada_cambiar_en_produccion'),
-    JWT_ACCESS_TOKEN_EXPIRES=timedelta(hours=1),
+    JWT_ACCESS_TOKEN_EXPIRES=timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', 15))),
+    JWT_REFRESH_TOKEN_EXPIRES=timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_DAYS', 30))),
     JWT_ALGORITHM='HS256',
     
     # Configuración de CORS
@@ -26,7 +64,112 @@ app.config.update(
     CORS_METHODS=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
     CORS_ALLOW_HEADERS=['Content-Type', 'Authorization'],
     CORS_EXPOSE_HEADERS=['Content-Type', 'Authorization'],
-    CORS_SUPPORTS_CREDENTIALS=True
+    CORS_SUPPORTS_CREDENTIALS=True,
+
+    # Configuración del pool de conexiones
+    DB_POOL_SIZE=int(os.getenv('DB_POOL_SIZE', 5)),
+    DB_POOL_MAX_OVERFLOW=int(os.getenv('DB_POOL_MAX_OVERFLOW', 10)),
+    DB_POOL_RECYCLE=int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    DB_POOL_TIMEOUT=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+    DB_POOL_PRE_PING=os.getenv('DB_POOL_PRE_PING', '1') == '1',
+    DB_POOL_PING_INTERVAL=float(os.getenv('DB_POOL_PING_INTERVAL', 30)),
+    DB_POOL_MAX_STATEMENTS=int(os.getenv('DB_POOL_MAX_STATEMENTS', 128)),
+
+    # Caché de tokens verificados
+    TOKEN_CACHE_SIZE=int(os.getenv('TOKEN_CACHE_SIZE', 1024)),
+    TOKEN_CACHE_TTL=int(os.getenv('TOKEN_CACHE_TTL', 300)),
+    TOKEN_VERSION_REFRESH=int(os.getenv('TOKEN_VERSION_REFRESH', 30)),
+    RBAC_REFRESH=int(os.getenv('RBAC_REFRESH', 30)),
+
+    # Índice de búsqueda de miembros
+    SEARCH_REFRESH=int(os.getenv('SEARCH_REFRESH', 30)),
+    SEARCH_REBUILD_INTERVAL=int(os.getenv('SEARCH_REBUILD_INTERVAL', 3600)),
+
+    # Panel de estadísticas
+    DASHBOARD_CACHE_TTL=int(os.getenv('DASHBOARD_CACHE_TTL', 30)),
+    DASHBOARD_WORKERS=int(os.getenv('DASHBOARD_WORKERS', 4)),
+    DASHBOARD_DIAS_VENCIMIENTO=int(os.getenv('DASHBOARD_DIAS_VENCIMIENTO', 7)),
+    INVENTARIO_STOCK_MINIMO=int(os.getenv('INVENTARIO_STOCK_MINIMO', 5)),
+
+    # Pool de procesos para bcrypt
+    BCRYPT_ROUNDS=int(os.getenv('BCRYPT_ROUNDS', 12)),
+    BCRYPT_WORKERS=int(os.getenv('BCRYPT_WORKERS', min(2, os.cpu_count() or 1))),
+    BCRYPT_MAX_PENDING=int(os.getenv('BCRYPT_MAX_PENDING', 16)),
+    BCRYPT_TIMEOUT=float(os.getenv('BCRYPT_TIMEOUT', 10)),
+
+    # Token opcional para proteger /api/metrics
+    METRICS_TOKEN=os.getenv('METRICS_TOKEN'),
+
+    # Registro de consultas lentas (0 lo desactiva)
+    SLOW_QUERY_THRESHOLD_MS=float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200)),
+    SLOW_QUERY_LOG=os.getenv('SLOW_QUERY_LOG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'slow_queries.log')),
+    SLOW_QUERY_LOG_MAX_BYTES=int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', 5 * 1024 * 1024)),
+    SLOW_QUERY_LOG_BACKUPS=int(os.getenv('SLOW_QUERY_LOG_BACKUPS', 5)),
+
+    # Filas leídas por bloque en las respuestas NDJSON/CSV
+    STREAM_CHUNK_SIZE=int(os.getenv('STREAM_CHUNK_SIZE', 500)),
+
+    # Serializar las respuestas con orjson si está instalado
+    JSON_USE_ORJSON=os.getenv('JSON_USE_ORJSON', '1') == '1',
+
+    # Compresión de respuestas (gzip/brotli) y caché de estáticos comprimidos
+    COMPRESS_MIN_SIZE=int(os.getenv('COMPRESS_MIN_SIZE', 1024)),
+    COMPRESS_LEVEL=int(os.getenv('COMPRESS_LEVEL', 6)),
+    COMPRESS_BROTLI_QUALITY=int(os.getenv('COMPRESS_BROTLI_QUALITY', 4)),
+    STATIC_CACHE_MAX_BYTES=int(os.getenv('STATIC_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+
+    # Sincronización incremental: margen por transacciones lentas y días que
+    # se guardan los registros eliminados
+    SYNC_OVERLAP_SECONDS=int(os.getenv('SYNC_OVERLAP_SECONDS', 5)),
+    SYNC_TOMBSTONE_DAYS=int(os.getenv('SYNC_TOMBSTONE_DAYS', 30)),
+
+    # Entradas y salidas: escritura diferida en lotes con diario en disco
+    ASISTENCIAS_FLUSH_INTERVAL=float(os.getenv('ASISTENCIAS_FLUSH_INTERVAL', 1.0)),
+    ASISTENCIAS_BATCH_SIZE=int(os.getenv('ASISTENCIAS_BATCH_SIZE', 200)),
+    ASISTENCIAS_JOURNAL_DIR=os.getenv('ASISTENCIAS_JOURNAL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'asistencias_journal')),
+    ASISTENCIAS_JOURNAL_FSYNC=os.getenv('ASISTENCIAS_JOURNAL_FSYNC', '1') == '1',
+    ASISTENCIAS_REFRESH=int(os.getenv('ASISTENCIAS_REFRESH', 30)),
+
+    # Ocupación en vivo: aforo (0 = sin límite), segundos entre keepalives del
+    # stream SSE y duración máxima de cada conexión (el navegador reconecta)
+    AFORO_MAXIMO=int(os.getenv('AFORO_MAXIMO', 0)),
+    OCUPACION_KEEPALIVE=int(os.getenv('OCUPACION_KEEPALIVE', 15)),
+    OCUPACION_STREAM_MAX_SECONDS=int(os.getenv('OCUPACION_STREAM_MAX_SECONDS', 300)),
+
+    # Días del resumen diario de asistencias que el job nocturno reconstruye
+    ASISTENCIAS_DIARIAS_DIAS=int(os.getenv('ASISTENCIAS_DIARIAS_DIAS', 7)),
+
+    # Mapa de calor de ocupación: caché de los rangos ya cerrados (los que
+    # incluyen hoy usan DASHBOARD_CACHE_TTL), duración máxima de una estancia
+    # (salidas olvidadas) y días máximos por consulta
+    HEATMAP_CACHE_TTL=int(os.getenv('HEATMAP_CACHE_TTL', 3600)),
+    HEATMAP_MAX_ESTANCIA_MINUTOS=int(os.getenv('HEATMAP_MAX_ESTANCIA_MINUTOS', 240)),
+    HEATMAP_MAX_DIAS=int(os.getenv('HEATMAP_MAX_DIAS', 366)),
+
+    # Pronóstico de ocupación: semanas de historia, días pronosticados y
+    # horas tras las que se recalcula aunque el job nocturno no haya corrido
+    PRONOSTICO_SEMANAS=int(os.getenv('PRONOSTICO_SEMANAS', 12)),
+    PRONOSTICO_DIAS=int(os.getenv('PRONOSTICO_DIAS', 14)),
+    PRONOSTICO_VIGENCIA_HORAS=int(os.getenv('PRONOSTICO_VIGENCIA_HORAS', 36))
+)
+
+streaming.chunk_size = app.config['STREAM_CHUNK_SIZE']
+app.json.use_orjson = app.config['JSON_USE_ORJSON'] and json_provider.orjson is not None
+
+compression.configure(
+    app.config['COMPRESS_MIN_SIZE'],
+    level=app.config['COMPRESS_LEVEL'],
+    quality=app.config['COMPRESS_BROTLI_QUALITY'],
+    static_cache_bytes=app.config['STATIC_CACHE_MAX_BYTES']
+)
+# Se registra primero para ejecutarse al final, con los encabezados ya puestos
+app.after_request(compression.compress_response)
+
+slowlog.configure(
+    app.config['SLOW_QUERY_THRESHOLD_MS'],
+    path=app.config['SLOW_QUERY_LOG'],
+    max_bytes=app.config['SLOW_QUERY_LOG_MAX_BYTES'],
+    backups=app.config['SLOW_QUERY_LOG_BACKUPS']
 )
 
 # Configuración de CORS simplificada
@@ -37,29 +180,169 @@ CORS(app,
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"]
 )
 
-# Configuración de la base de datos
+@app.before_request
+def asignar_request_id():
+    """Correlaciona los registros de una solicitud con un id único"""
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.inicio_solicitud = time.perf_counter()
+
+# Tablas que modifica cada grupo de rutas, para invalidar la caché de resultados
+TABLAS_POR_RUTA = {
+    '/api/miembros': ('miembros',),
+    '/api/facturas': ('facturas',),
+    '/api/inventario': ('inventario',),
+    '/api/clases': ('clases',),
+    '/api/asistencias': ('asistencias',),
+}
+
+@app.after_request
+def invalidar_cache(response):
+    """Una escritura exitosa invalida los resultados que dependen de sus tablas"""
+    if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400:
+        for prefijo, tablas in TABLAS_POR_RUTA.items():
+            if request.path == prefijo or request.path.startswith(prefijo + '/'):
+                result_cache.invalidate(*tablas)
+    return response
+
+@app.after_request
+def devolver_request_id(response):
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    inicio = g.get('inicio_solicitud')
+    if inicio is not None:
+        # Se agrupa por la regla de la ruta, no por la URL, para acotar las series
+        ruta = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_request(request.method, ruta, response.status_code,
+                                time.perf_counter() - inicio)
+    return response
+
+# Pool de conexiones a la base de datos
+db.configure_pool(
+    {
+        'host': os.getenv('DB_HOST'),
+        'user': os.getenv('DB_USER'),
+        'password': os.getenv('DB_PASSWORD') or None,
+        'database': os.getenv('DB_NAME'),
+        'auth_plugin': 'mysql_native_password',
+        'connection_timeout': 5
+    },
+    size=app.config['DB_POOL_SIZE'],
+    max_overflow=app.config['DB_POOL_MAX_OVERFLOW'],
+    recycle=app.config['DB_POOL_RECYCLE'],
+    timeout=app.config['DB_POOL_TIMEOUT'],
+    pre_ping=app.config['DB_POOL_PRE_PING'],
+    ping_interval=app.config['DB_POOL_PING_INTERVAL'],
+    max_statements=app.config['DB_POOL_MAX_STATEMENTS']
+)
+
+# Hash y verificación de contraseñas fuera de los hilos de solicitud
+password_hasher = passwords.PasswordHasher(
+    workers=app.config['BCRYPT_WORKERS'],
+    max_pending=app.config['BCRYPT_MAX_PENDING'],
+    rounds=app.config['BCRYPT_ROUNDS'],
+    timeout=app.config['BCRYPT_TIMEOUT']
+)
+
+def respuesta_hasher_saturado():
+    return jsonify({
+        'success': False,
+        'error': 'service_busy',
+        'message': 'El servidor está ocupado, intente nuevamente en unos segundos'
+    }), 503, {'Retry-After': '2'}
+
 def get_db_connection():
+    """Toma una conexión del pool; devuelve None si no hay conexión disponible"""
     try:
-        print("Intentando conectar a la base de datos...")
-        print(f"Host: {os.getenv('DB_HOST')}")
-        print(f"Usuario: {os.getenv('DB_USER')}")
-        print(f"Base de datos: {os.getenv('DB_NAME')}")
-        
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD') or None,
-            database=os.getenv('DB_NAME'),
-            auth_plugin='mysql_native_password',
-            connection_timeout=5
-        )
-        print("Conexión exitosa a la base de datos")
-        return connection
+        return db.get_pool().acquire()
     except Error as e:
-        error_msg = f"Error al conectar a la base de datos: {e}"
-        print(error_msg)
+        logger.error("Error al conectar a la base de datos: %s", e)
         return None
 
+@contextmanager
+def db_connection():
+    """Presta una conexión del pool durante el bloque y la devuelve al salir"""
+    connection = get_db_connection()
+    try:
+        yield connection
+    finally:
+        if connection:
+            connection.close()
+
+# Claims de tokens ya verificados, para no recalcular la firma en cada solicitud
+token_cache = tokens.TokenCache(
+    max_size=app.config['TOKEN_CACHE_SIZE'],
+    ttl=app.config['TOKEN_CACHE_TTL']
+)
+
+# Versiones vigentes de los tokens por miembro
+token_versions = tokens.TokenVersions(refresh_interval=app.config['TOKEN_VERSION_REFRESH'])
+
+def refrescar_versiones_token():
+    """Recarga desde la base de datos las versiones de token de los miembros"""
+    def cargar():
+        with db.connection() as connection:
+            return queries.fetch_all(connection, 'miembros_token_versiones', dictionary=False)
+    try:
+        token_versions.refresh(cargar)
+    except Error as e:
+        logger.error("Error al recargar versiones de token: %s", e)
+
+def verificar_version_token(miembro_id):
+    """
+    Lee la versión vigente de un miembro al verificar un token que no estaba
+    en caché, así una revocación hecha en otro worker vale al momento. Un
+    miembro eliminado no acepta ningún token
+    """
+    with db.connection() as connection:
+        fila = queries.fetch_one(connection, 'miembro_token_version', (miembro_id,))
+    token_versions.bump(miembro_id, fila['token_version'] if fila else float('inf'))
+
+def cargar_permisos(version_actual):
+    """Lee roles y permisos si el contador permisos_version cambió"""
+    with db.connection() as connection:
+        fila = queries.fetch_one(connection, 'permisos_version')
+        version = fila['version'] if fila else 0
+        if version == version_actual:
+            return None
+        return (
+            version,
+            queries.fetch_all(connection, 'permisos_listar', dictionary=False),
+            queries.fetch_all(connection, 'rol_permisos_listar', dictionary=False)
+        )
+
+# Máscaras de permisos por rol, en memoria
+permission_engine = permissions.PermissionEngine(cargar_permisos, refresh_interval=app.config['RBAC_REFRESH'])
+
+def cargar_indice_miembros(desde):
+    """
+    Miembros para el índice de búsqueda: todos, o los modificados y los
+    eliminados (según sync_eliminados) desde ``desde``
+    """
+    with db.connection() as connection:
+        if desde is None:
+            return queries.fetch_all(connection, 'miembros_indice_busqueda'), []
+        filas = queries.fetch_all(connection, 'miembros_indice_cambios', (desde,))
+        eliminados = queries.fetch_all(connection, 'miembros_indice_eliminados', (desde,))
+    return filas, eliminados
+
+member_index = search.MemberIndex(cargar_indice_miembros, refresh_interval=app.config['SEARCH_REFRESH'],
+                                  rebuild_interval=app.config['SEARCH_REBUILD_INTERVAL'])
+
+# Resultados agregados (panel de estadísticas) invalidados por escrituras
+result_cache = cache.ResultCache(ttl=app.config['DASHBOARD_CACHE_TTL'])
+
+# Hilos para ejecutar en paralelo consultas independientes, cada una con su
+# propia conexión del pool
+query_executor = ThreadPoolExecutor(max_workers=app.config['DASHBOARD_WORKERS'],
+                                    thread_name_prefix='consultas')
+
+def consultas_en_paralelo(tareas):
+    """Ejecuta ``{nombre: funcion(connection)}`` en paralelo y devuelve ``{nombre: resultado}``"""
+    def ejecutar(funcion):
+        with db.connection() as connection:
+            return funcion(connection)
+    futuros = {nombre: query_executor.submit(ejecutar, funcion) for nombre, funcion in tareas.items()}
+    return {nombre: futuro.result() for nombre, futuro in futuros.items()}
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -68,25 +351,28 @@ def token_required(f):
         if request.path in public_routes:
             return f(None, *args, **kwargs)
             
-        print("\n--- token_required iniciado ---")
         token = None
         
         # Obtener el token del header
         auth_header = request.headers.get('Authorization', '')
         
+        # EventSource no puede enviar encabezados: los streams SSE aceptan ?access_token=
+        sse_routes = ['/api/asistencias/ocupacion/stream']
+        if not auth_header and request.path in sse_routes and request.args.get('access_token'):
+            auth_header = 'Bearer ' + request.args['access_token']
+        
         # Verificar el formato del token
         if auth_header.startswith('Bearer '):
             token = auth_header.split(" ")[1]
-            print(f"Token extraído: {token[:10]}...")
         else:
-            print("Error: Formato de token inválido")
+            auth_logger.info("Formato de token inválido")
             return jsonify({
                 'success': False,
                 'message': 'Formato de token inválido. Use: Bearer <token>'
             }), 401
         
         if not token:
-            print("Error: No se proporcionó token")
+            auth_logger.info("No se proporcionó token")
             return jsonify({
                 'success': False,
                 'message': 'Se requiere un token para acceder a este recurso',
@@ -94,23 +380,45 @@ def token_required(f):
             }), 401
             
         try:
-            print("Validando token...")
-            # Decodificar el token
-            data = jwt.decode(
-                token,
-                app.config['SECRET_KEY'],
-                algorithms=['HS256'],
-                options={"verify_exp": True}
-            )
+            # Verificar la firma solo si el token no está en caché
+            data = token_cache.get(token)
+            nuevo = data is None
+            if nuevo:
+                data = jwt.decode(
+                    token,
+                    app.config['SECRET_KEY'],
+                    algorithms=['HS256'],
+                    options={"verify_exp": True}
+                )
             
-            current_user = data.get('email')
+            current_user = tokens.Principal.from_claims(data)
             if not current_user:
-                raise jwt.InvalidTokenError('Email no encontrado en el token')
-                
-            print(f"Token válido para el usuario: {current_user}")
+                raise jwt.InvalidTokenError('Identidad no encontrada en el token')
+            if nuevo:
+                verificar_version_token(current_user.id)
+                token_cache.put(token, data)
+            
+            if token_cache.is_revoked(token):
+                auth_logger.warning("Token revocado para el usuario: %s", current_user.email)
+                return jsonify({
+                    'success': False,
+                    'message': 'Token revocado',
+                    'error': 'token_revoked'
+                }), 401
+            
+            # El rol o el estado del miembro cambió después de emitir el token
+            if token_versions.needs_refresh():
+                refrescar_versiones_token()
+            if token_versions.is_outdated(current_user):
+                auth_logger.info("Token desactualizado para el usuario: %s", current_user.email)
+                return jsonify({
+                    'success': False,
+                    'message': 'Token desactualizado, inicie sesión nuevamente',
+                    'error': 'token_outdated'
+                }), 401
             
         except jwt.ExpiredSignatureError:
-            print("Error: Token expirado")
+            auth_logger.info("Token expirado")
             return jsonify({
                 'success': False,
                 'message': 'Token expirado',
@@ -118,7 +426,7 @@ def token_required(f):
             }), 401
             
         except jwt.InvalidTokenError as e:
-            print(f"Error: Token inválido - {str(e)}")
+            auth_logger.warning("Token inválido: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Token inválido',
@@ -126,7 +434,7 @@ def token_required(f):
             }), 401
             
         except Exception as e:
-            print(f"Error inesperado al validar token: {str(e)}")
+            auth_logger.exception("Error inesperado al validar token")
             return jsonify({
                 'success': False,
                 'message': 'Error al procesar la autenticación',
@@ -138,12 +446,135 @@ def token_required(f):
     
     return decorated
 
+def requires(*permisos):
+    """Exige que el rol del usuario tenga todos los permisos indicados.
+    Se aplica debajo de @token_required."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            try:
+                permission_engine.refresh()
+            except Error as e:
+                logger.error("Error al cargar permisos: %s", e)
+                if not permission_engine.loaded:
+                    return jsonify({'error': 'Error al conectar a la base de datos'}), 503
+            
+            if not permission_engine.allows(current_user.role, *permisos):
+                return jsonify({
+                    'success': False,
+                    'message': 'No tiene permiso para realizar esta acción',
+                    'error': 'forbidden'
+                }), 403
+            
+            return f(current_user, *args, **kwargs)
+        
+        return decorated
+    
+    return decorator
+
+def conditional_get(*tablas):
+    """
+    GET condicional a partir de los contadores de versión de ``tablas``.
+
+    El ETag combina la URL, el formato pedido y las versiones que mantienen
+    los triggers de ``tablas_version``; si coincide con If-None-Match (o no
+    hubo cambios desde If-Modified-Since) se responde 304 sin ejecutar la
+    consulta principal. Se aplica debajo de @token_required/@requires.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if streaming.requested_format():
+                return f(*args, **kwargs)
+            try:
+                with db.connection() as connection:
+                    filas = queries.fetch_all(connection, 'tablas_version_listar')
+            except Error as e:
+                logger.error("Error al leer las versiones de tablas: %s", e)
+                return f(*args, **kwargs)
+            versiones = {fila['tabla']: fila for fila in filas}
+            if any(tabla not in versiones for tabla in tablas):
+                return f(*args, **kwargs)
+            
+            clave = '|'.join([request.full_path, request.headers.get('Accept', '')] +
+                             [f"{tabla}:{versiones[tabla]['version']}" for tabla in tablas])
+            etag = hashlib.sha1(clave.encode('utf-8')).hexdigest()[:20]
+            modificado = max(versiones[tabla]['actualizado'] for tabla in tablas)
+            
+            if request.if_none_match:
+                vigente = request.if_none_match.contains_weak(etag)
+            else:
+                vigente = (request.if_modified_since is not None and modificado is not None and
+                           modificado.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since)
+            if vigente:
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if modificado is not None:
+                response.last_modified = modificado.replace(tzinfo=timezone.utc)
+            # Datos autenticados: el navegador guarda la copia pero revalida siempre
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        
+        return decorated
+    
+    return decorator
+
+def crear_access_token(connection, user):
+    """Genera un access token JWT con la identidad del miembro"""
+    permission_engine.refresh()
+    principal = tokens.Principal(
+        id=user['id'],
+        email=user['email'],
+        role=user['rol_nombre'],
+        permissions=permission_engine.permissions_of(user['rol_nombre']),
+        version=user.get('token_version', 0)
+    )
+    ahora = datetime.utcnow()
+    claims = principal.to_claims()
+    claims.update({
+        'iat': ahora,
+        'exp': ahora + app.config['JWT_ACCESS_TOKEN_EXPIRES']
+    })
+    return jwt.encode(claims, app.config['SECRET_KEY'])
+
+def emitir_tokens(connection, user, familia=None):
+    """
+    Genera un access token y un refresh token nuevo para el miembro.
+    Sin ``familia`` se abre una sesión nueva; con ella se rota la existente.
+    El llamador confirma la transacción.
+    """
+    refresh_token, digest = tokens.new_refresh_token()
+    queries.execute(connection, 'refresh_token_insertar', (
+        user['id'],
+        digest,
+        familia or tokens.new_session_family(),
+        datetime.now() + app.config['JWT_REFRESH_TOKEN_EXPIRES']
+    ))
+    return {
+        'token': crear_access_token(connection, user),
+        'refresh_token': refresh_token,
+        'expires_in': int(app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds())
+    }
+
+def revocar_sesiones(connection, miembro_id, email):
+    """
+    Revoca todos los refresh tokens y access tokens vigentes de un miembro y
+    devuelve su token_version nueva. El llamador confirma la transacción y
+    después registra la versión con ``token_versions.bump``
+    """
+    queries.execute(connection, 'refresh_tokens_revocar_miembro', (miembro_id,))
+    queries.execute(connection, 'miembro_revocar_tokens', (miembro_id,))
+    token_cache.revoke_user(email)
+    return queries.fetch_one(connection, 'miembro_token_version', (miembro_id,))['token_version']
+
 # Ruta de autenticación
 @app.route('/api/auth/login', methods=['POST'])
 def login():
-    print("Solicitud recibida en /api/auth/login")
-    print("Headers:", request.headers)
-    print("JSON recibido:", request.json)
     
     if request.method == 'OPTIONS':
         return jsonify({}), 200
@@ -153,170 +584,273 @@ def login():
     if not auth or not auth.get('email') or not auth.get('password'):
         return jsonify({'error': 'Email y contraseña son requeridos'}), 400
     
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({"error": "Error al conectar a la base de datos"}), 500
-    
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT m.*, r.nombre as rol_nombre 
-            FROM miembros m 
-            JOIN roles r ON m.rol_id = r.id 
-            WHERE m.email = %s
-        """, (auth['email'].lower(),))  # Convertir email a minúsculas
-        
-        user = cursor.fetchone()
+        # La conexión se devuelve antes de verificar con bcrypt: una ráfaga
+        # de inicios de sesión no debe agotar el pool del resto de la API
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
+            user = queries.fetch_one(connection, 'usuario_por_email',
+                                     (auth['email'].lower(),))  # Convertir email a minúsculas
         
         if not user:
             # No revelar si el usuario existe o no por seguridad
             return jsonify({'error': 'Credenciales inválidas'}), 401
         
         # Verificar la contraseña con bcrypt
+        nuevo_hash = None
         try:
             # Verificar si el hash parece ser de bcrypt (debería comenzar con $2b$)
             if not user['password_hash'].startswith('$2b$'):
-                print("Error: La contraseña no está hasheada correctamente")
+                auth_logger.error("Hash de contraseña con formato inválido para el usuario: %s", user['email'])
                 return jsonify({
                     'success': False,
                     'error': 'invalid_password_format',
                     'message': 'La contraseña no está en el formato correcto. Contacte al administrador.'
                 }), 500
-                
+            
             # Verificar la contraseña
-            if not bcrypt.checkpw(auth['password'].encode('utf-8'), user['password_hash'].encode('utf-8')):
-                print("Error de autenticación: contraseña incorrecta")
+            if not password_hasher.verify(auth['password'], user['password_hash']):
+                auth_logger.info("Contraseña incorrecta para el usuario: %s", user['email'])
                 return jsonify({
                     'success': False,
                     'error': 'invalid_credentials',
                     'message': 'Credenciales inválidas'
                 }), 401
-                
+            
+            # Regenerar el hash si se creó con otro factor de costo
+            if password_hasher.needs_rehash(user['password_hash']):
+                try:
+                    nuevo_hash = password_hasher.hash(auth['password'])
+                except passwords.HasherBusyError:
+                    pass  # Se reintentará en el próximo inicio de sesión
+            
+        except passwords.HasherBusyError as e:
+            logger.warning("Error al verificar contraseña: %s", e)
+            return respuesta_hasher_saturado()
         except Exception as e:
-            print(f"Error al verificar contraseña: {str(e)}")
+            logger.exception("Error al verificar contraseña")
             return jsonify({
                 'success': False,
                 'error': 'authentication_error',
                 'message': f'Error en la autenticación: {str(e)}'
             }), 500
         
-        # Generar token JWT
-        token = jwt.encode({
-            'email': user['email'],
-            'exp': datetime.utcnow() + app.config['JWT_ACCESS_TOKEN_EXPIRES']
-        }, app.config['SECRET_KEY'])
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
+            if nuevo_hash:
+                queries.execute(connection, 'miembro_actualizar_password', (nuevo_hash, user['id']))
+            # Generar el access token y abrir una nueva cadena de refresh tokens
+            sesion = emitir_tokens(connection, user)
+            connection.commit()
         
         # Eliminar datos sensibles
         user.pop('password_hash', None)
         
-        print(f"Inicio de sesión exitoso para el usuario: {user['email']}")
+        auth_logger.info("Inicio de sesión exitoso para el usuario: %s", user['email'])
         
         return jsonify({
             'message': 'Inicio de sesión exitoso',
-            'token': token,
-            'user': user
+            'user': user,
+            **sesion
         })
+    
+    except Exception as e:
+        logger.exception("Error en login")
+        return jsonify({"error": "Error en el servidor"}), 500
+
+# Ruta para renovar el access token sin volver a enviar la contraseña
+@app.route('/api/auth/refresh', methods=['POST'])
+def refresh():
+    data = request.get_json(silent=True) or {}
+    refresh_token = data.get('refresh_token')
+    if not refresh_token:
+        return jsonify({'error': 'refresh_token es requerido'}), 400
+    
+    try:
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
+        
+            actual = queries.fetch_one(connection, 'refresh_token_por_hash',
+                                       (tokens.token_digest(refresh_token),))
+            if not actual:
+                return jsonify({
+                    'success': False,
+                    'message': 'Refresh token inválido',
+                    'error': 'invalid_refresh_token'
+                }), 401
+        
+            # Rotar: el token usado queda revocado. Si ya estaba revocado alguien
+            # lo reutilizó, así que se invalida toda la sesión
+            rotado = (not actual['revocado'] and
+                      queries.execute(connection, 'refresh_token_rotar', (actual['id'],)).rowcount == 1)
+            if not rotado:
+                queries.execute(connection, 'refresh_tokens_revocar_familia', (actual['familia'],))
+                connection.commit()
+                auth_logger.warning("Refresh token reutilizado para el usuario: %s", actual['email'])
+                return jsonify({
+                    'success': False,
+                    'message': 'Refresh token revocado',
+                    'error': 'token_revoked'
+                }), 401
+        
+            if actual['expira'] < datetime.now() or not actual['activo']:
+                connection.commit()
+                return jsonify({
+                    'success': False,
+                    'message': 'Sesión expirada, inicie sesión nuevamente',
+                    'error': 'token_expired'
+                }), 401
+        
+            user = {
+                'id': actual['miembro_id'],
+                'email': actual['email'],
+                'rol_id': actual['rol_id'],
+                'rol_nombre': actual['rol_nombre'],
+                'token_version': actual['token_version']
+            }
+            sesion = emitir_tokens(connection, user, familia=actual['familia'])
+            connection.commit()
+            return jsonify(sesion), 200
         
     except Exception as e:
-        print(f"Error en login: {e}")
+        logger.exception("Error al renovar token")
+        return jsonify({"error": "Error en el servidor"}), 500
+
+# Ruta para cerrar sesión: revoca el access token y la sesión de refresh
+@app.route('/api/auth/logout', methods=['POST'])
+@token_required
+def logout(current_user):
+    token = request.headers.get('Authorization', '').split(" ")[1]
+    # La firma ya fue verificada por token_required; solo se necesita el exp
+    data = jwt.decode(token, options={"verify_signature": False})
+    token_cache.revoke(token, data.get('exp'))
+    
+    refresh_token = (request.get_json(silent=True) or {}).get('refresh_token')
+    if refresh_token:
+        try:
+            with db_connection() as connection:
+                if not connection:
+                    return jsonify({"error": "Error al conectar a la base de datos"}), 500
+                actual = queries.fetch_one(connection, 'refresh_token_por_hash',
+                                           (tokens.token_digest(refresh_token),))
+                if actual and actual['miembro_id'] == current_user.id:
+                    queries.execute(connection, 'refresh_tokens_revocar_familia', (actual['familia'],))
+                    connection.commit()
+        except Exception as e:
+            logger.exception("Error al revocar refresh token")
+    
+    return jsonify({'message': 'Sesión cerrada exitosamente'}), 200
+
+# Ruta para cambiar la contraseña: cierra todas las sesiones del miembro
+@app.route('/api/auth/password', methods=['PUT'])
+@token_required
+def cambiar_password(current_user):
+    data = request.get_json(silent=True) or {}
+    actual = data.get('password_actual')
+    nueva = data.get('password_nueva')
+    if not actual or not nueva:
+        return jsonify({'error': 'password_actual y password_nueva son requeridos'}), 400
+    if len(nueva) < 6:
+        return jsonify({"error": "La contraseña debe tener al menos 6 caracteres"}), 400
+    
+    try:
+        # bcrypt se ejecuta sin tener una conexión del pool prestada
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
+            user = queries.fetch_one(connection, 'miembro_credenciales', (current_user.id,))
+        if not user or not user['password_hash']:
+            return jsonify({'error': 'Usuario no encontrado'}), 404
+        
+        if not password_hasher.verify(actual, user['password_hash']):
+            return jsonify({
+                'success': False,
+                'error': 'invalid_credentials',
+                'message': 'Credenciales inválidas'
+            }), 401
+        nuevo_hash = password_hasher.hash(nueva)
+        
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
+            queries.execute(connection, 'miembro_actualizar_password', (nuevo_hash, current_user.id))
+            version = revocar_sesiones(connection, current_user.id, current_user.email)
+        
+            # La sesión actual continúa con tokens nuevos
+            sesion = emitir_tokens(connection, dict(user, token_version=version))
+            connection.commit()
+            token_versions.bump(current_user.id, version)
+            return jsonify({'message': 'Contraseña actualizada exitosamente', **sesion}), 200
+        
+    except passwords.HasherBusyError as e:
+        logger.warning("Error al cambiar contraseña: %s", e)
+        return respuesta_hasher_saturado()
+    except Exception as e:
+        logger.exception("Error al cambiar contraseña")
         return jsonify({"error": "Error en el servidor"}), 500
-    finally:
-        if connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 # Ruta para obtener información del usuario actual
 @app.route('/api/auth/me', methods=['GET'])
 @token_required
 def get_current_user(current_user):
-    print(f"\n--- Iniciando get_current_user ---")
-    print(f"Usuario recibido del token: {current_user}")
+    logger.debug("Obteniendo usuario actual: %s", current_user)
     
     try:
-        print("Conectando a la base de datos...")
-        connection = get_db_connection()
-        if not connection:
-            print("Error: No se pudo conectar a la base de datos")
-            return jsonify({"error": "Error al conectar a la base de datos"}), 500
-        
-        print("Conexión exitosa a la base de datos")
-        cursor = connection.cursor(dictionary=True)
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
         
-        print(f"Ejecutando consulta para el usuario: {current_user}")
-        query = """
-            SELECT m.*, r.nombre as rol_nombre 
-            FROM miembros m 
-            JOIN roles r ON m.rol_id = r.id 
-            WHERE m.email = %s
-        """
-        print(f"Query: {query}")
-        print(f"Parámetros: ({current_user},)")
+            # El rol viene en el token; solo se leen los datos de perfil
+            user = queries.fetch_one(connection, 'miembro_perfil', (current_user.id,))
         
-        cursor.execute(query, (current_user,))
-        user = cursor.fetchone()
-        
-        if not user:
-            print(f"Usuario no encontrado en la base de datos: {current_user}")
-            return jsonify({'error': 'Usuario no encontrado'}), 404
+            if not user:
+                logger.warning("Usuario no encontrado en la base de datos: %s", current_user)
+                return jsonify({'error': 'Usuario no encontrado'}), 404
             
-        print(f"Usuario encontrado en BD: {user}")
-        
-        # Mapear el rol al formato que espera el frontend
-        role_map = {
-            'admin': 'admin',
-            'entrenador': 'trainer',
-            'recepcionista': 'receptionist',
-            'cliente': 'client'
-        }
-        
-        # Asegurarse de que el rol_nombre existe
-        if 'rol_nombre' not in user or not user['rol_nombre']:
-            print("Advertencia: El usuario no tiene un rol definido")
-            user['rol_nombre'] = 'cliente'  # Valor por defecto
-        
-        # Procesar condiciones médicas si existen
-        condiciones_medicas = user.get('condiciones_medicas', '')
-        if condiciones_medicas:
-            try:
-                # Intentar convertir el string JSON a lista
-                if isinstance(condiciones_medicas, str):
-                    condiciones_medicas = json.loads(condiciones_medicas)
-            except (json.JSONDecodeError, TypeError, ValueError):
-                # Si hay un error al decodificar, dejar como está
-                pass
-        
-        # Crear respuesta en el formato que espera el frontend
-        user_data = {
-            'id': user['id'],
-            'email': user['email'],
-            'nombre': user.get('nombre', ''),  # Usar get() para evitar KeyError
-            'rol_nombre': user['rol_nombre'],
-            'role': role_map.get(user['rol_nombre'].lower().strip(), 'client'),
-            'condiciones_medicas': condiciones_medicas
-        }
         
-        print(f"Datos de usuario a devolver: {user_data}")
-        return jsonify(user_data)
+            # Mapear el rol al formato que espera el frontend
+            role_map = {
+                'admin': 'admin',
+                'entrenador': 'trainer',
+                'recepcionista': 'receptionist',
+                'cliente': 'client'
+            }
+        
+            # Asegurarse de que el rol_nombre existe
+            user['rol_nombre'] = current_user.role
+            if not user['rol_nombre']:
+                logger.warning("El usuario %s no tiene un rol definido", current_user.id)
+                user['rol_nombre'] = 'cliente'  # Valor por defecto
+        
+            # Condiciones médicas: el texto JSON se interpreta al serializar
+            condiciones_medicas = user.get('condiciones_medicas', '')
+            if condiciones_medicas and isinstance(condiciones_medicas, str):
+                condiciones_medicas = json_provider.LazyJSON(condiciones_medicas)
+        
+            # Crear respuesta en el formato que espera el frontend
+            user_data = {
+                'id': user['id'],
+                'email': user['email'],
+                'nombre': user.get('nombre', ''),  # Usar get() para evitar KeyError
+                'rol_nombre': user['rol_nombre'],
+                'role': role_map.get(user['rol_nombre'].lower().strip(), 'client'),
+                'condiciones_medicas': condiciones_medicas
+            }
+        
+            return jsonify(user_data)
         
     except Exception as e:
         import traceback
         error_traceback = traceback.format_exc()
-        print(f"Error en get_current_user: {str(e)}")
-        print(f"Traceback: {error_traceback}")
+        logger.exception("Error en get_current_user")
         return jsonify({
             "error": "Error interno del servidor",
             "details": str(e),
             "traceback": error_traceback
         }), 500
-    finally:
-        try:
-            if 'connection' in locals() and connection and connection.is_connected():
-                if 'cursor' in locals():
-                    cursor.close()
-                connection.close()
-                print("Conexión a la base de datos cerrada")
-        except Exception as e:
-            print(f"Error al cerrar la conexión: {e}")
 
 # Ruta de prueba para verificar que el servidor está funcionando
 @app.route('/api/test', methods=['GET'])
@@ -327,74 +861,251 @@ def test_connection():
 
 @app.route('/api/miembros/proximos_a_vencer', methods=['GET'])
 @token_required
+@requires('gestionar_clientes')
 def miembros_proximos_a_vencer(current_user):
     try:
         dias = int(request.args.get('dias', 7))  # Por defecto, próximos 7 días
         hoy = datetime.now().date()
         limite = hoy + timedelta(days=dias)
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        cursor = connection.cursor(dictionary=True)
-        query = '''
-            SELECT m.* FROM miembros m
-            WHERE m.fecha_vencimiento_membresia IS NOT NULL
-              AND m.fecha_vencimiento_membresia >= %s
-              AND m.fecha_vencimiento_membresia <= %s
-              AND m.activo = 1
-            ORDER BY m.fecha_vencimiento_membresia ASC
-        '''
-        cursor.execute(query, (hoy, limite))
-        miembros = cursor.fetchall()
-        return jsonify({'miembros': miembros, 'rango': f'{hoy} a {limite}'})
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            miembros = queries.fetch_all(connection, 'miembros_proximos_a_vencer', (hoy, limite))
+            return jsonify({'miembros': miembros, 'rango': f'{hoy} a {limite}'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
+# Columnas que puede pedir el cliente en ?fields= (nunca password_hash)
+COLUMNAS_MIEMBROS = {
+    'id': 'm.id',
+    'nombre': 'm.nombre',
+    'email': 'm.email',
+    'telefono': 'm.telefono',
+    'fecha_inscripcion': 'm.fecha_inscripcion',
+    'activo': 'm.activo',
+    'rol_id': 'm.rol_id',
+    'rol_nombre': 'r.nombre as rol_nombre',
+    'fecha_nacimiento': 'm.fecha_nacimiento',
+    'genero': 'm.genero',
+    'direccion': 'm.direccion',
+    'tipo_membresia': 'm.tipo_membresia',
+    'fecha_vencimiento_membresia': 'm.fecha_vencimiento_membresia',
+    'especialidad': 'm.especialidad',
+    'horario_trabajo': 'm.horario_trabajo',
+    'certificaciones': 'm.certificaciones',
+    'condiciones_medicas': 'm.condiciones_medicas',
+    'observaciones': 'm.observaciones',
+    'fecha_creacion': 'm.fecha_creacion',
+    'fecha_actualizacion': 'm.fecha_actualizacion',
+}
+CAMPOS_MIEMBROS_DEFECTO = (
+    'id', 'nombre', 'email', 'telefono', 'fecha_inscripcion', 'activo', 'rol_id',
+    'rol_nombre', 'fecha_nacimiento', 'genero', 'direccion', 'tipo_membresia',
+    'fecha_vencimiento_membresia', 'especialidad', 'horario_trabajo',
+    'certificaciones', 'condiciones_medicas', 'fecha_creacion', 'fecha_actualizacion'
+)
+MIEMBROS_LIMITE_DEFECTO = 50
+MIEMBROS_LIMITE_MAXIMO = 500
+
+def decodificar_condiciones(miembro):
+    """
+    Marca condiciones_medicas (texto JSON) para interpretarse al serializar.
+    Si no es JSON válido se envía el texto tal cual.
+    """
+    condiciones = miembro.get('condiciones_medicas')
+    if condiciones and isinstance(condiciones, str):
+        miembro['condiciones_medicas'] = json_provider.LazyJSON(condiciones)
+    return miembro
+
+def formato_columnas():
+    """True si el cliente pidió el formato compacto con ?format=columns"""
+    return request.args.get('format') == 'columns'
+
+def listado(connection, name, params=()):
+    """
+    Filas de una consulta registrada como lista de diccionarios o, con
+    ?format=columns, como {"columns": [...], "rows": [[...], ...]} leídas
+    con un cursor de tuplas.
+    """
+    if formato_columnas():
+        return json_provider.ColumnarRows(*queries.fetch_columns(connection, name, params))
+    return queries.fetch_all(connection, name, params)
+
+def codificar_cursor(valores):
+    """Cursor opaco de paginación a partir de la clave de la última fila"""
+    return base64.urlsafe_b64encode(json.dumps(valores, default=str).encode('utf-8')).decode('ascii')
+
+def decodificar_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+
 @app.route('/api/miembros', methods=['GET'])
 @token_required
+@requires('gestionar_clientes')
+@conditional_get('miembros', 'roles')
 def get_miembros(current_user):
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({"error": "Error al conectar a la base de datos"}), 500
+    """
+    Lista paginada de miembros (paginación por keyset).
+
+    Parámetros: limit, cursor, orden (id | nombre), rol (id o nombre), activo,
+    tipo_membresia, vence_desde, vence_hasta y fields (columnas separadas por
+    coma, que se devuelven en el orden de COLUMNAS_MIEMBROS). El total solo se calcula en la primera página. Con NDJSON o
+    ?format=csv se transmiten todos los miembros filtrados, sin paginar, y
+    con ?format=columns la página va en formato de columnas.
+    """
+    args = request.args
+    
+    # Proyección: las columnas van siempre en el orden de COLUMNAS_MIEMBROS,
+    # así que hay una sola consulta preparada por cada conjunto de campos
+    pedidos = set(c.strip() for c in args.get('fields', '').split(',') if c.strip()) or set(CAMPOS_MIEMBROS_DEFECTO)
+    desconocidos = sorted(pedidos - COLUMNAS_MIEMBROS.keys())
+    if desconocidos:
+        return jsonify({'error': f"Campos no válidos: {', '.join(desconocidos)}"}), 400
+    campos = [c for c in COLUMNAS_MIEMBROS if c in pedidos]
+    
+    orden = args.get('orden', 'id')
+    if orden not in ('id', 'nombre'):
+        return jsonify({'error': 'orden debe ser id o nombre'}), 400
+    
+    # Las columnas de la clave del cursor siempre se leen (al final, para
+    # poder recortarlas de las tuplas en el formato de columnas)
+    clave = ['id'] if orden == 'id' else ['nombre', 'id']
+    columnas = tuple(dict.fromkeys(campos + clave))
     
     try:
-        cursor = connection.cursor(dictionary=True)
-        # Realizar JOIN con la tabla roles para obtener el nombre del rol
-        query = """
-            SELECT 
-                m.id, m.nombre, m.email, m.telefono, m.fecha_inscripcion,
-                m.activo, m.rol_id, m.password_hash, m.permisos_especiales,
-                m.fecha_nacimiento, m.genero, m.direccion, m.tipo_membresia,
-                m.fecha_vencimiento_membresia, m.especialidad, m.horario_trabajo,
-                m.certificaciones, m.fecha_creacion, m.fecha_actualizacion,
-                r.nombre as rol_nombre 
-            FROM miembros m
-            LEFT JOIN roles r ON m.rol_id = r.id
-        """
-        cursor.execute(query)
-        miembros = cursor.fetchall()
-        
-        # Procesar las condiciones médicas para cada miembro
-        for miembro in miembros:
-            if miembro.get('condiciones_medicas'):
-                try:
-                    # Intentar convertir el string JSON a lista
-                    if isinstance(miembro['condiciones_medicas'], str):
-                        miembro['condiciones_medicas'] = json.loads(miembro['condiciones_medicas'])
-                except (json.JSONDecodeError, TypeError):
-                    # Si hay un error al decodificar, dejar como está
-                    pass
+        limite = min(max(int(args.get('limit', MIEMBROS_LIMITE_DEFECTO)), 1), MIEMBROS_LIMITE_MAXIMO)
+    except ValueError:
+        return jsonify({'error': 'limit debe ser un número'}), 400
+    
+    # Filtros
+    rol = args.get('rol')
+    rol_id = int(rol) if rol and rol.isdigit() else None
+    rol_nombre = rol if rol and not rol.isdigit() else None
+    activo = args.get('activo')
+    if activo is not None:
+        activo = 1 if activo.lower() in ('1', 'true', 'si', 'sí') else 0
+    filtros = []
+    for valor in (rol_id, rol_nombre, activo, args.get('tipo_membresia'),
+                  args.get('vence_desde'), args.get('vence_hasta')):
+        filtros += [valor, valor]
+    
+    formato = streaming.requested_format()
+    if formato:
+        try:
+            return streaming.stream_query(
+                'miembros_exportar', filtros, formato,
+                columns=[COLUMNAS_MIEMBROS[c] for c in campos],
+                transform=decodificar_condiciones if formato == 'ndjson' else None,
+                filename='miembros'
+            )
+        except Error as e:
+            logger.exception("Error al exportar miembros")
+            return jsonify({"error": str(e)}), 500
+    
+    cursor = args.get('cursor')
+    if cursor:
+        posicion = decodificar_cursor(cursor)
+        if not isinstance(posicion, list) or len(posicion) != len(clave):
+            return jsonify({'error': 'cursor no válido'}), 400
+    else:
+        posicion = [0] if orden == 'id' else ['', 0]
+    
+    with db_connection() as connection:
+        if not connection:
+            return jsonify({"error": "Error al conectar a la base de datos"}), 500
+    
+        try:
+            # Se pide una fila extra para saber si hay otra página
+            columnares = formato_columnas()
+            miembros = queries.fetch_all_projected(
+                connection, f'miembros_pagina_{orden}',
+                [COLUMNAS_MIEMBROS[c] for c in columnas],
+                posicion + filtros + [limite + 1],
+                dictionary=not columnares
+            )
+            hay_mas = len(miembros) > limite
+            miembros = miembros[:limite]
+            
+            total = None
+            if not cursor:
+                total = queries.fetch_one(connection, 'miembros_contar', filtros)['total']
+        
+            siguiente = None
+            if hay_mas:
+                ultimo = miembros[-1]
+                if columnares:
+                    siguiente = codificar_cursor([ultimo[columnas.index(c)] for c in clave])
+                else:
+                    siguiente = codificar_cursor([ultimo[c] for c in clave])
+            
+            if columnares:
+                # Las columnas de la clave que no se pidieron quedan al final
+                n = len(campos)
+                if 'condiciones_medicas' in campos:
+                    i = campos.index('condiciones_medicas')
+                    filas = []
+                    for fila in miembros:
+                        fila = list(fila[:n])
+                        if fila[i] and isinstance(fila[i], str):
+                            fila[i] = json_provider.LazyJSON(fila[i])
+                        filas.append(fila)
+                elif n < len(columnas):
+                    filas = [fila[:n] for fila in miembros]
+                else:
+                    filas = miembros
+                miembros = json_provider.ColumnarRows(campos, filas)
+            else:
+                for miembro in miembros:
+                    # Quitar las columnas de la clave que no se pidieron
+                    for c in clave:
+                        if c not in campos:
+                            del miembro[c]
+                    decodificar_condiciones(miembro)
                     
-        return jsonify(miembros)
+            return jsonify({
+                'miembros': miembros,
+                'paginacion': {
+                    'limit': limite,
+                    'total': total,
+                    'siguiente_cursor': siguiente
+                }
+            })
+        except Error as e:
+            return jsonify({"error": str(e)}), 500
+
+BUSQUEDA_LIMITE_DEFECTO = 20
+BUSQUEDA_LIMITE_MAXIMO = 100
+
+def buscar_miembros(rol_id=None):
+    """Busca en el índice en memoria con ?q= y ?limit="""
+    consulta = request.args.get('q', '').strip()
+    try:
+        limite = min(max(int(request.args.get('limit', BUSQUEDA_LIMITE_DEFECTO)), 1), BUSQUEDA_LIMITE_MAXIMO)
+    except ValueError:
+        return jsonify({'error': 'limit debe ser un número'}), 400
+    if not consulta:
+        return jsonify({'miembros': []}), 200
+    try:
+        return jsonify({'miembros': member_index.search(consulta, limit=limite, rol_id=rol_id)}), 200
     except Error as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if connection and connection.is_connected():
-            cursor.close()
-            connection.close()
+        logger.exception("Error al cargar el índice de búsqueda")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/miembros/buscar', methods=['GET'])
+@app.route('/api/members/search', methods=['GET'])
+@token_required
+@requires('gestionar_clientes')
+def search_miembros(current_user):
+    """Búsqueda de miembros por nombre, email o teléfono, ordenada por relevancia"""
+    return buscar_miembros()
+
+@app.route('/api/clientes/search', methods=['GET'])
+@token_required
+@requires('gestionar_clientes')
+def search_clientes(current_user):
+    """Igual que la búsqueda de miembros, solo entre clientes (rol_id = 3)"""
+    return buscar_miembros(rol_id=3)
 
 # Ruta para crear un nuevo miembro
 
@@ -403,64 +1114,49 @@ from flask import json
 
 @app.route('/api/miembros/<int:miembro_id>', methods=['PUT'])
 @token_required
+@requires('gestionar_clientes')
 def update_miembro(current_user, miembro_id):
     try:
         data = request.json
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        cursor = connection.cursor(dictionary=True)
-
-        # Construir la consulta de actualización
-        query = '''
-            UPDATE miembros SET
-                nombre=%s,
-                email=%s,
-                telefono=%s,
-                fecha_inscripcion=%s,
-                activo=%s,
-                rol_id=%s,
-                fecha_nacimiento=%s,
-                genero=%s,
-                direccion=%s,
-                tipo_membresia=%s,
-                fecha_vencimiento_membresia=%s,
-                condiciones_medicas=%s,
-                observaciones=%s
-            WHERE id=%s
-        '''
-        condiciones_medicas = data.get('condiciones_medicas')
-        if condiciones_medicas is not None and not isinstance(condiciones_medicas, str):
-            condiciones_medicas = json.dumps(condiciones_medicas, ensure_ascii=False)
-
-        cursor.execute(query, (
-            data.get('nombre'),
-            data.get('email'),
-            data.get('telefono'),
-            data.get('fecha_inscripcion'),
-            data.get('activo', True),
-            data.get('rol_id', 3),
-            data.get('fecha_nacimiento'),
-            data.get('genero'),
-            data.get('direccion'),
-            data.get('tipo_membresia'),
-            data.get('fecha_vencimiento_membresia'),
-            condiciones_medicas,
-            data.get('observaciones'),
-            miembro_id
-        ))
-        connection.commit()
-        return jsonify({'message': 'Miembro actualizado correctamente'}), 200
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            condiciones_medicas = data.get('condiciones_medicas')
+            if condiciones_medicas is not None and not isinstance(condiciones_medicas, str):
+                condiciones_medicas = json.dumps(condiciones_medicas, ensure_ascii=False)
+
+            queries.execute(connection, 'miembro_actualizar', (
+                data.get('rol_id', 3),
+                data.get('activo', True),
+                data.get('email'),
+                data.get('nombre'),
+                data.get('email'),
+                data.get('telefono'),
+                data.get('fecha_inscripcion'),
+                data.get('activo', True),
+                data.get('rol_id', 3),
+                data.get('fecha_nacimiento'),
+                data.get('genero'),
+                data.get('direccion'),
+                data.get('tipo_membresia'),
+                data.get('fecha_vencimiento_membresia'),
+                condiciones_medicas,
+                data.get('observaciones'),
+                miembro_id
+            ))
+            version = queries.fetch_one(connection, 'miembro_token_version', (miembro_id,))
+            miembro = queries.fetch_one(connection, 'miembro_por_id', (miembro_id,))
+            connection.commit()
+            if version:
+                token_versions.bump(miembro_id, version['token_version'])
+            if miembro:
+                member_index.upsert(miembro)
+            return jsonify({'message': 'Miembro actualizado correctamente'}), 200
     except Exception as e:
-        if 'connection' in locals() and connection and connection.is_connected():
-            connection.rollback()
         return jsonify({'error': str(e)}), 400
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 @app.route('/api/miembros', methods=['POST'])
 @token_required
+@requires('gestionar_clientes')
 def create_miembro(current_user):
     try:
         data = request.json
@@ -481,21 +1177,6 @@ def create_miembro(current_user):
         if len(data['password']) < 6:
             return jsonify({"error": "La contraseña debe tener al menos 6 caracteres"}), 400
 
-        # Conectar a la base de datos
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "Error de conexión a la base de datos"}), 500
-
-        cursor = conn.cursor(dictionary=True)
-
-        # Verificar si el email ya existe
-        cursor.execute("SELECT id FROM miembros WHERE email = %s", (data['email'],))
-        if cursor.fetchone():
-            return jsonify({"error": "El correo ya está registrado"}), 400
-
-        # Hashear la contraseña
-        password_hash = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt())
-
         # Validar fecha de vencimiento si está presente
         fecha_vencimiento = data.get('fecha_vencimiento_membresia')
         if fecha_vencimiento:
@@ -521,15 +1202,21 @@ def create_miembro(current_user):
                 return jsonify({"error": "La especialidad es requerida para entrenadores"}), 400
             especialidad = especialidad.strip()
 
+        # Verificar si el email ya existe
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({"error": "Error de conexión a la base de datos"}), 500
+            if queries.fetch_one(conn, 'miembro_id_por_email', (data['email'],)):
+                return jsonify({"error": "El correo ya está registrado"}), 400
+
+        # Hashear la contraseña sin tener una conexión del pool prestada
+        try:
+            password_hash = password_hasher.hash(data['password'])
+        except passwords.HasherBusyError as e:
+            logger.warning("Error al hashear contraseña: %s", e)
+            return respuesta_hasher_saturado()
+
         # Insertar el nuevo miembro
-        query = """
-            INSERT INTO miembros (
-                nombre, email, password_hash, telefono,
-                fecha_inscripcion, activo, rol_id, fecha_vencimiento_membresia,
-                especialidad,tipo_membresia
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
         valores = (
             data['nombre'].strip(),
             data['email'].strip().lower(),
@@ -543,21 +1230,18 @@ def create_miembro(current_user):
             data.get('tipo_membresia', 'mensual')   
         )
 
-        cursor.execute(query, valores)
-        conn.commit()
-        miembro_id = cursor.lastrowid
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({"error": "Error de conexión a la base de datos"}), 500
 
-        # Obtener los datos del miembro recién creado
-        cursor.execute("""
-            SELECT id, nombre, email, telefono, fecha_inscripcion, 
-                   activo, rol_id, fecha_nacimiento, genero, 
-                   direccion, tipo_membresia, fecha_vencimiento_membresia,
-                   especialidad
-            FROM miembros 
-            WHERE id = %s
-        """, (miembro_id,))
-        
-        nuevo_miembro = cursor.fetchone()
+            cursor = queries.execute(conn, 'miembro_insertar', valores)
+            conn.commit()
+            miembro_id = cursor.lastrowid
+
+            # Obtener los datos del miembro recién creado
+            nuevo_miembro = queries.fetch_one(conn, 'miembro_por_id', (miembro_id,))
+            if nuevo_miembro:
+                member_index.upsert(nuevo_miembro)
 
         return jsonify({
             "message": "Miembro registrado exitosamente",
@@ -565,433 +1249,308 @@ def create_miembro(current_user):
         }), 201
 
     except Exception as e:
-        if 'conn' in locals() and conn and conn.is_connected():
-            conn.rollback()
         return jsonify({"error": str(e)}), 500
 
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals() and conn and conn.is_connected():
-            conn.close()
-
 # Ruta para eliminar un miembro
 @app.route('/api/miembros/<int:miembro_id>', methods=['DELETE'])
 @token_required
+@requires('gestionar_clientes')
 def delete_miembro(current_user, miembro_id):
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
         
-        cursor = connection.cursor(dictionary=True)
+            # Verificar si el miembro existe
+            miembro = queries.fetch_one(connection, 'miembro_resumen', (miembro_id,))
         
-        # Verificar si el miembro existe
-        cursor.execute("SELECT id, nombre FROM miembros WHERE id = %s", (miembro_id,))
-        miembro = cursor.fetchone()
+            if not miembro:
+                return jsonify({'error': 'Miembro no encontrado'}), 404
         
-        if not miembro:
-            return jsonify({'error': 'Miembro no encontrado'}), 404
+            # Eliminar el miembro; sus asistencias se borran antes para que
+            # los triggers las descuenten del resumen diario
+            queries.execute(connection, 'asistencias_eliminar_miembro', (miembro_id,))
+            queries.execute(connection, 'miembro_eliminar', (miembro_id,))
+            connection.commit()
+            # Los tokens del miembro eliminado dejan de aceptarse
+            token_versions.bump(miembro_id, float('inf'))
+            member_index.remove(miembro_id)
         
-        # Eliminar el miembro
-        cursor.execute("DELETE FROM miembros WHERE id = %s", (miembro_id,))
-        connection.commit()
-        
-        return jsonify({
-            'message': f'Miembro {miembro["nombre"]} eliminado exitosamente'
-        }), 200
+            return jsonify({
+                'message': f'Miembro {miembro["nombre"]} eliminado exitosamente'
+            }), 200
         
     except Exception as e:
-        if 'connection' in locals() and connection and connection.is_connected():
-            connection.rollback()
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'connection' in locals() and connection and connection.is_connected():
-            connection.close()
 
 # --- ENDPOINTS FACTURAS ---
 @app.route('/api/facturas', methods=['GET'])
 @token_required
+@requires('gestionar_pagos')
 def get_facturas(current_user):
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute('''
-            SELECT f.*, m.nombre as miembro_nombre, m.email as miembro_email
-            FROM facturas f
-            JOIN miembros m ON f.miembro_id = m.id
-            ORDER BY f.fecha DESC, f.id DESC
-        ''')
-        facturas = cursor.fetchall()
-        return jsonify(facturas)
+        formato = streaming.requested_format()
+        if formato:
+            return streaming.stream_query('facturas_listar', formato=formato, filename='facturas')
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            return jsonify(listado(connection, 'facturas_listar'))
     except Exception as e:
-        print(f"Error al obtener facturas: {str(e)}")
+        logger.exception("Error al obtener facturas")
         return jsonify({'error': str(e)}), 400
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/facturas/<int:factura_id>', methods=['GET'])
 @token_required
+@requires('gestionar_pagos')
 def get_factura(current_user, factura_id):
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute('''
-            SELECT f.*, m.nombre as miembro_nombre, m.email as miembro_email
-            FROM facturas f
-            JOIN miembros m ON f.miembro_id = m.id
-            WHERE f.id = %s
-        ''', (factura_id,))
-        factura = cursor.fetchone()
-        if not factura:
-            return jsonify({'error': 'Factura no encontrada'}), 404
-        return jsonify(factura)
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            factura = queries.fetch_one(connection, 'factura_por_id', (factura_id,))
+            if not factura:
+                return jsonify({'error': 'Factura no encontrada'}), 404
+            return jsonify(factura)
     except Exception as e:
-        print(f"Error al obtener factura: {str(e)}")
+        logger.exception("Error al obtener factura")
         return jsonify({'error': str(e)}), 400
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/facturas', methods=['POST'])
 @token_required
+@requires('gestionar_pagos')
 def crear_factura(current_user):
     try:
         data = request.json
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        cursor = connection.cursor(dictionary=True)
-        query = '''
-            INSERT INTO facturas (miembro_id, fecha, total, concepto, estado, metodo_pago, notas)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        '''
-        cursor.execute(query, (
-            data['miembro_id'],
-            data['fecha'],
-            data['total'],
-            data['concepto'],
-            data.get('estado', 'pendiente'),
-            data.get('metodo_pago', None),
-            data.get('notas', None)
-        ))
-        connection.commit()
-        return jsonify({'message': 'Factura creada exitosamente', 'id': cursor.lastrowid}), 201
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            cursor = queries.execute(connection, 'factura_insertar', (
+                data['miembro_id'],
+                data['fecha'],
+                data['total'],
+                data['concepto'],
+                data.get('estado', 'pendiente'),
+                data.get('metodo_pago', None),
+                data.get('notas', None)
+            ))
+            connection.commit()
+            return jsonify({'message': 'Factura creada exitosamente', 'id': cursor.lastrowid}), 201
     except Exception as e:
-        connection.rollback()
-        print(f"Error al crear factura: {str(e)}")
+        logger.exception("Error al crear factura")
         return jsonify({'error': str(e)}), 400
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/facturas/<int:factura_id>', methods=['PUT'])
 @token_required
+@requires('gestionar_pagos')
 def actualizar_factura(current_user, factura_id):
     try:
         data = request.json
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        cursor = connection.cursor(dictionary=True)
-        query = '''
-            UPDATE facturas SET miembro_id=%s, fecha=%s, total=%s, concepto=%s, estado=%s, metodo_pago=%s, notas=%s
-            WHERE id=%s
-        '''
-        cursor.execute(query, (
-            data['miembro_id'],
-            data['fecha'],
-            data['total'],
-            data['concepto'],
-            data.get('estado', 'pendiente'),
-            data.get('metodo_pago', None),
-            data.get('notas', None),
-            factura_id
-        ))
-        connection.commit()
-        return jsonify({'message': 'Factura actualizada exitosamente'})
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            queries.execute(connection, 'factura_actualizar', (
+                data['miembro_id'],
+                data['fecha'],
+                data['total'],
+                data['concepto'],
+                data.get('estado', 'pendiente'),
+                data.get('metodo_pago', None),
+                data.get('notas', None),
+                factura_id
+            ))
+            connection.commit()
+            return jsonify({'message': 'Factura actualizada exitosamente'})
     except Exception as e:
-        connection.rollback()
-        print(f"Error al actualizar factura: {str(e)}")
+        logger.exception("Error al actualizar factura")
         return jsonify({'error': str(e)}), 400
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/facturas/<int:factura_id>', methods=['DELETE'])
 @token_required
+@requires('gestionar_pagos')
 def eliminar_factura(current_user, factura_id):
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute('DELETE FROM facturas WHERE id=%s', (factura_id,))
-        connection.commit()
-        return jsonify({'message': 'Factura eliminada exitosamente'})
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            queries.execute(connection, 'factura_eliminar', (factura_id,))
+            connection.commit()
+            return jsonify({'message': 'Factura eliminada exitosamente'})
     except Exception as e:
-        connection.rollback()
-        print(f"Error al eliminar factura: {str(e)}")
+        logger.exception("Error al eliminar factura")
         return jsonify({'error': str(e)}), 400
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 # --- RUTAS PARA INVENTARIO ---
 @app.route('/api/inventario', methods=['GET'])
 @token_required
 def get_inventario(current_user):
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Error al conectar a la base de datos"}), 500
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM inventario')
-        inventario = cursor.fetchall()
-        return jsonify(inventario)
+        formato = streaming.requested_format()
+        if formato:
+            return streaming.stream_query('inventario_listar', formato=formato, filename='inventario')
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
+            inventario = queries.fetch_all(connection, 'inventario_listar')
+            return jsonify(inventario)
     except Exception as e:
-        print(f"Error al obtener inventario: {str(e)}")
+        logger.exception("Error al obtener inventario")
         return jsonify({"error": "Error al obtener el inventario"}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/inventario', methods=['POST'])
 @token_required
+@requires('gestionar_inventario')
 def create_inventario(current_user):
     try:
         data = request.json
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Error al conectar a la base de datos"}), 500
-        cursor = connection.cursor()
-        query = '''
-            INSERT INTO inventario (nombre, tipo, cantidad, descripcion, fecha_registro, estado, proveedor, ubicacion, precio_unitario)
-            VALUES (%s, %s, %s, %s, CURDATE(), %s, %s, %s, %s)
-        '''
-        cursor.execute(query, (
-            data['nombre'],
-            data['tipo'],
-            data.get('cantidad', 0),
-            data.get('descripcion', ''),
-            data.get('estado', 'activo'),
-            data.get('proveedor', ''),
-            data.get('ubicacion', ''),
-            data.get('precio_unitario', 0.0)
-        ))
-        connection.commit()
-        return jsonify({"message": "Recurso agregado al inventario exitosamente"}), 201
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
+            queries.execute(connection, 'inventario_insertar', (
+                data['nombre'],
+                data['tipo'],
+                data.get('cantidad', 0),
+                data.get('descripcion', ''),
+                data.get('estado', 'activo'),
+                data.get('proveedor', ''),
+                data.get('ubicacion', ''),
+                data.get('precio_unitario', 0.0)
+            ))
+            connection.commit()
+            return jsonify({"message": "Recurso agregado al inventario exitosamente"}), 201
     except Exception as e:
-        connection.rollback()
-        print(f"Error al crear inventario: {str(e)}")
+        logger.exception("Error al crear inventario")
         return jsonify({"error": str(e)}), 400
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/inventario/<int:item_id>', methods=['PUT'])
 @token_required
+@requires('gestionar_inventario')
 def update_inventario(current_user, item_id):
     try:
         data = request.json
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Error al conectar a la base de datos"}), 500
-        cursor = connection.cursor()
-        query = '''
-            UPDATE inventario SET nombre=%s, tipo=%s, cantidad=%s, descripcion=%s, fecha_registro=%s, estado=%s, proveedor=%s, ubicacion=%s, precio_unitario=%s
-            WHERE id=%s
-        '''
-        cursor.execute(query, (
-            data['nombre'],
-            data['tipo'],
-            data.get('cantidad', 0),
-            data.get('descripcion', ''),
-            data.get('fecha_registro', None) or None,
-            data.get('estado', 'activo'),
-            data.get('proveedor', ''),
-            data.get('ubicacion', ''),
-            data.get('precio_unitario', 0.0),
-            item_id
-        ))
-        connection.commit()
-        return jsonify({"message": "Recurso de inventario actualizado exitosamente"})
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
+            queries.execute(connection, 'inventario_actualizar', (
+                data['nombre'],
+                data['tipo'],
+                data.get('cantidad', 0),
+                data.get('descripcion', ''),
+                data.get('fecha_registro', None) or None,
+                data.get('estado', 'activo'),
+                data.get('proveedor', ''),
+                data.get('ubicacion', ''),
+                data.get('precio_unitario', 0.0),
+                item_id
+            ))
+            connection.commit()
+            return jsonify({"message": "Recurso de inventario actualizado exitosamente"})
     except Exception as e:
-        connection.rollback()
-        print(f"Error al actualizar inventario: {str(e)}")
+        logger.exception("Error al actualizar inventario")
         return jsonify({"error": str(e)}), 400
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/inventario/<int:item_id>', methods=['DELETE'])
 @token_required
+@requires('gestionar_inventario')
 def delete_inventario(current_user, item_id):
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Error al conectar a la base de datos"}), 500
-        cursor = connection.cursor()
-        cursor.execute('DELETE FROM inventario WHERE id=%s', (item_id,))
-        connection.commit()
-        return jsonify({"message": "Recurso eliminado del inventario exitosamente"})
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
+            queries.execute(connection, 'inventario_eliminar', (item_id,))
+            connection.commit()
+            return jsonify({"message": "Recurso eliminado del inventario exitosamente"})
     except Exception as e:
-        connection.rollback()
-        print(f"Error al eliminar inventario: {str(e)}")
+        logger.exception("Error al eliminar inventario")
         return jsonify({"error": str(e)}), 400
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/clases', methods=['GET'])
 @token_required
+@conditional_get('clases', 'miembros')
 def get_clases(current_user):
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Error al conectar a la base de datos"}), 500
-        cursor = connection.cursor(dictionary=True)
-        query = '''
-            SELECT c.*, m.nombre AS nombre_entrenador
-            FROM clases c
-            LEFT JOIN miembros m ON c.id_entrenador = m.id
-        '''
-        cursor.execute(query)
-        clases = cursor.fetchall()
-        return jsonify(clases)
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
+            clases = queries.fetch_all(connection, 'clases_listar')
+            return jsonify(clases)
     except Exception as e:
-        print(f"Error al obtener clases: {str(e)}")
+        logger.exception("Error al obtener clases")
         return jsonify({"error": "Error al obtener las clases"}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/clases', methods=['POST'])
 @token_required
+@requires('gestionar_clases')
 def create_clase(current_user):
     try:
         data = request.json
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Error al conectar a la base de datos"}), 500
-        cursor = connection.cursor()
-        query = '''
-            INSERT INTO clases (nombre, descripcion, horario, cupo_maximo, id_entrenador, fecha_creacion)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        '''
-        cursor.execute(query, (
-            data['nombre'],
-            data.get('descripcion', ''),
-            data.get('horario', ''),
-            data.get('cupo_maximo', None),
-            data.get('id_entrenador', None),
-            data.get('fecha_creacion', None) or None
-        ))
-        connection.commit()
-        return jsonify({"message": "Clase creada exitosamente"}), 201
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
+            queries.execute(connection, 'clase_insertar', (
+                data['nombre'],
+                data.get('descripcion', ''),
+                data.get('horario', ''),
+                data.get('cupo_maximo', None),
+                data.get('id_entrenador', None),
+                data.get('fecha_creacion', None) or None
+            ))
+            connection.commit()
+            return jsonify({"message": "Clase creada exitosamente"}), 201
     except Exception as e:
-        connection.rollback()
-        print(f"Error al crear clase: {str(e)}")
+        logger.exception("Error al crear clase")
         return jsonify({"error": str(e)}), 400
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/clases/<int:clase_id>', methods=['PUT'])
 @token_required
+@requires('gestionar_clases')
 def update_clase(current_user, clase_id):
     try:
         data = request.json
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Error al conectar a la base de datos"}), 500
-        cursor = connection.cursor()
-        query = '''
-            UPDATE clases SET nombre=%s, descripcion=%s, horario=%s, cupo_maximo=%s, id_entrenador=%s
-            WHERE id=%s
-        '''
-        cursor.execute(query, (
-            data['nombre'],
-            data.get('descripcion', ''),
-            data.get('horario', ''),
-            data.get('cupo_maximo', None),
-            data.get('id_entrenador', None),
-            clase_id
-        ))
-        connection.commit()
-        return jsonify({"message": "Clase actualizada exitosamente"})
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
+            queries.execute(connection, 'clase_actualizar', (
+                data['nombre'],
+                data.get('descripcion', ''),
+                data.get('horario', ''),
+                data.get('cupo_maximo', None),
+                data.get('id_entrenador', None),
+                clase_id
+            ))
+            connection.commit()
+            return jsonify({"message": "Clase actualizada exitosamente"})
     except Exception as e:
-        connection.rollback()
-        print(f"Error al actualizar clase: {str(e)}")
+        logger.exception("Error al actualizar clase")
         return jsonify({"error": str(e)}), 400
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/miembros/activos', methods=['GET'])
 @token_required
+@requires('gestionar_clientes')
 def get_miembros_activos(current_user):
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        cursor = connection.cursor(dictionary=True)
-        query = '''
-            SELECT id, nombre, email, telefono, tipo_membresia, fecha_vencimiento_membresia
-            FROM miembros
-            WHERE activo = 1 AND (fecha_vencimiento_membresia IS NOT NULL AND fecha_vencimiento_membresia >= CURDATE())
-        '''
-        cursor.execute(query)
-        miembros = cursor.fetchall()
-        return jsonify({'miembros_activos': miembros}), 200
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            miembros = queries.fetch_all(connection, 'miembros_activos')
+            return jsonify({'miembros_activos': miembros}), 200
     except Exception as e:
-        if 'connection' in locals() and connection and connection.is_connected():
-            connection.rollback()
         return jsonify({'error': str(e)}), 400
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/clases/<int:clase_id>', methods=['DELETE'])
 @token_required
+@requires('gestionar_clases')
 def delete_clase(current_user, clase_id):
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Error al conectar a la base de datos"}), 500
-        cursor = connection.cursor()
-        query = 'DELETE FROM clases WHERE id=%s'
-        cursor.execute(query, (clase_id,))
-        connection.commit()
-        return jsonify({"message": "Clase eliminada exitosamente"})
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Error al conectar a la base de datos"}), 500
+            queries.execute(connection, 'clase_eliminar', (clase_id,))
+            connection.commit()
+            return jsonify({"message": "Clase eliminada exitosamente"})
     except Exception as e:
-        connection.rollback()
-        print(f"Error al eliminar clase: {str(e)}")
+        logger.exception("Error al eliminar clase")
         return jsonify({"error": str(e)}), 400
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 # --- ENDPOINTS DE RUTINAS ---
 
@@ -1000,343 +1559,210 @@ def delete_clase(current_user, clase_id):
 def get_rutinas(current_user):
     """Obtener todas las rutinas"""
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        
-        cursor = connection.cursor(dictionary=True)
-        query = '''
-            SELECT r.id, r.nombre, r.descripcion, r.duracion_semanas, r.nivel,
-                   r.objetivo, r.id_entrenador, r.fecha_creacion,
-                   COUNT(DISTINCT er.id) as total_ejercicios,
-                   COUNT(DISTINCT rc.cliente_id) as total_clientes
-            FROM rutinas r
-            LEFT JOIN dias_rutina dr ON r.id = dr.rutina_id
-            LEFT JOIN ejercicios_rutina er ON dr.id = er.dia_rutina_id
-            LEFT JOIN rutinas_clientes rc ON r.id = rc.rutina_id AND rc.estado = 'activa'
-            GROUP BY r.id
-            ORDER BY r.fecha_creacion DESC
-        '''
-        cursor.execute(query)
-        rutinas = cursor.fetchall()
-        
-        return jsonify({'rutinas': rutinas}), 200
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+        
+            rutinas = listado(connection, 'rutinas_listar')
+        
+            return jsonify({'rutinas': rutinas}), 200
         
     except Exception as e:
-        print(f"Error al obtener rutinas: {str(e)}")
+        logger.exception("Error al obtener rutinas")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/rutinas/<int:rutina_id>', methods=['GET'])
 @token_required
 def get_rutina_detalle(current_user, rutina_id):
     """Obtener detalles de una rutina específica"""
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        
-        cursor = connection.cursor(dictionary=True)
-        
-        # Obtener información básica de la rutina
-        query_rutina = '''
-            SELECT r.*, COUNT(er.id) as total_ejercicios
-            FROM rutinas r
-            LEFT JOIN dias_rutina dr ON r.id = dr.rutina_id
-            LEFT JOIN ejercicios_rutina er ON dr.id = er.dia_rutina_id
-            WHERE r.id = %s
-            GROUP BY r.id
-        '''
-        cursor.execute(query_rutina, (rutina_id,))
-        rutina = cursor.fetchone()
-        
-        if not rutina:
-            return jsonify({'error': 'Rutina no encontrada'}), 404
-        
-        # Obtener los días de la rutina
-        query_dias = '''
-            SELECT dr.*, COUNT(er.id) as ejercicios_por_dia
-            FROM dias_rutina dr
-            LEFT JOIN ejercicios_rutina er ON dr.id = er.dia_rutina_id
-            WHERE dr.rutina_id = %s
-            GROUP BY dr.id
-            ORDER BY dr.orden
-        '''
-        cursor.execute(query_dias, (rutina_id,))
-        dias = cursor.fetchall()
-        
-        # Obtener los ejercicios de cada día
-        for dia in dias:
-            query_ejercicios = '''
-                SELECT er.*, e.nombre as ejercicio_nombre, e.descripcion as ejercicio_descripcion,
-                       e.tipo_ejercicio, e.imagen_url,
-                       ce.nombre as categoria_nombre
-                FROM ejercicios_rutina er
-                JOIN ejercicios e ON er.ejercicio_id = e.id
-                JOIN categorias_ejercicios ce ON e.categoria_id = ce.id
-                WHERE er.dia_rutina_id = %s
-                ORDER BY er.orden
-            '''
-            cursor.execute(query_ejercicios, (dia['id'],))
-            dia['ejercicios'] = cursor.fetchall()
-        
-        rutina['dias'] = dias
-        
-        # Obtener los clientes asignados a esta rutina
-        query_clientes = '''
-            SELECT c.id, c.nombre, c.email, c.telefono,
-                   rc.fecha_inicio, rc.fecha_fin, rc.estado, rc.notas
-            FROM rutinas_clientes rc
-            JOIN miembros c ON rc.cliente_id = c.id
-            WHERE rc.rutina_id = %s AND rc.estado = 'activa'
-            ORDER BY c.nombre
-        '''
-        cursor.execute(query_clientes, (rutina_id,))
-        clientes = cursor.fetchall()
-        
-        rutina['clientes'] = clientes
-        
-        return jsonify({'rutina': rutina}), 200
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+        
+            # Obtener información básica de la rutina
+            rutina = queries.fetch_one(connection, 'rutina_por_id', (rutina_id,))
+        
+            if not rutina:
+                return jsonify({'error': 'Rutina no encontrada'}), 404
+        
+            # Obtener los días de la rutina
+            dias = queries.fetch_all(connection, 'rutina_dias', (rutina_id,))
+        
+            # Obtener los ejercicios de cada día
+            for dia in dias:
+                dia['ejercicios'] = queries.fetch_all(connection, 'dia_rutina_ejercicios', (dia['id'],))
+        
+            rutina['dias'] = dias
+        
+            # Obtener los clientes asignados a esta rutina
+            clientes = queries.fetch_all(connection, 'rutina_clientes_activos', (rutina_id,))
+        
+            rutina['clientes'] = clientes
+        
+            return jsonify({'rutina': rutina}), 200
         
     except Exception as e:
-        print(f"Error al obtener rutina: {str(e)}")
+        logger.exception("Error al obtener rutina")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/rutinas', methods=['POST'])
 @token_required
+@requires('gestionar_rutinas')
 def create_rutina(current_user):
     """Crear una nueva rutina"""
     try:
         data = request.get_json()
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        
-        cursor = connection.cursor()
-        
-        # Insertar la rutina
-        query_rutina = '''
-            INSERT INTO rutinas (nombre, descripcion, duracion_semanas, nivel_dificultad, 
-                                objetivo, creado_por, fecha_creacion, activo)
-            VALUES (%s, %s, %s, %s, %s, %s, NOW(), 1)
-        '''
-        cursor.execute(query_rutina, (
-            data.get('nombre'),
-            data.get('descripcion'),
-            data.get('duracion_semanas', 4),
-            data.get('nivel_dificultad', 'Principiante'),
-            data.get('objetivo', 'General'),
-            current_user
-        ))
-        
-        rutina_id = cursor.lastrowid
-        
-        # Insertar días de la rutina
-        dias = data.get('dias', [])
-        for dia_data in dias:
-            query_dia = '''
-                INSERT INTO dias_rutina (rutina_id, nombre_dia, descripcion, orden)
-                VALUES (%s, %s, %s, %s)
-            '''
-            cursor.execute(query_dia, (
-                rutina_id,
-                dia_data.get('nombre_dia'),
-                dia_data.get('descripcion', ''),
-                dia_data.get('orden', 1)
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+        
+            # Insertar la rutina
+            cursor = queries.execute(connection, 'rutina_insertar', (
+                data.get('nombre'),
+                data.get('descripcion'),
+                data.get('duracion_semanas', 4),
+                data.get('nivel_dificultad', 'Principiante'),
+                data.get('objetivo', 'General'),
+                current_user.id
             ))
-            
-            dia_id = cursor.lastrowid
-            
-            # Insertar ejercicios del día
-            ejercicios = dia_data.get('ejercicios', [])
-            for ejercicio_data in ejercicios:
-                query_ejercicio = '''
-                    INSERT INTO ejercicios_rutina (rutina_id, dia_rutina_id, ejercicio_id, 
-                                                  series, repeticiones, peso, tiempo_descanso, orden)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                '''
-                cursor.execute(query_ejercicio, (
+        
+            rutina_id = cursor.lastrowid
+        
+            # Insertar días de la rutina
+            dias = data.get('dias', [])
+            for dia_data in dias:
+                cursor = queries.execute(connection, 'dia_rutina_insertar', (
                     rutina_id,
-                    dia_id,
-                    ejercicio_data.get('ejercicio_id'),
-                    ejercicio_data.get('series', 3),
-                    ejercicio_data.get('repeticiones', 10),
-                    ejercicio_data.get('peso', 0),
-                    ejercicio_data.get('tiempo_descanso', 60),
-                    ejercicio_data.get('orden', 1)
+                    dia_data.get('nombre_dia'),
+                    dia_data.get('descripcion', ''),
+                    dia_data.get('orden', 1)
                 ))
-        
-        connection.commit()
-        return jsonify({'message': 'Rutina creada exitosamente', 'rutina_id': rutina_id}), 201
+            
+                dia_id = cursor.lastrowid
+            
+                # Insertar ejercicios del día
+                ejercicios = dia_data.get('ejercicios', [])
+                for ejercicio_data in ejercicios:
+                    queries.execute(connection, 'ejercicio_rutina_insertar', (
+                        rutina_id,
+                        dia_id,
+                        ejercicio_data.get('ejercicio_id'),
+                        ejercicio_data.get('series', 3),
+                        ejercicio_data.get('repeticiones', 10),
+                        ejercicio_data.get('peso', 0),
+                        ejercicio_data.get('tiempo_descanso', 60),
+                        ejercicio_data.get('orden', 1)
+                    ))
+        
+            connection.commit()
+            return jsonify({'message': 'Rutina creada exitosamente', 'rutina_id': rutina_id}), 201
         
     except Exception as e:
-        if 'connection' in locals() and connection and connection.is_connected():
-            connection.rollback()
-        print(f"Error al crear rutina: {str(e)}")
+        logger.exception("Error al crear rutina")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/rutinas/<int:rutina_id>', methods=['PUT'])
 @token_required
+@requires('gestionar_rutinas')
 def update_rutina(current_user, rutina_id):
     """Actualizar una rutina existente"""
     try:
         data = request.get_json()
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        
-        cursor = connection.cursor()
-        
-        # Actualizar la rutina
-        query_rutina = '''
-            UPDATE rutinas 
-            SET nombre = %s, descripcion = %s, duracion_semanas = %s, 
-                nivel_dificultad = %s, objetivo = %s
-            WHERE id = %s
-        '''
-        cursor.execute(query_rutina, (
-            data.get('nombre'),
-            data.get('descripcion'),
-            data.get('duracion_semanas', 4),
-            data.get('nivel_dificultad', 'Principiante'),
-            data.get('objetivo', 'General'),
-            rutina_id
-        ))
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+        
+            # Actualizar la rutina
+            queries.execute(connection, 'rutina_actualizar', (
+                data.get('nombre'),
+                data.get('descripcion'),
+                data.get('duracion_semanas', 4),
+                data.get('nivel_dificultad', 'Principiante'),
+                data.get('objetivo', 'General'),
+                rutina_id
+            ))
         
-        connection.commit()
-        return jsonify({'message': 'Rutina actualizada exitosamente'}), 200
+            connection.commit()
+            return jsonify({'message': 'Rutina actualizada exitosamente'}), 200
         
     except Exception as e:
-        if 'connection' in locals() and connection and connection.is_connected():
-            connection.rollback()
-        print(f"Error al actualizar rutina: {str(e)}")
+        logger.exception("Error al actualizar rutina")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/rutinas/<int:rutina_id>', methods=['DELETE'])
 @token_required
+@requires('gestionar_rutinas')
 def delete_rutina(current_user, rutina_id):
     """Eliminar una rutina (marcar como inactiva)"""
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
         
-        cursor = connection.cursor()
-        query = 'UPDATE rutinas SET activo = 0 WHERE id = %s'
-        cursor.execute(query, (rutina_id,))
-        connection.commit()
+            queries.execute(connection, 'rutina_desactivar', (rutina_id,))
+            connection.commit()
         
-        return jsonify({'message': 'Rutina eliminada exitosamente'}), 200
+            return jsonify({'message': 'Rutina eliminada exitosamente'}), 200
         
     except Exception as e:
-        if 'connection' in locals() and connection and connection.is_connected():
-            connection.rollback()
-        print(f"Error al eliminar rutina: {str(e)}")
+        logger.exception("Error al eliminar rutina")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 # --- ENDPOINTS DE CATEGORÍAS Y EJERCICIOS ---
 
 @app.route('/api/categorias-ejercicios', methods=['GET'])
 @token_required
+@conditional_get('categorias_ejercicios')
 def get_categorias_ejercicios(current_user):
     """Obtener todas las categorías de ejercicios"""
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
         
-        cursor = connection.cursor(dictionary=True)
-        query = 'SELECT * FROM categorias_ejercicios ORDER BY nombre'
-        cursor.execute(query)
-        categorias = cursor.fetchall()
+            categorias = queries.fetch_all(connection, 'categorias_ejercicios_listar')
         
-        return jsonify({'categorias': categorias}), 200
+            return jsonify({'categorias': categorias}), 200
         
     except Exception as e:
-        print(f"Error al obtener categorías: {str(e)}")
+        logger.exception("Error al obtener categorías")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/ejercicios', methods=['GET'])
 @token_required
+@conditional_get('ejercicios', 'categorias_ejercicios')
 def get_ejercicios(current_user):
     """Obtener todos los ejercicios"""
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
         
-        cursor = connection.cursor(dictionary=True)
-        query = '''
-            SELECT e.*, ce.nombre as categoria_nombre
-            FROM ejercicios e
-            JOIN categorias_ejercicios ce ON e.categoria_id = ce.id
-            ORDER BY e.nombre
-        '''
-        cursor.execute(query)
-        ejercicios = cursor.fetchall()
+            ejercicios = listado(connection, 'ejercicios_listar')
         
-        return jsonify({'ejercicios': ejercicios}), 200
+            return jsonify({'ejercicios': ejercicios}), 200
         
     except Exception as e:
-        print(f"Error al obtener ejercicios: {str(e)}")
+        logger.exception("Error al obtener ejercicios")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/ejercicios/categoria/<int:categoria_id>', methods=['GET'])
 @token_required
 def get_ejercicios_por_categoria(current_user, categoria_id):
     """Obtener ejercicios por categoría"""
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
         
-        cursor = connection.cursor(dictionary=True)
-        query = '''
-            SELECT e.*, ce.nombre as categoria_nombre
-            FROM ejercicios e
-            JOIN categorias_ejercicios ce ON e.categoria_id = ce.id
-            WHERE e.categoria_id = %s
-            ORDER BY e.nombre
-        '''
-        cursor.execute(query, (categoria_id,))
-        ejercicios = cursor.fetchall()
+            ejercicios = queries.fetch_all(connection, 'ejercicios_por_categoria', (categoria_id,))
         
-        return jsonify({'ejercicios': ejercicios}), 200
+            return jsonify({'ejercicios': ejercicios}), 200
         
     except Exception as e:
-        print(f"Error al obtener ejercicios por categoría: {str(e)}")
+        logger.exception("Error al obtener ejercicios por categoría")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 # Ruta para servir el archivo index.html
 @app.route('/')
@@ -1345,6 +1771,7 @@ def index():
 
 @app.route('/api/rutinas/<int:rutina_id>/asignar', methods=['POST'])
 @token_required
+@requires('gestionar_clientes')
 def asignar_rutina(current_user, rutina_id):
     """Asignar una rutina a un cliente"""
     try:
@@ -1356,119 +1783,656 @@ def asignar_rutina(current_user, rutina_id):
         if not cliente_id or not fecha_inicio:
             return jsonify({'error': 'cliente_id y fecha_inicio son requeridos'}), 400
         
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
         
-        cursor = connection.cursor()
+            # Verificar que la rutina existe
+            rutina = queries.fetch_one(connection, 'rutina_existe', (rutina_id,))
         
-        # Verificar que la rutina existe
-        query_rutina = 'SELECT id FROM rutinas WHERE id = %s'
-        cursor.execute(query_rutina, (rutina_id,))
-        rutina = cursor.fetchone()
+            if not rutina:
+                return jsonify({'error': 'Rutina no encontrada'}), 404
         
-        if not rutina:
-            return jsonify({'error': 'Rutina no encontrada'}), 404
+            entrenador_id = current_user.id
         
-        # Obtener el ID del entrenador a partir del email
-        query_entrenador = 'SELECT id FROM miembros WHERE email = %s'
-        cursor.execute(query_entrenador, (current_user,))
-        entrenador = cursor.fetchone()
+            # Verificar que el cliente existe
+            cliente = queries.fetch_one(connection, 'miembro_existe', (cliente_id,))
         
-        if not entrenador:
-            return jsonify({'error': 'Entrenador no encontrado'}), 404
+            if not cliente:
+                return jsonify({'error': 'Cliente no encontrado'}), 404
         
-        entrenador_id = entrenador[0]  # Acceder por índice, no por clave
+            # Verificar si ya existe una asignación activa
+            asignacion_existente = queries.fetch_one(connection, 'asignacion_activa', (rutina_id, cliente_id))
         
-        # Verificar que el cliente existe
-        query_cliente = 'SELECT id FROM miembros WHERE id = %s'
-        cursor.execute(query_cliente, (cliente_id,))
-        cliente = cursor.fetchone()
+            if asignacion_existente:
+                return jsonify({
+                    'error': f'El cliente {asignacion_existente["cliente_nombre"]} ya tiene esta rutina asignada activamente'
+                }), 400
         
-        if not cliente:
-            return jsonify({'error': 'Cliente no encontrado'}), 404
+            # Insertar la nueva asignación
+            cursor = queries.execute(connection, 'asignacion_insertar',
+                                     (rutina_id, cliente_id, entrenador_id, fecha_inicio, notas))
         
-        # Verificar si ya existe una asignación activa
-        query_existente = '''
-            SELECT rc.id, m.nombre as cliente_nombre 
-            FROM rutinas_clientes rc
-            JOIN miembros m ON rc.cliente_id = m.id
-            WHERE rc.rutina_id = %s AND rc.cliente_id = %s AND rc.estado = 'activa'
-        '''
-        cursor.execute(query_existente, (rutina_id, cliente_id))
-        asignacion_existente = cursor.fetchone()
+            connection.commit()
         
-        if asignacion_existente:
             return jsonify({
-                'error': f'El cliente {asignacion_existente[1]} ya tiene esta rutina asignada activamente'
-            }), 400
-        
-        # Insertar la nueva asignación
-        query_asignar = '''
-            INSERT INTO rutinas_clientes (rutina_id, cliente_id, entrenador_id, fecha_inicio, notas, estado)
-            VALUES (%s, %s, %s, %s, %s, 'activa')
-        '''
-        cursor.execute(query_asignar, (rutina_id, cliente_id, entrenador_id, fecha_inicio, notas))
-        
-        connection.commit()
-        
-        return jsonify({
-            'message': 'Rutina asignada exitosamente',
-            'asignacion_id': cursor.lastrowid
-        }), 201
+                'message': 'Rutina asignada exitosamente',
+                'asignacion_id': cursor.lastrowid
+            }), 201
         
     except Exception as e:
-        if 'connection' in locals() and connection and connection.is_connected():
-            connection.rollback()
-        print(f"Error al asignar rutina: {str(e)}")
+        logger.exception("Error al asignar rutina")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/rutinas/<int:rutina_id>/clientes-asignados', methods=['GET'])
 @token_required
+@requires('gestionar_clientes')
 def get_clientes_asignados(current_user, rutina_id):
     """Obtener los clientes que ya tienen esta rutina asignada"""
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
         
-        cursor = connection.cursor(dictionary=True)
+            # Verificar que la rutina existe
+            rutina = queries.fetch_one(connection, 'rutina_resumen', (rutina_id,))
         
-        # Verificar que la rutina existe
-        query_rutina = 'SELECT id, nombre FROM rutinas WHERE id = %s'
-        cursor.execute(query_rutina, (rutina_id,))
-        rutina = cursor.fetchone()
+            if not rutina:
+                return jsonify({'error': 'Rutina no encontrada'}), 404
         
-        if not rutina:
-            return jsonify({'error': 'Rutina no encontrada'}), 404
+            # Obtener clientes asignados activamente
+            clientes_asignados = queries.fetch_all(connection, 'rutina_clientes_asignados', (rutina_id,))
         
-        # Obtener clientes asignados activamente
-        query_clientes = '''
-            SELECT m.id, m.nombre, m.email, rc.fecha_inicio, rc.estado
-            FROM rutinas_clientes rc
-            JOIN miembros m ON rc.cliente_id = m.id
-            WHERE rc.rutina_id = %s AND rc.estado = 'activa'
-            ORDER BY m.nombre
-        '''
-        cursor.execute(query_clientes, (rutina_id,))
-        clientes_asignados = cursor.fetchall()
+            return jsonify({
+                'rutina': rutina,
+                'clientes_asignados': clientes_asignados
+            }), 200
         
+    except Exception as e:
+        logger.exception("Error al obtener clientes asignados")
+        return jsonify({'error': str(e)}), 500
+
+# --- ENTRADAS Y SALIDAS ---
+
+def guardar_asistencias(lote):
+    """Guarda un lote de la cola de escritura diferida en una transacción"""
+    entradas = [
+        (r['registro_uuid'], r['miembro_id'], datetime.fromisoformat(r['fecha_hora_entrada']),
+         r['tipo_asistencia'], r['notas'], r['creado_por'])
+        for r in lote if r['tipo'] == 'entrada'
+    ]
+    with db.connection() as connection:
+        # Primero las entradas: una salida del mismo lote cierra una de ellas
+        if entradas:
+            queries.execute_many(connection, 'asistencias_insertar_lote', entradas)
+        for r in lote:
+            if r['tipo'] != 'salida':
+                continue
+            salida = datetime.fromisoformat(r['fecha_hora_salida'])
+            if r.get('registro_uuid'):
+                queries.execute(connection, 'asistencia_cerrar_por_uuid', (salida, r['registro_uuid']))
+            else:
+                queries.execute(connection, 'asistencia_cerrar_por_id', (salida, r['id']))
+        connection.commit()
+    result_cache.invalidate('asistencias')
+
+def cargar_sesiones_abiertas():
+    with db.connection() as connection:
+        return queries.fetch_all(connection, 'asistencias_abiertas_hoy')
+
+asistencias_queue = attendance.WriteBehindQueue(
+    guardar_asistencias,
+    app.config['ASISTENCIAS_JOURNAL_DIR'],
+    name='asistencias',
+    interval=app.config['ASISTENCIAS_FLUSH_INTERVAL'],
+    batch_size=app.config['ASISTENCIAS_BATCH_SIZE'],
+    fsync=app.config['ASISTENCIAS_JOURNAL_FSYNC'],
+    permanent_errors=(ValueError, TypeError, KeyError, DataError, IntegrityError)
+)
+session_tracker = attendance.SessionTracker(
+    cargar_sesiones_abiertas,
+    asistencias_queue.pending,
+    refresh_interval=app.config['ASISTENCIAS_REFRESH']
+)
+
+# Lo que quedó en el diario de una ejecución anterior se guarda al arrancar,
+# no recién con la primera entrada o salida
+try:
+    asistencias_queue.start()
+except OSError:
+    logger.exception("Error al iniciar la cola de asistencias")
+
+def validar_membresia(miembro_id):
+    """
+    Devuelve ``(miembro, motivo)``: los datos del miembro desde el índice en
+    memoria (o la base de datos si aún no está) y el motivo por el que no
+    puede entrar, o None si puede.
+    """
+    # Con la base de datos caída se valida con lo que ya está en memoria
+    try:
+        member_index.refresh()
+    except Error as e:
+        logger.error("Error al actualizar el índice de miembros: %s", e)
+    miembro = member_index.get(miembro_id)
+    if miembro is None:
+        with db_connection() as connection:
+            if not connection:
+                raise Error("Error al conectar a la base de datos")
+            miembro = queries.fetch_one(connection, 'miembro_por_id', (miembro_id,))
+        if miembro is None:
+            return None, 'Miembro no encontrado'
+        member_index.upsert(miembro)
+    if not miembro['activo']:
+        return miembro, 'La membresía del miembro está inactiva'
+    vencimiento = miembro.get('fecha_vencimiento_membresia')
+    if vencimiento is not None and vencimiento < datetime.now().date():
+        return miembro, 'La membresía del miembro está vencida'
+    return miembro, None
+
+def refrescar_sesiones():
+    try:
+        session_tracker.refresh()
+    except Error as e:
+        logger.error("Error al cargar las sesiones abiertas: %s", e)
+
+def serializar_sesion(sesion, nombre=None):
+    return {
+        'registro_uuid': sesion['registro_uuid'],
+        'id': sesion['id'],
+        'miembro_id': sesion['miembro_id'],
+        'miembro_nombre': nombre,
+        'fecha_hora_entrada': sesion['fecha_hora_entrada'],
+    }
+
+@app.route('/api/asistencias/registrar_entrada', methods=['POST'])
+@token_required
+@requires('gestionar_asistencias')
+def registrar_entrada(current_user):
+    """
+    Registra la entrada de un miembro.
+
+    La membresía se valida con el índice en memoria y la entrada se confirma
+    en cuanto queda en el diario; la fila se inserta después, en lote.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        miembro_id = int(data.get('miembro_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'miembro_id es obligatorio'}), 400
+    tipo_asistencia = data.get('tipo_asistencia') or 'entrenamiento'
+    if tipo_asistencia not in ('entrenamiento', 'clase', 'otro'):
+        return jsonify({'error': 'tipo_asistencia no válido'}), 400
+    # Se valida aquí: la fila se inserta después y un valor inválido
+    # fallaría en el lote, no en esta solicitud
+    notas = data.get('notas')
+    if notas is not None and not isinstance(notas, str):
+        return jsonify({'error': 'notas debe ser texto'}), 400
+    if notas is not None and len(notas.encode('utf-8')) > 65535:
+        return jsonify({'error': 'notas es demasiado largo'}), 400
+    
+    try:
+        miembro, motivo = validar_membresia(miembro_id)
+        if miembro is None:
+            return jsonify({'error': motivo}), 404
+        if motivo:
+            return jsonify({'error': motivo, 'miembro_id': miembro_id}), 403
+        
+        refrescar_sesiones()
+        ahora = datetime.now().replace(microsecond=0)
+        sesion = {
+            'id': None,
+            'registro_uuid': uuid.uuid4().hex,
+            'miembro_id': miembro_id,
+            'fecha_hora_entrada': ahora,
+        }
+        abierta = session_tracker.open(sesion)
+        if abierta is not None:
+            return jsonify({
+                'error': 'El miembro ya tiene una entrada sin salida',
+                'asistencia': serializar_sesion(abierta, miembro['nombre'])
+            }), 409
+        
+        asistencias_queue.submit({
+            'tipo': 'entrada',
+            'registro_uuid': sesion['registro_uuid'],
+            'miembro_id': miembro_id,
+            'fecha_hora_entrada': ahora.isoformat(),
+            'tipo_asistencia': tipo_asistencia,
+            'notas': notas,
+            'creado_por': current_user.id,
+        })
         return jsonify({
-            'rutina': rutina,
-            'clientes_asignados': clientes_asignados
-        }), 200
+            'success': True,
+            'message': 'Entrada registrada',
+            'asistencia': serializar_sesion(sesion, miembro['nombre'])
+        }), 201
+    except Exception as e:
+        logger.exception("Error al registrar entrada")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/asistencias/registrar_salida', methods=['POST'])
+@token_required
+@requires('gestionar_asistencias')
+def registrar_salida(current_user):
+    """Registra la salida del miembro, cerrando su entrada abierta de hoy"""
+    data = request.get_json(silent=True) or {}
+    try:
+        miembro_id = int(data.get('miembro_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'miembro_id es obligatorio'}), 400
+    
+    try:
+        refrescar_sesiones()
+        sesion = session_tracker.close(miembro_id)
+        if sesion is None:
+            return jsonify({'error': 'El miembro no tiene una entrada abierta hoy'}), 404
+        
+        salida = datetime.now().replace(microsecond=0)
+        asistencias_queue.submit({
+            'tipo': 'salida',
+            'registro_uuid': sesion['registro_uuid'],
+            'id': sesion['id'],
+            'miembro_id': miembro_id,
+            'fecha_hora_salida': salida.isoformat(),
+        })
+        respuesta = serializar_sesion(sesion)
+        respuesta['fecha_hora_salida'] = salida
+        return jsonify({'success': True, 'message': 'Salida registrada', 'asistencia': respuesta}), 200
+    except Exception as e:
+        logger.exception("Error al registrar salida")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/asistencias/hoy', methods=['GET'])
+@token_required
+@requires('gestionar_asistencias')
+def get_asistencias_hoy(current_user):
+    """Asistencias de hoy, incluidas las registradas que aún no se guardaron"""
+    try:
+        pendientes = asistencias_queue.pending()
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            hoy = datetime.combine(datetime.now().date(), datetime.min.time())
+            asistencias = queries.fetch_all(connection, 'asistencias_del_dia', (hoy, hoy + timedelta(days=1)))
+        
+        por_uuid = {a['registro_uuid']: a for a in asistencias if a['registro_uuid']}
+        por_id = {a['id']: a for a in asistencias}
+        for registro in pendientes:
+            if registro['tipo'] == 'entrada':
+                if registro['registro_uuid'] in por_uuid:
+                    continue
+                entrada = datetime.fromisoformat(registro['fecha_hora_entrada'])
+                if entrada < hoy:
+                    continue
+                miembro = member_index.get(registro['miembro_id']) or {}
+                fila = {
+                    'id': None,
+                    'registro_uuid': registro['registro_uuid'],
+                    'miembro_id': registro['miembro_id'],
+                    'miembro_nombre': miembro.get('nombre'),
+                    'fecha_hora_entrada': entrada,
+                    'fecha_hora_salida': None,
+                    'tipo_asistencia': registro['tipo_asistencia'],
+                }
+                asistencias.append(fila)
+                por_uuid[fila['registro_uuid']] = fila
+            else:
+                fila = por_uuid.get(registro.get('registro_uuid')) or por_id.get(registro.get('id'))
+                if fila is not None:
+                    fila['fecha_hora_salida'] = datetime.fromisoformat(registro['fecha_hora_salida'])
         
+        return jsonify({
+            'fecha': hoy.date().isoformat(),
+            'asistencias': asistencias,
+            'pendientes': len(pendientes)
+        }), 200
     except Exception as e:
-        print(f"Error al obtener clientes asignados: {str(e)}")
+        logger.exception("Error al obtener asistencias de hoy")
+        return jsonify({'error': str(e)}), 500
+
+# --- OCUPACIÓN EN VIVO ---
+
+def serializar_ocupacion(ocupacion):
+    aforo = app.config['AFORO_MAXIMO'] or None
+    datos = dict(ocupacion)
+    datos['aforo'] = aforo
+    datos['disponible'] = max(aforo - ocupacion['ocupacion'], 0) if aforo else None
+    return datos
+
+@app.route('/api/asistencias/ocupacion', methods=['GET'])
+@token_required
+@requires('gestionar_asistencias')
+def get_ocupacion(current_user):
+    """Personas dentro del gimnasio ahora, desde las sesiones en memoria"""
+    refrescar_sesiones()
+    if not session_tracker.loaded:
+        return jsonify({'error': 'Error al cargar las sesiones abiertas'}), 503
+    return jsonify(serializar_ocupacion(session_tracker.occupancy())), 200
+
+@app.route('/api/asistencias/ocupacion/stream', methods=['GET'])
+@token_required
+@requires('gestionar_asistencias')
+def stream_ocupacion(current_user):
+    """
+    Stream SSE de la ocupación para las pantallas de recepción.
+
+    Envía la ocupación al conectar y después con cada entrada o salida. Las
+    pantallas no consultan la base de datos: mientras esperan solo se
+    recargan las sesiones del worker, como mucho cada ASISTENCIAS_REFRESH
+    segundos, para incorporar lo registrado en otros workers.
+    """
+    refrescar_sesiones()
+    if not session_tracker.loaded:
+        return jsonify({'error': 'Error al cargar las sesiones abiertas'}), 503
+    
+    proveedor = app.json
+    keepalive = app.config['OCUPACION_KEEPALIVE']
+    duracion = app.config['OCUPACION_STREAM_MAX_SECONDS']
+    
+    def evento(ocupacion):
+        datos = proveedor.dumps(serializar_ocupacion(ocupacion))
+        return f"event: ocupacion\ndata: {datos}\n\n"
+    
+    def generar():
+        fin = time.monotonic() + duracion
+        ocupacion = session_tracker.occupancy()
+        yield 'retry: 3000\n' + evento(ocupacion)
+        # Cada conexión libera su hilo al cumplir la duración máxima
+        while time.monotonic() < fin:
+            nueva = session_tracker.wait_for_change(ocupacion['version'], keepalive)
+            if nueva['version'] == ocupacion['version']:
+                refrescar_sesiones()
+                nueva = session_tracker.occupancy()
+            if nueva['version'] == ocupacion['version']:
+                # El keepalive también detecta las pantallas desconectadas
+                yield ': keepalive\n\n'
+                continue
+            ocupacion = nueva
+            yield evento(ocupacion)
+    
+    # no-transform: cada evento debe salir en cuanto se genera, sin comprimir
+    headers = {'Cache-Control': 'no-cache, no-transform', 'X-Accel-Buffering': 'no'}
+    return Response(generar(), mimetype='text/event-stream', headers=headers)
+
+# --- SINCRONIZACIÓN INCREMENTAL ---
+
+# Tablas que se pueden sincronizar y el permiso necesario para leerlas
+SYNC_TABLAS = {
+    'miembros': 'gestionar_clientes',
+    'clases': None,
+    'rutinas': None,
+    'facturas': 'gestionar_pagos',
+    'inventario': None,
+}
+
+@app.route('/api/sync', methods=['GET'])
+@token_required
+def sync_cambios(current_user):
+    """
+    Cambios desde el token ``since`` para mantener una réplica local.
+
+    Devuelve las filas creadas o modificadas (``cambios``) y los ids
+    eliminados (``eliminados``) por tabla, y el token para la siguiente
+    llamada. Sin ``since``, o si es más antiguo que la retención de los
+    eliminados, envía todas las filas con ``completo: true`` y el cliente
+    reemplaza su copia. ``tablas`` limita la respuesta (separadas por coma);
+    solo se incluyen las tablas que el rol puede leer. Una fila puede
+    repetirse en dos llamadas seguidas, así que aplicarla debe ser idempotente.
+    """
+    pedidas = [t.strip() for t in request.args.get('tablas', '').split(',') if t.strip()] or list(SYNC_TABLAS)
+    desconocidas = [t for t in pedidas if t not in SYNC_TABLAS]
+    if desconocidas:
+        return jsonify({'error': f"Tablas no válidas: {', '.join(desconocidas)}"}), 400
+    
+    desde = None
+    since = request.args.get('since')
+    if since:
+        posicion = decodificar_cursor(since)
+        try:
+            desde = datetime.fromisoformat(posicion[0])
+        except (TypeError, ValueError, IndexError, KeyError):
+            return jsonify({'error': 'since no válido'}), 400
+    
+    try:
+        permission_engine.refresh()
+    except Error as e:
+        logger.error("Error al cargar permisos: %s", e)
+        if not permission_engine.loaded:
+            return jsonify({'error': 'Error al conectar a la base de datos'}), 503
+    tablas = [t for t in pedidas
+              if SYNC_TABLAS[t] is None or permission_engine.allows(current_user.role, SYNC_TABLAS[t])]
+    
+    try:
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            
+            # El token es la hora del servidor antes de leer los cambios
+            ahora = queries.fetch_one(connection, 'sync_ahora')['ahora']
+            completo = desde is None or desde < ahora - timedelta(days=app.config['SYNC_TOMBSTONE_DAYS'])
+            limite = None if completo else desde - timedelta(seconds=app.config['SYNC_OVERLAP_SECONDS'])
+            
+            cambios = {}
+            for tabla in tablas:
+                if completo:
+                    filas = queries.fetch_all(connection, f'sync_{tabla}_todos')
+                else:
+                    filas = queries.fetch_all(connection, f'sync_{tabla}_cambios', (limite,))
+                if tabla == 'miembros':
+                    for fila in filas:
+                        decodificar_condiciones(fila)
+                cambios[tabla] = filas
+            
+            eliminados = {tabla: [] for tabla in tablas}
+            if not completo:
+                for fila in queries.fetch_all(connection, 'sync_eliminados_desde', (limite,)):
+                    if fila['tabla'] in eliminados:
+                        eliminados[fila['tabla']].append(fila['registro_id'])
+            
+            return jsonify({
+                'token': codificar_cursor([ahora.isoformat(sep=' ')]),
+                'completo': completo,
+                'cambios': cambios,
+                'eliminados': eliminados
+            }), 200
+    except Exception as e:
+        logger.exception("Error en la sincronización")
+        return jsonify({'error': str(e)}), 500
+
+# --- ENDPOINTS DE CONTEOS ---
+# Devuelven solo números: los paneles no descargan filas para contarlas
+
+def conteo_miembros(connection):
+    """Filas (rol_id, rol_nombre, activo, total) del conteo agrupado"""
+    return queries.fetch_all(connection, 'miembros_conteo_por_rol')
+
+@app.route('/api/miembros/count', methods=['GET'])
+@token_required
+@requires('gestionar_clientes')
+def contar_miembros(current_user):
+    """Número de miembros, opcionalmente por rol (id o nombre) y estado"""
+    rol = request.args.get('rol', '').lower()
+    activo = request.args.get('activo')
+    if activo is not None:
+        activo = 1 if activo.lower() in ('1', 'true', 'si', 'sí') else 0
+    try:
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            total = 0
+            for fila in conteo_miembros(connection):
+                if rol and rol not in (str(fila['rol_id']), (fila['rol_nombre'] or '').lower()):
+                    continue
+                if activo is not None and int(fila['activo'] or 0) != activo:
+                    continue
+                total += fila['total']
+            return jsonify({'count': total}), 200
+    except Error as e:
+        logger.exception("Error al contar miembros")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/miembros/resumen', methods=['GET'])
+@token_required
+@requires('gestionar_clientes')
+def resumen_miembros(current_user):
+    """Miembros por rol y estado en una sola consulta"""
+    try:
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            por_rol = {}
+            for fila in conteo_miembros(connection):
+                nombre = fila['rol_nombre'] or str(fila['rol_id'])
+                conteo = por_rol.setdefault(nombre, {'total': 0, 'activos': 0, 'inactivos': 0})
+                conteo['total'] += fila['total']
+                conteo['activos' if fila['activo'] else 'inactivos'] += fila['total']
+            return jsonify({
+                'total': sum(conteo['total'] for conteo in por_rol.values()),
+                'por_rol': por_rol
+            }), 200
+    except Error as e:
+        logger.exception("Error al resumir miembros")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/clases/count', methods=['GET'])
+@token_required
+def contar_clases(current_user):
+    """Número de clases; con estado=activo solo las que tienen horario"""
+    estado = request.args.get('estado')
+    if estado not in (None, 'activo'):
+        return jsonify({'error': 'estado debe ser activo'}), 400
+    try:
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            nombre = 'clases_contar_activas' if estado == 'activo' else 'clases_contar'
+            return jsonify({'count': queries.fetch_one(connection, nombre)['total']}), 200
+    except Error as e:
+        logger.exception("Error al contar clases")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/facturas/count', methods=['GET'])
+@token_required
+@requires('gestionar_pagos')
+def contar_facturas(current_user):
+    """Número y monto de facturas, por estado (p. ej. ?estado=pendiente)"""
+    estado = request.args.get('estado')
+    try:
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            por_estado = {
+                fila['estado']: {'count': fila['total'], 'monto': float(fila['monto'])}
+                for fila in queries.fetch_all(connection, 'facturas_conteo_por_estado')
+            }
+        if estado:
+            return jsonify(por_estado.get(estado, {'count': 0, 'monto': 0.0})), 200
+        return jsonify({
+            'count': sum(conteo['count'] for conteo in por_estado.values()),
+            'monto': sum(conteo['monto'] for conteo in por_estado.values()),
+            'por_estado': por_estado
+        }), 200
+    except Error as e:
+        logger.exception("Error al contar facturas")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/asistencias/count', methods=['GET'])
+@token_required
+@requires('ver_reportes')
+def contar_asistencias(current_user):
+    """Asistencias de un día (por defecto hoy) y cuántas siguen en curso"""
+    try:
+        fecha = datetime.strptime(request.args.get('fecha') or datetime.now().strftime('%Y-%m-%d'), '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido. Use YYYY-MM-DD.'}), 400
+    try:
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+            # Rango sobre la columna indexada en lugar de DATE(fecha_hora_entrada)
+            conteo = queries.fetch_one(connection, 'asistencias_conteo_rango',
+                                       (fecha, fecha + timedelta(days=1)))
+            return jsonify({
+                'fecha': fecha.strftime('%Y-%m-%d'),
+                'count': conteo['total'],
+                'en_curso': int(conteo['en_curso'])
+            }), 200
+    except Error as e:
+        logger.exception("Error al contar asistencias")
+        return jsonify({'error': str(e)}), 500
+
+def calcular_estadisticas_panel():
+    """KPIs del panel de administración; las consultas se ejecutan en paralelo"""
+    hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    inicio_mes = hoy.replace(day=1)
+    inicio_mes_siguiente = (inicio_mes + timedelta(days=32)).replace(day=1)
+    limite_vencimiento = hoy + timedelta(days=app.config['DASHBOARD_DIAS_VENCIMIENTO'])
+
+    r = consultas_en_paralelo({
+        'miembros': conteo_miembros,
+        'clases': lambda c: queries.fetch_one(c, 'clases_contar')['total'],
+        'clases_activas': lambda c: queries.fetch_one(c, 'clases_contar_activas')['total'],
+        'asistencias': lambda c: queries.fetch_one(c, 'asistencias_conteo_rango', (hoy, hoy + timedelta(days=1))),
+        'por_vencer': lambda c: queries.fetch_one(c, 'miembros_por_vencer_contar', (hoy.date(), limite_vencimiento.date()))['total'],
+        'ingresos': lambda c: queries.fetch_one(c, 'facturas_ingresos_rango', (inicio_mes.date(), inicio_mes_siguiente.date())),
+        'facturas': lambda c: queries.fetch_all(c, 'facturas_conteo_por_estado'),
+        'inventario': lambda c: queries.fetch_one(c, 'inventario_alertas', (app.config['INVENTARIO_STOCK_MINIMO'],)),
+    })
+
+    por_rol = {}
+    for fila in r['miembros']:
+        conteo = por_rol.setdefault(fila['rol_nombre'] or str(fila['rol_id']), {'total': 0, 'activos': 0})
+        conteo['total'] += fila['total']
+        if fila['activo']:
+            conteo['activos'] += fila['total']
+    pendientes = next((f for f in r['facturas'] if f['estado'] == 'pendiente'), None)
+
+    return {
+        'miembros': {
+            'total': sum(conteo['total'] for conteo in por_rol.values()),
+            'clientes': por_rol.get('cliente', {}).get('total', 0),
+            'clientes_activos': por_rol.get('cliente', {}).get('activos', 0),
+            'entrenadores': por_rol.get('entrenador', {}).get('total', 0),
+        },
+        'clases': {'total': r['clases'], 'activas': r['clases_activas']},
+        'asistencias_hoy': {
+            'total': r['asistencias']['total'],
+            'en_curso': int(r['asistencias']['en_curso']),
+        },
+        'membresias_por_vencer': {
+            'dias': app.config['DASHBOARD_DIAS_VENCIMIENTO'],
+            'total': r['por_vencer'],
+        },
+        'ingresos_mes': {
+            'total': float(r['ingresos']['total']),
+            'facturas': r['ingresos']['facturas'],
+        },
+        'facturas_pendientes': {
+            'total': pendientes['total'] if pendientes else 0,
+            'monto': float(pendientes['monto']) if pendientes else 0.0,
+        },
+        'inventario': {
+            'agotados': int(r['inventario']['agotados']),
+            'stock_bajo': int(r['inventario']['stock_bajo']),
+            'en_reparacion': int(r['inventario']['en_reparacion']),
+        },
+        'generado': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+@app.route('/api/dashboard/stats', methods=['GET'])
+@token_required
+@requires('ver_reportes')
+def dashboard_stats(current_user):
+    """Todos los indicadores del panel en una sola solicitud (con caché corta)"""
+    try:
+        estadisticas = result_cache.get(
+            'dashboard_stats', calcular_estadisticas_panel,
+            tables=('miembros', 'clases', 'asistencias', 'facturas', 'inventario')
+        )
+        return jsonify(estadisticas), 200
+    except Error as e:
+        logger.exception("Error al calcular estadísticas del panel")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 # --- ENDPOINT DE INGRESOS MEMBRESÍAS ---
 
@@ -1478,6 +2442,7 @@ def get_clientes_asignados(current_user, rutina_id):
 
 @app.route('/api/reportes/asistencia', methods=['GET'])
 @token_required
+@requires('ver_reportes')
 def reporte_asistencia(current_user):
     """Obtener reporte de asistencia por rango de tiempo"""
     try:
@@ -1486,12 +2451,6 @@ def reporte_asistencia(current_user):
         fecha_inicio = request.args.get('fecha_inicio')
         fecha_fin = request.args.get('fecha_fin')
         
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        
-        cursor = connection.cursor(dictionary=True)
-        
         # Calcular fechas según el rango
         if rango == 'dia':
             fecha_inicio = datetime.now().strftime('%Y-%m-%d')
@@ -1503,379 +2462,381 @@ def reporte_asistencia(current_user):
             fecha_inicio = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
             fecha_fin = datetime.now().strftime('%Y-%m-%d')
         # Para personalizado, usar las fechas proporcionadas
+        try:
+            inicio = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
+            fin = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return jsonify({'error': 'fecha_inicio y fecha_fin deben tener el formato YYYY-MM-DD'}), 400
         
-        # Obtener el ID del entrenador
-        query_entrenador = 'SELECT id FROM miembros WHERE email = %s'
-        cursor.execute(query_entrenador, (current_user,))
-        entrenador = cursor.fetchone()
-        
-        if not entrenador:
-            return jsonify({'error': 'Entrenador no encontrado'}), 404
-        
-        entrenador_id = entrenador['id']
-        
-        # Consulta para obtener asistencias por día
-        query_asistencia = '''
-            SELECT 
-                DATE(a.fecha_hora_entrada) as fecha,
-                COUNT(*) as total_asistencias,
-                COUNT(DISTINCT a.miembro_id) as clientes_unicos
-            FROM asistencias a
-            JOIN miembros m ON a.miembro_id = m.id
-            WHERE DATE(a.fecha_hora_entrada) BETWEEN %s AND %s
-            AND m.rol_id = 3  -- Solo clientes
-            GROUP BY DATE(a.fecha_hora_entrada)
-            ORDER BY fecha
-        '''
-        
-        cursor.execute(query_asistencia, (fecha_inicio, fecha_fin))
-        asistencias_por_dia = cursor.fetchall()
-        
-        # Consulta para obtener estadísticas generales
-        query_stats = '''
-            SELECT 
-                COUNT(*) as total_asistencias,
-                COUNT(DISTINCT a.miembro_id) as clientes_unicos,
-                AVG(TIMESTAMPDIFF(MINUTE, a.fecha_hora_entrada, COALESCE(a.fecha_hora_salida, NOW()))) as tiempo_promedio
-            FROM asistencias a
-            JOIN miembros m ON a.miembro_id = m.id
-            WHERE DATE(a.fecha_hora_entrada) BETWEEN %s AND %s
-            AND m.rol_id = 3
-        '''
-        
-        cursor.execute(query_stats, (fecha_inicio, fecha_fin))
-        estadisticas = cursor.fetchone()
-        
-        # Formatear datos para el gráfico
-        datos_grafico = []
-        for asistencia in asistencias_por_dia:
-            # Verificar si fecha es string o datetime
-            if isinstance(asistencia['fecha'], str):
-                fecha = datetime.strptime(asistencia['fecha'], '%Y-%m-%d')
-            else:
+        # Los días cerrados salen del resumen diario; hoy se calcula en vivo
+        hoy = datetime.now().date()
+        cerrados_fin = min(fin, hoy - timedelta(days=1))
+        incluye_hoy = inicio <= hoy <= fin
+        hoy_desde = datetime.combine(hoy, datetime.min.time())
+        hoy_hasta = hoy_desde + timedelta(days=1) if incluye_hoy else hoy_desde
+        
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
+        
+            asistencias_por_dia = []
+            totales = {'total_asistencias': 0, 'visitas_cerradas': 0, 'minutos_totales': 0}
+            if inicio <= cerrados_fin:
+                asistencias_por_dia = queries.fetch_all(connection, 'reporte_asistencia_por_dia', (inicio, cerrados_fin))
+                totales = queries.fetch_one(connection, 'reporte_asistencia_totales', (inicio, cerrados_fin))
+            if incluye_hoy:
+                en_curso = queries.fetch_one(connection, 'reporte_asistencia_en_curso', (hoy_desde, hoy_hasta))
+                if en_curso['total_asistencias']:
+                    asistencias_por_dia.append({
+                        'fecha': hoy,
+                        'total_asistencias': en_curso['total_asistencias'],
+                        'clientes_unicos': en_curso['clientes_unicos']
+                    })
+                totales = {clave: totales[clave] + en_curso[clave] for clave in totales}
+            clientes = queries.fetch_one(connection, 'reporte_asistencia_clientes_unicos',
+                                         (inicio, cerrados_fin, hoy_desde, hoy_hasta))
+        
+            # El tiempo promedio considera las visitas con salida registrada
+            estadisticas = {
+                'total_asistencias': int(totales['total_asistencias']),
+                'clientes_unicos': clientes['clientes_unicos'],
+                'tiempo_promedio': (round(totales['minutos_totales'] / totales['visitas_cerradas'], 4)
+                                    if totales['visitas_cerradas'] else None)
+            }
+        
+            # Formatear datos para el gráfico
+            datos_grafico = []
+            for asistencia in asistencias_por_dia:
                 fecha = asistencia['fecha']
-            
-            datos_grafico.append({
-                'fecha': fecha.strftime('%Y-%m-%d'),
-                'dia': fecha.strftime('%a')[:3],  # Lun, Mar, etc.
-                'asistencias': asistencia['total_asistencias'],
-                'clientes_unicos': asistencia['clientes_unicos']
-            })
+                datos_grafico.append({
+                    'fecha': fecha.strftime('%Y-%m-%d'),
+                    'dia': fecha.strftime('%a')[:3],  # Lun, Mar, etc.
+                    'asistencias': asistencia['total_asistencias'],
+                    'clientes_unicos': asistencia['clientes_unicos']
+                })
         
-        return jsonify({
-            'datos_grafico': datos_grafico,
-            'estadisticas': estadisticas,
-            'rango': rango,
-            'fecha_inicio': fecha_inicio,
-            'fecha_fin': fecha_fin
-        }), 200
+            return jsonify({
+                'datos_grafico': datos_grafico,
+                'estadisticas': estadisticas,
+                'rango': rango,
+                'fecha_inicio': fecha_inicio,
+                'fecha_fin': fecha_fin
+            }), 200
         
     except Exception as e:
-        print(f"Error en reporte de asistencia: {str(e)}")
+        logger.exception("Error en reporte de asistencia")
         return jsonify({'error': str(e)}), 500
+
+def cargar_estancias(inicio, fin):
+    """
+    Entradas y salidas entre dos fechas (incluidas) como arreglos de
+    segundos desde la medianoche de ``inicio``, y los segundos de ahora.
+    """
+    desde = datetime.combine(inicio, datetime.min.time())
+    hasta = datetime.combine(fin, datetime.min.time()) + timedelta(days=1)
+    max_estancia = app.config['HEATMAP_MAX_ESTANCIA_MINUTOS'] * 60
+    # Las estancias que empezaron antes del rango también ocupan sus primeras franjas
+    params = (desde, desde, desde - timedelta(seconds=max_estancia), hasta)
+    with db.connection() as connection:
+        _, bloques = queries.stream(connection, 'asistencias_estancias', params,
+                                    dictionary=False, chunk_size=10000)
+        try:
+            entradas, salidas = heatmap.to_arrays(bloques)
+        except Exception:
+            connection.discard()
+            raise
+    return entradas, salidas, (datetime.now() - desde).total_seconds()
+
+def calcular_heatmap(inicio, fin):
+    """Ocupación promedio por día de la semana y franja de 15 minutos entre dos fechas"""
+    entradas, salidas, ahora = cargar_estancias(inicio, fin)
+    max_estancia = app.config['HEATMAP_MAX_ESTANCIA_MINUTOS'] * 60
+    dias = (fin - inicio).days + 1
+    resultado = heatmap.weekly(entradas, salidas, inicio.weekday(), dias,
+                               ahora=ahora, max_estancia=max_estancia)
+    promedio = resultado['promedio']
+    dia_pico, franja_pico = divmod(int(promedio.argmax()), promedio.shape[1])
+    etiquetas = heatmap.franjas()
+    return {
+        'fecha_inicio': inicio.isoformat(),
+        'fecha_fin': fin.isoformat(),
+        'intervalo_minutos': 15,
+        'dias': list(heatmap.DIAS_SEMANA),
+        'franjas': etiquetas,
+        'promedio': promedio.round(2).tolist(),
+        'maximo': resultado['maximo'].round(2).tolist(),
+        'entradas': resultado['entradas'].round(2).tolist(),
+        'dias_por_semana': resultado['dias_por_semana'].tolist(),
+        'visitas': int(((entradas >= 0) & (entradas < dias * 86400)).sum()),
+        'pico': {
+            'dia': heatmap.DIAS_SEMANA[dia_pico],
+            'franja': etiquetas[franja_pico],
+            'promedio': round(float(promedio[dia_pico, franja_pico]), 2),
+        },
+        'generado': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+@app.route('/api/reportes/asistencia/heatmap', methods=['GET'])
+@token_required
+@requires('ver_reportes')
+def reporte_asistencia_heatmap(current_user):
+    """
+    Personas presentes por día de la semana y franja de 15 minutos.
+
+    Por defecto usa las últimas cuatro semanas; el resultado se guarda en
+    caché por rango.
+    """
+    hoy = datetime.now().date()
+    try:
+        fin = datetime.strptime(request.args.get('fecha_fin') or hoy.isoformat(), '%Y-%m-%d').date()
+        inicio = datetime.strptime(request.args.get('fecha_inicio') or (fin - timedelta(days=27)).isoformat(),
+                                   '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'fecha_inicio y fecha_fin deben tener el formato YYYY-MM-DD'}), 400
+    if inicio > fin:
+        return jsonify({'error': 'fecha_inicio no puede ser posterior a fecha_fin'}), 400
+    if (fin - inicio).days + 1 > app.config['HEATMAP_MAX_DIAS']:
+        return jsonify({'error': f"El rango no puede superar {app.config['HEATMAP_MAX_DIAS']} días"}), 400
+    
+    try:
+        # Un rango que incluye hoy cambia con cada entrada; uno cerrado casi nunca
+        ttl = app.config['DASHBOARD_CACHE_TTL'] if fin >= hoy else app.config['HEATMAP_CACHE_TTL']
+        resultado = result_cache.get(('heatmap', inicio, fin), lambda: calcular_heatmap(inicio, fin), ttl=ttl)
+        return jsonify(resultado), 200
+    except Exception as e:
+        logger.exception("Error al calcular el mapa de calor de asistencia")
+        return jsonify({'error': str(e)}), 500
+
+# Un solo cálculo del pronóstico a la vez por worker (job nocturno o
+# recálculo lanzado por una consulta)
+_calculando_pronostico = threading.Lock()
+
+def actualizar_pronostico():
+    """
+    Calcula el pronóstico de ocupación desde hoy con las últimas
+    PRONOSTICO_SEMANAS semanas completas y lo guarda en
+    pronostico_asistencia. Devuelve False si falló o si ya había un cálculo
+    en curso.
+    """
+    if not _calculando_pronostico.acquire(blocking=False):
+        return False
+    try:
+        hoy = datetime.now().date()
+        inicio = hoy - timedelta(weeks=app.config['PRONOSTICO_SEMANAS'])
+        entradas, salidas, _ = cargar_estancias(inicio, hoy - timedelta(days=1))
+        ocupacion, llegadas = heatmap.daily(
+            entradas, salidas, (hoy - inicio).days,
+            max_estancia=app.config['HEATMAP_MAX_ESTANCIA_MINUTOS'] * 60
+        )
+        resultado = forecast.forecast(ocupacion, llegadas, inicio.weekday(), app.config['PRONOSTICO_DIAS'])
+
+        generado = datetime.now().replace(microsecond=0)
+        filas = []
+        for dia, (esperado, alto, llegadas_dia) in enumerate(zip(
+                resultado['esperado'].round(2).tolist(), resultado['alto'].round(2).tolist(),
+                resultado['entradas'].round(2).tolist())):
+            fecha = hoy + timedelta(days=dia)
+            filas.extend((fecha, franja, e, a, l, generado)
+                         for franja, (e, a, l) in enumerate(zip(esperado, alto, llegadas_dia)))
+        with db.connection() as connection:
+            queries.execute(connection, 'pronostico_borrar_desde', (hoy,))
+            queries.execute_many(connection, 'pronostico_insertar_lote', filas)
+            connection.commit()
+        result_cache.invalidate('pronostico_asistencia')
+        logger.info("Pronóstico de asistencia actualizado con %d visitas", len(entradas))
+        return True
+    except Exception as e:
+        logger.exception("Error al actualizar el pronóstico de asistencia")
+        return False
     finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
+        _calculando_pronostico.release()
+
+def recalcular_pronostico():
+    """Lanza el cálculo del pronóstico en segundo plano si no hay uno en curso"""
+    if _calculando_pronostico.locked():
+        return
+    threading.Thread(target=actualizar_pronostico, name='pronostico', daemon=True).start()
+
+def pronostico_vigente(filas, dias):
+    if len(filas) < dias * 96:
+        return False
+    limite = datetime.now() - timedelta(hours=app.config['PRONOSTICO_VIGENCIA_HORAS'])
+    return min(fila[5] for fila in filas) >= limite
+
+def cargar_pronostico(hoy, dias):
+    """
+    Lee el pronóstico guardado. Si falta o es más antiguo que
+    PRONOSTICO_VIGENCIA_HORAS (el job nocturno no corrió) se devuelve lo que
+    haya con ``desactualizado`` y se recalcula en segundo plano; al terminar
+    se invalida la caché.
+    """
+    desde, hasta = hoy, hoy + timedelta(days=dias)
+    with db.connection() as connection:
+        _, filas = queries.fetch_columns(connection, 'pronostico_rango', (desde, hasta))
+    vigente = pronostico_vigente(filas, dias)
+    if not vigente:
+        recalcular_pronostico()
+    if not filas:
+        return None
+
+    valores = np.array([fila[2:5] for fila in filas], dtype=np.float64)
+    etiquetas = heatmap.franjas()
+    respuesta = []
+    for i in range(0, len(filas), 96):
+        esperado, alto, llegadas = valores[i:i + 96].T
+        fecha = filas[i][0]
+        pico = int(esperado.argmax())
+        respuesta.append({
+            'fecha': fecha.isoformat(),
+            'dia': heatmap.DIAS_SEMANA[fecha.weekday()],
+            'esperado': esperado.tolist(),
+            'alto': alto.tolist(),
+            'entradas': llegadas.tolist(),
+            'visitas_esperadas': round(float(llegadas.sum()), 1),
+            'pico': {'franja': etiquetas[pico], 'esperado': float(esperado[pico])},
+        })
+    return {
+        'generado': min(fila[5] for fila in filas).strftime('%Y-%m-%d %H:%M:%S'),
+        'desactualizado': not vigente,
+        'intervalo_minutos': 15,
+        'franjas': etiquetas,
+        'dias': respuesta,
+    }
+
+@app.route('/api/reportes/asistencia/pronostico', methods=['GET'])
+@token_required
+@requires('ver_reportes')
+def reporte_asistencia_pronostico(current_user):
+    """
+    Ocupación esperada por franja de 15 minutos para los próximos días.
+
+    El pronóstico se calcula cada noche y aquí solo se lee: ``esperado`` es
+    la ocupación promedio pronosticada y ``alto`` la que no se supera nueve
+    de cada diez días.
+    """
+    try:
+        dias = int(request.args.get('dias', app.config['PRONOSTICO_DIAS']))
+    except ValueError:
+        return jsonify({'error': 'dias debe ser un número'}), 400
+    if not 1 <= dias <= app.config['PRONOSTICO_DIAS']:
+        return jsonify({'error': f"dias debe estar entre 1 y {app.config['PRONOSTICO_DIAS']}"}), 400
+    
+    try:
+        hoy = datetime.now().date()
+        resultado = result_cache.get(('pronostico', hoy, dias), lambda: cargar_pronostico(hoy, dias),
+                                     tables=('pronostico_asistencia',), ttl=app.config['HEATMAP_CACHE_TTL'])
+        if resultado is None:
+            return jsonify({'error': 'No se pudo calcular el pronóstico'}), 503
+        return jsonify(resultado), 200
+    except Exception as e:
+        logger.exception("Error al obtener el pronóstico de asistencia")
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/reportes/rutinas', methods=['GET'])
 @token_required
+@requires('ver_reportes')
 def reporte_rutinas(current_user):
     """Obtener reporte de rutinas y asignaciones"""
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        
-        cursor = connection.cursor(dictionary=True)
-        
-        # Obtener el ID del entrenador
-        query_entrenador = 'SELECT id FROM miembros WHERE email = %s'
-        cursor.execute(query_entrenador, (current_user,))
-        entrenador = cursor.fetchone()
-        
-        if not entrenador:
-            return jsonify({'error': 'Entrenador no encontrado'}), 404
-        
-        entrenador_id = entrenador['id']
-        
-        # Estadísticas de rutinas por nivel
-        query_nivel = '''
-            SELECT 
-                r.nivel,
-                COUNT(*) as total_rutinas,
-                COUNT(rc.id) as rutinas_asignadas
-            FROM rutinas r
-            LEFT JOIN rutinas_clientes rc ON r.id = rc.rutina_id AND rc.estado = 'activa'
-            WHERE r.id_entrenador = %s
-            GROUP BY r.nivel
-        '''
-        
-        cursor.execute(query_nivel, (entrenador_id,))
-        rutinas_por_nivel = cursor.fetchall()
-        
-        # Estadísticas de rutinas por objetivo
-        query_objetivo = '''
-            SELECT 
-                r.objetivo,
-                COUNT(*) as total_rutinas,
-                COUNT(rc.id) as rutinas_asignadas
-            FROM rutinas r
-            LEFT JOIN rutinas_clientes rc ON r.id = rc.rutina_id AND rc.estado = 'activa'
-            WHERE r.id_entrenador = %s
-            GROUP BY r.objetivo
-        '''
-        
-        cursor.execute(query_objetivo, (entrenador_id,))
-        rutinas_por_objetivo = cursor.fetchall()
-        
-        # Top 5 rutinas más asignadas
-        query_top_rutinas = '''
-            SELECT 
-                r.nombre,
-                r.nivel,
-                r.objetivo,
-                COUNT(rc.id) as total_asignaciones
-            FROM rutinas r
-            LEFT JOIN rutinas_clientes rc ON r.id = rc.rutina_id AND rc.estado = 'activa'
-            WHERE r.id_entrenador = %s
-            GROUP BY r.id, r.nombre, r.nivel, r.objetivo
-            ORDER BY total_asignaciones DESC
-            LIMIT 5
-        '''
-        
-        cursor.execute(query_top_rutinas, (entrenador_id,))
-        top_rutinas = cursor.fetchall()
-        
-        # Estadísticas generales
-        query_stats = '''
-            SELECT 
-                COUNT(*) as total_rutinas,
-                COUNT(rc.id) as total_asignaciones,
-                COUNT(DISTINCT rc.cliente_id) as clientes_activos
-            FROM rutinas r
-            LEFT JOIN rutinas_clientes rc ON r.id = rc.rutina_id AND rc.estado = 'activa'
-            WHERE r.id_entrenador = %s
-        '''
-        
-        cursor.execute(query_stats, (entrenador_id,))
-        estadisticas = cursor.fetchone()
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
         
-        return jsonify({
-            'rutinas_por_nivel': rutinas_por_nivel,
-            'rutinas_por_objetivo': rutinas_por_objetivo,
-            'top_rutinas': top_rutinas,
-            'estadisticas': estadisticas
-        }), 200
+            entrenador_id = current_user.id
+        
+            # Estadísticas de rutinas por nivel
+            rutinas_por_nivel = queries.fetch_all(connection, 'reporte_rutinas_por_nivel', (entrenador_id,))
+        
+            # Estadísticas de rutinas por objetivo
+            rutinas_por_objetivo = queries.fetch_all(connection, 'reporte_rutinas_por_objetivo', (entrenador_id,))
+        
+            # Top 5 rutinas más asignadas
+            top_rutinas = queries.fetch_all(connection, 'reporte_rutinas_top', (entrenador_id,))
+        
+            # Estadísticas generales
+            estadisticas = queries.fetch_one(connection, 'reporte_rutinas_estadisticas', (entrenador_id,))
+        
+            return jsonify({
+                'rutinas_por_nivel': rutinas_por_nivel,
+                'rutinas_por_objetivo': rutinas_por_objetivo,
+                'top_rutinas': top_rutinas,
+                'estadisticas': estadisticas
+            }), 200
         
     except Exception as e:
-        print(f"Error en reporte de rutinas: {str(e)}")
+        logger.exception("Error en reporte de rutinas")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/reportes/clientes', methods=['GET'])
 @token_required
+@requires('ver_reportes')
 def reporte_clientes(current_user):
     """Obtener reporte de clientes y su progreso"""
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        
-        cursor = connection.cursor(dictionary=True)
-        
-        # Obtener el ID del entrenador
-        query_entrenador = 'SELECT id FROM miembros WHERE email = %s'
-        cursor.execute(query_entrenador, (current_user,))
-        entrenador = cursor.fetchone()
-        
-        if not entrenador:
-            return jsonify({'error': 'Entrenador no encontrado'}), 404
-        
-        entrenador_id = entrenador['id']
-        
-        # Estadísticas de clientes por estado de membresía
-        query_estado = '''
-            SELECT 
-                CASE 
-                    WHEN m.activo = 1 THEN 'Activos'
-                    ELSE 'Inactivos'
-                END as estado,
-                COUNT(*) as total
-            FROM miembros m
-            WHERE m.rol_id = 3  -- Solo clientes
-            GROUP BY m.activo
-        '''
-        
-        cursor.execute(query_estado)
-        clientes_por_estado = cursor.fetchall()
-        
-        # Clientes con rutinas asignadas
-        query_con_rutinas = '''
-            SELECT 
-                m.nombre,
-                m.email,
-                COUNT(rc.id) as rutinas_asignadas,
-                MAX(rc.fecha_inicio) as ultima_asignacion
-            FROM miembros m
-            LEFT JOIN rutinas_clientes rc ON m.id = rc.cliente_id AND rc.estado = 'activa'
-            WHERE m.rol_id = 3
-            GROUP BY m.id, m.nombre, m.email
-            HAVING rutinas_asignadas > 0
-            ORDER BY rutinas_asignadas DESC
-        '''
-        
-        cursor.execute(query_con_rutinas)
-        clientes_con_rutinas = cursor.fetchall()
-        
-        # Nuevos clientes este mes
-        query_nuevos = '''
-            SELECT COUNT(*) as nuevos_clientes
-            FROM miembros m
-            WHERE m.rol_id = 3 
-            AND MONTH(m.fecha_inscripcion) = MONTH(CURDATE())
-            AND YEAR(m.fecha_inscripcion) = YEAR(CURDATE())
-        '''
-        
-        cursor.execute(query_nuevos)
-        nuevos_clientes = cursor.fetchone()
-        
-        # Estadísticas generales - Un cliente se considera activo solo si:
-        # 1. Está marcado como activo (activo = 1) Y
-        # 2. No tiene fecha de vencimiento O tiene una fecha de vencimiento futura
-        query_stats = '''
-            SELECT 
-                COUNT(*) as total_clientes,
-                COUNT(CASE 
-                    WHEN m.activo = 1 AND 
-                         (m.fecha_vencimiento_membresia IS NULL OR 
-                          m.fecha_vencimiento_membresia >= CURDATE()) 
-                    THEN 1 
-                END) as clientes_activos,
-                COUNT(CASE 
-                    WHEN m.activo = 0 OR 
-                         (m.fecha_vencimiento_membresia IS NOT NULL AND 
-                          m.fecha_vencimiento_membresia < CURDATE())
-                    THEN 1 
-                END) as clientes_inactivos
-            FROM miembros m
-            WHERE m.rol_id = 3  -- Solo clientes
-        '''
-        
-        cursor.execute(query_stats)
-        estadisticas = cursor.fetchone()
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
         
-        return jsonify({
-            'clientes_por_estado': clientes_por_estado,
-            'clientes_con_rutinas': clientes_con_rutinas,
-            'nuevos_clientes': nuevos_clientes,
-            'estadisticas': estadisticas
-        }), 200
+            # Estadísticas de clientes por estado de membresía
+            clientes_por_estado = queries.fetch_all(connection, 'reporte_clientes_por_estado')
+        
+            # Clientes con rutinas asignadas
+            clientes_con_rutinas = queries.fetch_all(connection, 'reporte_clientes_con_rutinas')
+        
+            # Nuevos clientes este mes
+            nuevos_clientes = queries.fetch_one(connection, 'reporte_clientes_nuevos')
+        
+            # Estadísticas generales - Un cliente se considera activo solo si:
+            # 1. Está marcado como activo (activo = 1) Y
+            # 2. No tiene fecha de vencimiento O tiene una fecha de vencimiento futura
+            estadisticas = queries.fetch_one(connection, 'reporte_clientes_estadisticas')
+        
+            return jsonify({
+                'clientes_por_estado': clientes_por_estado,
+                'clientes_con_rutinas': clientes_con_rutinas,
+                'nuevos_clientes': nuevos_clientes,
+                'estadisticas': estadisticas
+            }), 200
         
     except Exception as e:
-        print(f"Error en reporte de clientes: {str(e)}")
+        logger.exception("Error en reporte de clientes")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.route('/api/reportes/progreso', methods=['GET'])
 @token_required
+@requires('ver_reportes')
 def reporte_progreso(current_user):
     """Obtener reporte de progreso de clientes"""
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'Error al conectar a la base de datos'}), 500
-        
-        cursor = connection.cursor(dictionary=True)
-        
-        # Obtener el ID del entrenador
-        query_entrenador = 'SELECT id FROM miembros WHERE email = %s'
-        cursor.execute(query_entrenador, (current_user,))
-        entrenador = cursor.fetchone()
-        
-        if not entrenador:
-            return jsonify({'error': 'Entrenador no encontrado'}), 404
-        
-        entrenador_id = entrenador['id']
-        
-        # Progreso por cliente (últimos 30 días)
-        query_progreso = '''
-            SELECT 
-                m.nombre as cliente,
-                COUNT(pe.id) as sesiones_completadas,
-                AVG(pe.dificultad_percibida) as dificultad_promedio,
-                MAX(pe.fecha_ejecucion) as ultima_sesion
-            FROM miembros m
-            JOIN rutinas_clientes rc ON m.id = rc.cliente_id
-            LEFT JOIN progreso_ejercicios pe ON rc.id = pe.rutina_cliente_id
-            WHERE rc.entrenador_id = %s
-            AND rc.estado = 'activa'
-            AND pe.fecha_ejecucion >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-            GROUP BY m.id, m.nombre
-            ORDER BY sesiones_completadas DESC
-        '''
-        
-        cursor.execute(query_progreso, (entrenador_id,))
-        progreso_clientes = cursor.fetchall()
-        
-        # Marcas personales recientes
-        query_marcas = '''
-            SELECT 
-                m.nombre as cliente,
-                e.nombre as ejercicio,
-                mp.peso_maximo,
-                mp.repeticiones_maximas,
-                mp.fecha_establecida
-            FROM marcas_personales mp
-            JOIN miembros m ON mp.cliente_id = m.id
-            JOIN ejercicios e ON mp.ejercicio_id = e.id
-            WHERE mp.fecha_establecida >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-            ORDER BY mp.fecha_establecida DESC
-            LIMIT 10
-        '''
-        
-        cursor.execute(query_marcas)
-        marcas_recientes = cursor.fetchall()
-        
-        # Estadísticas de progreso
-        query_stats = '''
-            SELECT 
-                COUNT(DISTINCT pe.rutina_cliente_id) as clientes_con_progreso,
-                AVG(pe.dificultad_percibida) as dificultad_promedio,
-                COUNT(pe.id) as total_sesiones
-            FROM progreso_ejercicios pe
-            JOIN rutinas_clientes rc ON pe.rutina_cliente_id = rc.id
-            WHERE rc.entrenador_id = %s
-            AND pe.fecha_ejecucion >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-        '''
-        
-        cursor.execute(query_stats, (entrenador_id,))
-        estadisticas_progreso = cursor.fetchone()
+        with db_connection() as connection:
+            if not connection:
+                return jsonify({'error': 'Error al conectar a la base de datos'}), 500
         
-        return jsonify({
-            'progreso_clientes': progreso_clientes,
-            'marcas_recientes': marcas_recientes,
-            'estadisticas_progreso': estadisticas_progreso
-        }), 200
+            entrenador_id = current_user.id
+        
+            # Progreso por cliente (últimos 30 días)
+            progreso_clientes = queries.fetch_all(connection, 'reporte_progreso_clientes', (entrenador_id,))
+        
+            # Marcas personales recientes
+            marcas_recientes = queries.fetch_all(connection, 'reporte_progreso_marcas')
+        
+            # Estadísticas de progreso
+            estadisticas_progreso = queries.fetch_one(connection, 'reporte_progreso_estadisticas', (entrenador_id,))
+        
+            return jsonify({
+                'progreso_clientes': progreso_clientes,
+                'marcas_recientes': marcas_recientes,
+                'estadisticas_progreso': estadisticas_progreso
+            }), 200
         
     except Exception as e:
-        print(f"Error en reporte de progreso: {str(e)}")
+        logger.exception("Error en reporte de progreso")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
 
 # Ruta para servir archivos estáticos (CSS, JS, imágenes, etc.)
 @app.route('/static/<path:path>')
 def serve_static(path):
-    return send_from_directory('static', path)
+    return compression.send_static(os.path.join(app.root_path, 'static'), path)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -1883,45 +2844,163 @@ def health_check():
     return jsonify({
         "status": "ok",
         "message": "Servidor funcionando correctamente",
-        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "db_pool": db.get_pool().stats(),
+        "token_cache": token_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "permissions": permission_engine.stats(),
+        "member_search": member_index.stats(),
+        "result_cache": result_cache.stats(),
+        "asistencias": {
+            "write_behind": asistencias_queue.stats(),
+            "sessions": session_tracker.stats()
+        },
+        "compression": compression.stats(),
+        "logging": logs.stats()
+    }), 200
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métricas de rutas, consultas y componentes en formato Prometheus"""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'error': 'No autorizado'}), 401
+    
+    pool = db.get_pool().stats()
+    cache = token_cache.stats()
+    hasher = password_hasher.stats()
+    registro = logs.stats()
+    extra = [
+        ('gym_db_pool_connections', 'gauge', 'Conexiones del pool por estado',
+         {(('state', 'idle'),): pool['idle'], (('state', 'in_use'),): pool['in_use']}),
+        ('gym_db_pool_checkouts_total', 'counter', 'Conexiones entregadas por el pool', pool['checkouts']),
+        ('gym_db_pool_waits_total', 'counter', 'Solicitudes que esperaron una conexión', pool['waits']),
+        ('gym_db_pool_timeouts_total', 'counter', 'Solicitudes sin conexión tras el timeout', pool['timeouts']),
+        ('gym_token_cache_lookups_total', 'counter', 'Consultas a la caché de tokens',
+         {(('result', 'hit'),): cache['hits'], (('result', 'miss'),): cache['misses']}),
+        ('gym_bcrypt_pending', 'gauge', 'Operaciones bcrypt en curso o en cola', hasher['pending']),
+        ('gym_bcrypt_rejected_total', 'counter', 'Operaciones bcrypt rechazadas por saturación', hasher['rejected']),
+        ('gym_log_dropped_total', 'counter', 'Mensajes de log descartados',
+         {(('reason', 'queue_full'),): registro['dropped_queue_full'],
+          (('reason', 'sampling'),): registro['dropped_sampling']}),
+    ]
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/consultas-lentas', methods=['GET'])
+@token_required
+@requires('gestionar_usuarios')
+def consultas_lentas(current_user):
+    """Consultas que más superan el umbral de lentitud, con su último plan"""
+    orden = request.args.get('orden', 'total_time')
+    if orden not in ('total_time', 'max_time', 'count'):
+        return jsonify({'error': 'orden debe ser total_time, max_time o count'}), 400
+    try:
+        limite = min(int(request.args.get('limite', 20)), 100)
+    except ValueError:
+        return jsonify({'error': 'limite debe ser un número'}), 400
+    
+    return jsonify({
+        'umbral_ms': app.config['SLOW_QUERY_THRESHOLD_MS'],
+        'consultas': slowlog.top(limite, orden)
     }), 200
 
 def actualizar_estado_miembros():
     """Actualiza el estado de los miembros basado en la fecha de vencimiento de su membresía"""
     try:
-        connection = get_db_connection()
-        if not connection:
-            print("Error al conectar a la base de datos")
-            return
+        with db_connection() as connection:
+            if not connection:
+                logger.error("Error al conectar a la base de datos")
+                return
             
-        cursor = connection.cursor()
-        
-        # Actualizar a inactivos los miembros con membresía vencida
-        query = """
-        UPDATE miembros 
-        SET activo = 0 
-        WHERE activo = 1 
-        AND rol_id = 3 
-        AND fecha_vencimiento_membresia IS NOT NULL 
-        AND fecha_vencimiento_membresia < CURDATE()
-        """
-        
-        cursor.execute(query)
-        updated = cursor.rowcount
-        
-        if updated > 0:
-            print(f"Actualizados {updated} miembros a inactivos por membresía vencida")
+            # Actualizar a inactivos los miembros con membresía vencida
+            updated = queries.execute(connection, 'miembros_desactivar_vencidos').rowcount
+        
+            if updated > 0:
+                logger.info("Actualizados %d miembros a inactivos por membresía vencida", updated)
             
-        connection.commit()
+            connection.commit()
+            if updated > 0:
+                result_cache.invalidate('miembros')
         
     except Exception as e:
-        print(f"Error al actualizar estado de miembros: {str(e)}")
-        if 'connection' in locals() and connection and connection.is_connected():
-            connection.rollback()
-    finally:
-        if 'connection' in locals() and connection and connection.is_connected():
-            cursor.close()
-            connection.close()
+        logger.exception("Error al actualizar estado de miembros")
+
+def purgar_refresh_tokens():
+    """Elimina los refresh tokens expirados para mantener la tabla compacta"""
+    try:
+        with db_connection() as connection:
+            if not connection:
+                logger.error("Error al conectar a la base de datos")
+                return
+            eliminados = queries.execute(connection, 'refresh_tokens_purgar', (datetime.now(),)).rowcount
+            connection.commit()
+            if eliminados > 0:
+                logger.info("Eliminados %d refresh tokens expirados", eliminados)
+    except Exception as e:
+        logger.exception("Error al purgar refresh tokens")
+
+def purgar_eliminados_sync():
+    """Elimina los registros de borrado más antiguos que la retención de /api/sync"""
+    try:
+        with db_connection() as connection:
+            if not connection:
+                logger.error("Error al conectar a la base de datos")
+                return
+            limite = datetime.now() - timedelta(days=app.config['SYNC_TOMBSTONE_DAYS'])
+            eliminados = queries.execute(connection, 'sync_eliminados_purgar', (limite,)).rowcount
+            connection.commit()
+            if eliminados > 0:
+                logger.info("Eliminados %d registros de borrado de la sincronización", eliminados)
+    except Exception as e:
+        logger.exception("Error al purgar registros de borrado")
+
+def reconstruir_asistencias_diarias(desde, hasta):
+    """
+    Recalcula el resumen diario de asistencias para los días de ``desde`` a
+    ``hasta`` (incluidos), un mes por transacción: las escrituras de esos
+    días esperan al commit, así que ningún cambio queda fuera del resumen.
+    Devuelve los días con asistencias.
+    """
+    dias = 0
+    inicio = desde
+    while inicio <= hasta:
+        fin = min(inicio + timedelta(days=31), hasta + timedelta(days=1))
+        with db.connection() as connection:
+            queries.execute(connection, 'asistencias_diarias_miembros_borrar', (inicio, fin))
+            queries.execute(connection, 'asistencias_diarias_miembros_reconstruir', (inicio, fin))
+            queries.execute(connection, 'asistencias_diarias_borrar', (inicio, fin))
+            dias += queries.execute(connection, 'asistencias_diarias_reconstruir', (inicio, fin)).rowcount
+            connection.commit()
+        inicio = fin
+    return dias
+
+def verificar_asistencias_diarias():
+    """Reconstruye los últimos días del resumen (cambios de rol de los miembros)"""
+    try:
+        ayer = datetime.now().date() - timedelta(days=1)
+        reconstruir_asistencias_diarias(ayer - timedelta(days=app.config['ASISTENCIAS_DIARIAS_DIAS'] - 1), ayer)
+    except Exception as e:
+        logger.exception("Error al reconstruir el resumen diario de asistencias")
+
+@app.route('/api/admin/asistencias-diarias/reconstruir', methods=['POST'])
+@token_required
+@requires('gestionar_usuarios')
+def reconstruir_resumen_asistencias(current_user):
+    """Reconstruye el resumen diario de asistencias para un rango de fechas"""
+    data = request.get_json(silent=True) or {}
+    try:
+        desde = datetime.strptime(data['desde'], '%Y-%m-%d').date()
+        hasta = datetime.strptime(data.get('hasta') or datetime.now().strftime('%Y-%m-%d'), '%Y-%m-%d').date()
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'desde (y opcionalmente hasta) deben tener el formato YYYY-MM-DD'}), 400
+    if desde > hasta:
+        return jsonify({'error': 'desde no puede ser posterior a hasta'}), 400
+    try:
+        dias = reconstruir_asistencias_diarias(desde, hasta)
+        return jsonify({'success': True, 'dias': dias, 'desde': desde.isoformat(), 'hasta': hasta.isoformat()}), 200
+    except Exception as e:
+        logger.exception("Error al reconstruir el resumen diario de asistencias")
+        return jsonify({'error': str(e)}), 500
 
 # Configurar tarea programada para ejecutarse diariamente
 import threading
@@ -1936,7 +3015,7 @@ def programar_actualizacion():
         
         # Si ya pasó la hora de hoy, programar para mañana
         if now > target_time:
-            target_time = target_time.replace(day=now.day + 1)
+            target_time = target_time + timedelta(days=1)
         
         # Calcular segundos hasta la próxima ejecución
         delta = (target_time - now).total_seconds()
@@ -1944,30 +3023,46 @@ def programar_actualizacion():
         # Esperar hasta la hora programada
         time.sleep(delta)
         
-        # Ejecutar la actualización
-        print(f"[{datetime.now()}] Ejecutando actualización diaria de estados de membresía...")
-        actualizar_estado_miembros()
+        # Ejecutar la actualización; el fallo de una tarea no detiene las
+        # demás ni el hilo
+        logger.info("Ejecutando actualización diaria de estados de membresía")
+        for tarea in (actualizar_estado_miembros, purgar_refresh_tokens, purgar_eliminados_sync,
+                      verificar_asistencias_diarias, actualizar_pronostico):
+            try:
+                tarea()
+            except Exception:
+                logger.exception("Error en la tarea diaria %s", tarea.__name__)
 
 # Iniciar el hilo de actualización en segundo plano
 # Solo en producción, en desarrollo puede ser molesto
 try:
     if os.environ.get('FLASK_ENV') == 'production':
-        print("Iniciando hilo de actualización de membresías...")
+        logger.info("Iniciando hilo de actualización de membresías")
         hilo_actualizacion = threading.Thread(target=programar_actualizacion, daemon=True)
         hilo_actualizacion.start()
 except Exception as e:
-    print(f"Error al iniciar el hilo de actualización: {str(e)}")
+    logger.exception("Error al iniciar el hilo de actualización")
 
 if __name__ == '__main__':
     # Ejecutar una vez al iniciar
     print("Verificando estados de membresía...")
     actualizar_estado_miembros()
     
+    # La ocupación en vivo parte de las sesiones abiertas de hoy
+    print("Cargando sesiones abiertas...")
+    refrescar_sesiones()
+    
     print("Iniciando servidor en http://127.0.0.1:5000")
     print("Rutas disponibles:")
     print("  - GET  / (Página principal)")
     print("  - GET  /api/health (Verificar estado del servidor)")
+    print("  - GET  /api/metrics (Métricas en formato Prometheus)")
+    print("  - GET  /api/admin/consultas-lentas")
+    print("  - POST /api/admin/asistencias-diarias/reconstruir")
     print("  - POST /api/auth/login")
+    print("  - POST /api/auth/refresh")
+    print("  - POST /api/auth/logout")
+    print("  - PUT  /api/auth/password")
     print("  - GET  /api/auth/me")
     print("  - GET  /api/miembros")
     print("  - POST /api/miembros")
@@ -1976,6 +3071,10 @@ if __name__ == '__main__':
     print("  - GET  /api/test")
     print("  - GET  /api/miembros")
     print("  - POST /api/miembros")
+    print("  - GET  /api/asistencias/ocupacion")
+    print("  - GET  /api/reportes/asistencia/heatmap")
+    print("  - GET  /api/reportes/asistencia/pronostico")
+    print("  - GET  /api/asistencias/ocupacion/stream (SSE)")
     print("  - GET  /api/clases")
     print("  - POST /api/clases")
     print("  - PUT  /api/clases/<id>")
@@ -0,0 +1,457 @@
+"""
+Entradas y salidas del gimnasio (recepción y torniquetes).
+
+Un registro se valida con datos en memoria, se anota en un diario en disco
+y se responde de inmediato: ``WriteBehindQueue`` lo guarda en la base de
+datos después, en lotes cada ``interval`` segundos o al juntar
+``batch_size`` registros, así que una ráfaga de entradas no espera a
+MySQL. Si la base de datos falla los registros siguen en la cola y en el
+diario y se reintentan; si un lote falla se guarda registro por registro y
+los que la base de datos rechaza por sus datos pasan a un archivo de
+descartes, para no bloquear al resto. Si el proceso se detiene antes de
+guardarlos, el diario se vuelve a aplicar al iniciar. Cada entrada lleva un
+``registro_uuid`` único, de modo que aplicarla dos veces no duplica filas.
+
+``SessionTracker`` guarda las sesiones abiertas de hoy (entrada sin salida)
+para validar las entradas repetidas y resolver las salidas sin consultar
+la base de datos. Con ellas lleva también la ocupación del gimnasio: cada
+cambio incrementa una versión y despierta a quienes esperan en
+``wait_for_change``, como las pantallas de recepción conectadas por SSE.
+"""
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger('gym.asistencias')
+
+_SEGMENTO = re.compile(r'^(?P<nombre>.+)-(?P<pid>\d+)-(?P<numero>\d+)\.jsonl$')
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WriteBehindQueue:
+    """
+    Cola de escritura diferida con diario en disco.
+
+    - ``flush(registros)`` guarda una lista de registros (diccionarios
+      serializables a JSON) en una transacción; si lanza una excepción se
+      reintentan más tarde.
+    - ``permanent_errors``: excepciones que indican que un registro nunca
+      se podrá guardar (datos inválidos). Al guardarlo solo, ese registro
+      se anota en ``<name>-dead-letter.jsonl`` y se descarta de la cola.
+    - ``journal_dir``: directorio del diario. Cada proceso escribe sus
+      propios segmentos ``<name>-<pid>-<n>.jsonl``; al guardar un lote se
+      borran los segmentos que lo contenían.
+    - ``fsync``: sincroniza el diario en cada registro (más lento, pero no
+      se pierde nada si se cae el servidor, no solo el proceso).
+    """
+
+    def __init__(self, flush, journal_dir, name='registros', interval=1.0, batch_size=200,
+                 fsync=True, retry_delay=5.0, permanent_errors=(ValueError, TypeError, KeyError)):
+        self._flush = flush
+        self.permanent_errors = permanent_errors
+        self.journal_dir = journal_dir
+        self.name = name
+        self.interval = interval
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._guardando = threading.Lock()
+        self._despertar = threading.Event()
+        self._pendientes = []
+        self._segmento = None
+        self._ruta_segmento = None
+        self._en_segmento = 0  # registros escritos en el segmento abierto
+        self._cerrados = []   # segmentos con registros que siguen en _pendientes
+        self._numero = 0
+        self._hilo = None
+        self._pid = None
+        self._detenida = False
+        self._stats = {'submitted': 0, 'flushed': 0, 'batches': 0, 'failures': 0,
+                       'replayed': 0, 'direct_writes': 0, 'dead_lettered': 0,
+                       'last_flush_time': 0.0}
+
+    def start(self):
+        """Recupera el diario de ejecuciones anteriores e inicia el hilo de guardado"""
+        with self._lock:
+            # Tras un fork el hilo del padre no existe en el hijo
+            if self._hilo is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._pendientes = []
+            self._cerrados = []
+            self._segmento = None
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self._recuperar()
+            self._abrir_segmento()
+            self._detenida = False
+            self._hilo = threading.Thread(target=self._ejecutar, name=f'write-behind-{self.name}',
+                                          daemon=True)
+            self._hilo.start()
+        atexit.register(self.stop)
+        if self._pendientes:
+            self._despertar.set()
+
+    def _recuperar(self):
+        # Segmentos de procesos que ya no existen (o de este mismo pid, de
+        # una ejecución anterior)
+        for archivo in sorted(os.listdir(self.journal_dir)):
+            coincidencia = _SEGMENTO.match(archivo)
+            if not coincidencia or coincidencia['nombre'] != self.name:
+                continue
+            pid = int(coincidencia['pid'])
+            if pid != self._pid and _proceso_vivo(pid):
+                continue
+            ruta = os.path.join(self.journal_dir, archivo)
+            recuperados = 0
+            try:
+                with open(ruta, encoding='utf-8') as diario:
+                    for linea in diario:
+                        try:
+                            self._pendientes.append(json.loads(linea))
+                            recuperados += 1
+                        except ValueError:
+                            # Última línea a medio escribir
+                            continue
+            except OSError:
+                logger.exception("No se pudo leer el diario %s", ruta)
+                continue
+            self._cerrados.append(ruta)
+            self._stats['replayed'] += recuperados
+            if recuperados:
+                logger.warning("Recuperados %d registros del diario %s", recuperados, ruta)
+
+    def _abrir_segmento(self):
+        # Con _lock tomado
+        if self._segmento is not None:
+            self._segmento.close()
+        self._numero += 1
+        self._ruta_segmento = os.path.join(
+            self.journal_dir, f'{self.name}-{self._pid}-{self._numero:06d}.jsonl')
+        self._segmento = open(self._ruta_segmento, 'a', encoding='utf-8')
+        self._en_segmento = 0
+
+    def submit(self, registro):
+        """Anota el registro en el diario y lo deja en la cola para guardarlo"""
+        if self._pid != os.getpid():
+            self.start()
+        linea = json.dumps(registro, separators=(',', ':')) + '\n'
+        try:
+            with self._lock:
+                self._segmento.write(linea)
+                self._segmento.flush()
+                if self.fsync:
+                    os.fsync(self._segmento.fileno())
+                self._en_segmento += 1
+                self._pendientes.append(registro)
+                self._stats['submitted'] += 1
+                lleno = len(self._pendientes) >= self.batch_size
+        except OSError:
+            # Sin diario no se puede diferir: se guarda en el momento
+            logger.exception("No se pudo escribir el diario de %s", self.name)
+            self._flush([registro])
+            with self._lock:
+                self._stats['direct_writes'] += 1
+            return
+        if lleno:
+            self._despertar.set()
+
+    def pending(self):
+        """Registros aceptados que aún no están en la base de datos, en orden"""
+        if self._pid != os.getpid():
+            self.start()
+        with self._lock:
+            return list(self._pendientes)
+
+    def flush_pending(self):
+        """Guarda todo lo pendiente; devuelve False si la base de datos falló"""
+        with self._guardando:
+            with self._lock:
+                if not self._pendientes:
+                    return True
+                lote = self._pendientes
+                self._pendientes = []
+                # Lo anotado desde ahora va a un segmento nuevo (si el
+                # actual tiene algo; en un reintento puede estar vacío)
+                cerrados = self._cerrados
+                self._cerrados = []
+                if self._en_segmento:
+                    cerrados.append(self._ruta_segmento)
+                    self._abrir_segmento()
+
+            inicio = time.perf_counter()
+            reintentar = []
+            descartados = 0
+            for i in range(0, len(lote), self.batch_size):
+                parte = lote[i:i + self.batch_size]
+                try:
+                    self._flush(parte)
+                    continue
+                except Exception:
+                    logger.exception("Error al guardar un lote de %d registros de %s; se guardan uno a uno",
+                                     len(parte), self.name)
+                reintentar, descartes = self._guardar_por_separado(parte)
+                descartados += descartes
+                if reintentar:
+                    reintentar += lote[i + self.batch_size:]
+                    break
+
+            if reintentar:
+                logger.error("%d registros de %s se reintentarán", len(reintentar), self.name)
+                with self._lock:
+                    # Los segmentos se conservan: contienen lo que se reintenta
+                    self._pendientes[:0] = reintentar
+                    self._cerrados[:0] = cerrados
+                    self._stats['flushed'] += len(lote) - len(reintentar) - descartados
+                    self._stats['dead_lettered'] += descartados
+                    self._stats['failures'] += 1
+                return False
+
+            for ruta in cerrados:
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+            with self._lock:
+                self._stats['flushed'] += len(lote) - descartados
+                self._stats['dead_lettered'] += descartados
+                self._stats['batches'] += 1
+                self._stats['last_flush_time'] = round(time.perf_counter() - inicio, 6)
+            return True
+
+    def _guardar_por_separado(self, registros):
+        """
+        Guarda uno a uno los registros de un lote que falló. Los que fallan
+        por sus datos van al archivo de descartes; con cualquier otro error
+        (p. ej. la base de datos caída) se detiene y devuelve
+        ``(registros sin guardar, descartados)``.
+        """
+        descartados = 0
+        for i, registro in enumerate(registros):
+            try:
+                self._flush([registro])
+                continue
+            except self.permanent_errors as e:
+                error = e
+            except Exception:
+                logger.exception("Error al guardar un registro de %s", self.name)
+                return registros[i:], descartados
+            try:
+                self._descartar(registro, error)
+            except OSError:
+                logger.exception("No se pudo escribir el archivo de descartes de %s", self.name)
+                return registros[i:], descartados
+            descartados += 1
+        return [], descartados
+
+    def _descartar(self, registro, error):
+        ruta = os.path.join(self.journal_dir, f'{self.name}-dead-letter.jsonl')
+        linea = json.dumps({'registro': registro, 'error': repr(error),
+                            'fecha': datetime.now().isoformat(timespec='seconds')},
+                           separators=(',', ':')) + '\n'
+        with open(ruta, 'a', encoding='utf-8') as descartes:
+            descartes.write(linea)
+            descartes.flush()
+            os.fsync(descartes.fileno())
+        logger.error("Registro de %s descartado (%r), anotado en %s: %s",
+                     self.name, error, ruta, linea.strip())
+
+    def _ejecutar(self):
+        while not self._detenida:
+            self._despertar.wait(self.interval)
+            self._despertar.clear()
+            if not self.flush_pending():
+                time.sleep(self.retry_delay)
+
+    def stop(self, timeout=10):
+        """Detiene el hilo e intenta guardar lo pendiente (lo que falle queda en el diario)"""
+        if self._hilo is None or self._pid != os.getpid():
+            return
+        self._detenida = True
+        self._despertar.set()
+        self._hilo.join(timeout)
+        self.flush_pending()
+        with self._lock:
+            if self._segmento is not None:
+                self._segmento.close()
+                self._segmento = None
+                if not self._pendientes:
+                    try:
+                        os.remove(self._ruta_segmento)
+                    except FileNotFoundError:
+                        pass
+            self._hilo = None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pendientes)
+            stats['journal_segments'] = len(self._cerrados) + (1 if self._segmento is not None else 0)
+        return stats
+
+
+class SessionTracker:
+    """
+    Sesiones abiertas de hoy por miembro.
+
+    ``loader()`` devuelve las sesiones abiertas guardadas en la base de datos
+    (``id``, ``registro_uuid``, ``miembro_id``, ``fecha_hora_entrada``) y
+    ``pending()`` los registros que aún no se guardaron; cada
+    ``refresh_interval`` segundos se recargan ambos para incorporar lo que
+    registraron otros workers y descartar las sesiones de días anteriores.
+
+    ``occupancy()`` devuelve la cantidad de sesiones abiertas con una
+    versión que cambia con cada entrada, salida o recarga que la modifique.
+    """
+
+    def __init__(self, loader, pending, refresh_interval=30):
+        self._loader = loader
+        self._pending = pending
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._cambio = threading.Condition(self._lock)
+        self._refrescando = threading.Lock()
+        self._sesiones = {}
+        self._cargado = False
+        self._ultima_revision = None
+        self._version = 0
+        self._actualizado = datetime.now()
+        self._esperando = 0
+        self._stats = {'check_ins': 0, 'check_outs': 0, 'rejected': 0, 'reloads': 0}
+
+    @property
+    def loaded(self):
+        return self._cargado
+
+    def refresh(self, force=False):
+        if not force and self._ultima_revision is not None and \
+                time.monotonic() - self._ultima_revision < self.refresh_interval:
+            return
+        # Sin datos se espera a la carga; después los demás hilos siguen con lo que hay
+        if not self._refrescando.acquire(blocking=not self._cargado):
+            return
+        try:
+            sesiones = {}
+            for fila in self._loader():
+                sesiones[fila['miembro_id']] = {
+                    'id': fila['id'],
+                    'registro_uuid': fila.get('registro_uuid'),
+                    'miembro_id': fila['miembro_id'],
+                    'fecha_hora_entrada': fila['fecha_hora_entrada'],
+                }
+            # Se leen después de la base de datos: lo que se guarde entre las
+            # dos lecturas aparece en ambas y se aplica igual
+            for registro in self._pending():
+                aplicar_registro(sesiones, registro)
+            with self._lock:
+                cambio = sesiones.keys() != self._sesiones.keys()
+                self._sesiones = sesiones
+                self._cargado = True
+                self._stats['reloads'] += 1
+                if cambio:
+                    self._notificar()
+            self._ultima_revision = time.monotonic()
+        finally:
+            self._refrescando.release()
+
+    def open(self, sesion):
+        """Abre la sesión; si el miembro ya tiene una abierta la devuelve sin cambios"""
+        with self._lock:
+            actual = self._sesiones.get(sesion['miembro_id'])
+            if actual is not None:
+                self._stats['rejected'] += 1
+                return actual
+            self._sesiones[sesion['miembro_id']] = sesion
+            self._stats['check_ins'] += 1
+            self._notificar()
+            return None
+
+    def close(self, miembro_id):
+        """Cierra y devuelve la sesión abierta del miembro, o None"""
+        with self._lock:
+            sesion = self._sesiones.pop(miembro_id, None)
+            if sesion is not None:
+                self._stats['check_outs'] += 1
+                self._notificar()
+            return sesion
+
+    def get(self, miembro_id):
+        with self._lock:
+            return self._sesiones.get(miembro_id)
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sesiones.values())
+
+    def _notificar(self):
+        # Con _lock tomado
+        self._version += 1
+        self._actualizado = datetime.now()
+        self._cambio.notify_all()
+
+    def _ocupacion(self):
+        return {
+            'ocupacion': len(self._sesiones),
+            'version': self._version,
+            'actualizado': self._actualizado,
+        }
+
+    def occupancy(self):
+        """``{'ocupacion', 'version', 'actualizado'}`` de las sesiones abiertas"""
+        with self._lock:
+            return self._ocupacion()
+
+    def wait_for_change(self, version, timeout=None):
+        """
+        Espera a que la versión sea distinta de ``version`` (o a que pase
+        ``timeout``) y devuelve la ocupación en ese momento.
+        """
+        with self._cambio:
+            self._esperando += 1
+            try:
+                self._cambio.wait_for(lambda: self._version != version, timeout)
+            finally:
+                self._esperando -= 1
+            return self._ocupacion()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open_sessions'] = len(self._sesiones)
+            stats['version'] = self._version
+            stats['waiting'] = self._esperando
+        return stats
+
+
+def aplicar_registro(sesiones, registro):
+    """Aplica una entrada o salida pendiente a ``{miembro_id: sesión}``"""
+    if registro['tipo'] == 'entrada':
+        sesiones[registro['miembro_id']] = {
+            'id': None,
+            'registro_uuid': registro['registro_uuid'],
+            'miembro_id': registro['miembro_id'],
+            'fecha_hora_entrada': datetime.fromisoformat(registro['fecha_hora_entrada']),
+        }
+    else:
+        sesion = sesiones.get(registro['miembro_id'])
+        if sesion is None:
+            return
+        uuid_salida = registro.get('registro_uuid')
+        id_salida = registro.get('id')
+        if ((uuid_salida is not None and sesion['registro_uuid'] == uuid_salida) or
+                (id_salida is not None and sesion['id'] == id_salida)):
+            del sesiones[registro['miembro_id']]
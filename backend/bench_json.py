@@ -0,0 +1,118 @@
+"""
+Compara la serialización de un listado de miembros con el proveedor JSON
+de Flask y con GymJSONProvider (librería estándar y orjson).
+
+Uso: python bench_json.py [filas] [repeticiones]
+
+Verifica además que las tres salidas, una vez interpretadas, sean iguales.
+"""
+import json
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import json_provider
+
+
+def filas_de_prueba(n):
+    random.seed(1)
+    condiciones = ['[]', '["Asma"]', '["Hipertensión", "Lesión de rodilla"]', '']
+    filas = []
+    for i in range(1, n + 1):
+        filas.append({
+            'id': i,
+            'nombre': f'Miembro {i}',
+            'email': f'miembro{i}@correo.com',
+            'telefono': f'55{i:08d}',
+            'rol_id': 3,
+            'activo': 1,
+            'fecha_registro': datetime(2024, 1, 1) + timedelta(minutes=i),
+            'fecha_vencimiento': date(2025, 1, 1) + timedelta(days=i % 365),
+            'peso': Decimal(f'{random.uniform(50, 110):.2f}'),
+            'hora_preferida': timedelta(hours=6 + i % 14, minutes=30),
+            'condiciones_medicas': random.choice(condiciones),
+        })
+    return filas
+
+
+def medir(nombre, funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+    print(f'{nombre:<28} mediana {tiempos[len(tiempos) // 2] * 1000:8.1f} ms  '
+          f'mín {tiempos[0] * 1000:8.1f} ms  {len(salida) / 1024:8.0f} KiB')
+    return salida
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    filas = filas_de_prueba(n)
+    app = Flask(__name__)
+
+    # Comportamiento anterior: json.loads de condiciones_medicas por fila y
+    # el proveedor de Flask (sin soporte para timedelta, que va como texto)
+    flask_json = DefaultJSONProvider(app)
+
+    def anterior():
+        miembros = []
+        for fila in filas:
+            fila = dict(fila)
+            if fila['condiciones_medicas']:
+                fila['condiciones_medicas'] = json.loads(fila['condiciones_medicas'])
+            fila['hora_preferida'] = json_provider.format_timedelta(fila['hora_preferida'])
+            miembros.append(fila)
+        return flask_json.dumps({'miembros': miembros}).encode('utf-8')
+
+    def diferido(proveedor):
+        def serializar():
+            miembros = []
+            for fila in filas:
+                fila = dict(fila)
+                if fila['condiciones_medicas']:
+                    fila['condiciones_medicas'] = json_provider.LazyJSON(fila['condiciones_medicas'])
+                miembros.append(fila)
+            return proveedor.dumps_bytes({'miembros': miembros})
+        return serializar
+
+    def columnas(proveedor):
+        def serializar():
+            nombres = list(filas[0])
+            tuplas = [tuple(fila[c] for c in nombres) for fila in filas]
+            return proveedor.dumps_bytes(json_provider.ColumnarRows(nombres, tuplas))
+        return serializar
+
+    estandar = json_provider.GymJSONProvider(app)
+    estandar.use_orjson = False
+    salidas = {}
+    print(f'{n} filas, {repeticiones} repeticiones')
+    salidas['flask'] = medir('Flask (actual)', anterior, repeticiones)
+    salidas['estandar'] = medir('GymJSONProvider / json', diferido(estandar), repeticiones)
+    medir('  columnas / json', columnas(estandar), repeticiones)
+    if json_provider.orjson is not None:
+        rapido = json_provider.GymJSONProvider(app)
+        rapido.use_orjson = True
+        salidas['orjson'] = medir('GymJSONProvider / orjson', diferido(rapido), repeticiones)
+        medir('  columnas / orjson', columnas(rapido), repeticiones)
+    else:
+        print('orjson no está instalado')
+
+    referencia = json.loads(salidas['flask'])
+    for nombre, salida in salidas.items():
+        if json.loads(salida) != referencia:
+            print(f'La salida de {nombre} no coincide con la de Flask')
+            return 1
+    print('Salidas equivalentes')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Caché de resultados calculados a partir de la base de datos.
+
+Cada entrada guarda el resultado de una función costosa (varias consultas
+agregadas, por ejemplo) durante ``ttl`` segundos y declara las tablas de
+las que depende. Al escribir en una tabla se invalida todo lo que depende
+de ella; el TTL cubre los cambios hechos por otros workers. Si varias
+solicitudes piden a la vez una entrada vencida, solo una la calcula y las
+demás esperan ese resultado.
+"""
+import threading
+import time
+
+
+class _Entrada:
+    __slots__ = ('valor', 'expira', 'tablas', 'calculando')
+
+    def __init__(self, tablas):
+        self.valor = None
+        self.expira = 0.0
+        self.tablas = frozenset(tablas)
+        self.calculando = None  # Event mientras un hilo calcula el valor
+
+
+class ResultCache:
+    """
+    Resultados por clave con TTL e invalidación por tabla.
+
+    - ``ttl``: segundos que vive una entrada si nadie la invalida.
+    - ``max_entries``: entradas máximas; al superarlo se descartan las
+      vencidas y, si no alcanza, las más próximas a vencer.
+    """
+
+    def __init__(self, ttl=30, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entradas = {}
+        self._stats = {'hits': 0, 'misses': 0, 'waits': 0, 'invalidations': 0}
+
+    def get(self, key, compute, tables=(), ttl=None):
+        """Devuelve el valor de ``key``; si no está vigente lo calcula con ``compute()``"""
+        while True:
+            with self._lock:
+                entrada = self._entradas.get(key)
+                if entrada is None:
+                    self._recortar()
+                    entrada = self._entradas[key] = _Entrada(tables)
+                ahora = time.monotonic()
+                if entrada.calculando is None and entrada.expira > ahora:
+                    self._stats['hits'] += 1
+                    return entrada.valor
+                espera = entrada.calculando
+                if espera is None:
+                    entrada.calculando = listo = threading.Event()
+                    self._stats['misses'] += 1
+                else:
+                    self._stats['waits'] += 1
+            if espera is None:
+                break
+            # Otro hilo está calculando el mismo valor
+            espera.wait()
+
+        try:
+            valor = compute()
+        except BaseException:
+            with self._lock:
+                entrada.calculando = None
+            listo.set()
+            raise
+        with self._lock:
+            # Si se invalidó mientras se calculaba, el valor no se reutiliza
+            if self._entradas.get(key) is entrada:
+                entrada.valor = valor
+                entrada.expira = time.monotonic() + (self.ttl if ttl is None else ttl)
+            entrada.calculando = None
+        listo.set()
+        return valor
+
+    def invalidate(self, *tables):
+        """Descarta las entradas que dependen de alguna de las tablas"""
+        tablas = set(tables)
+        with self._lock:
+            for key, entrada in list(self._entradas.items()):
+                if entrada.tablas & tablas:
+                    del self._entradas[key]
+                    self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def _recortar(self):
+        # Con _lock tomado, antes de agregar una entrada
+        if len(self._entradas) < self.max_entries:
+            return
+        ahora = time.monotonic()
+        for key, entrada in list(self._entradas.items()):
+            if entrada.calculando is None and entrada.expira <= ahora:
+                del self._entradas[key]
+        sobrantes = len(self._entradas) - self.max_entries + 1
+        if sobrantes > 0:
+            candidatas = sorted(
+                ((entrada.expira, key) for key, entrada in self._entradas.items()
+                 if entrada.calculando is None),
+                key=lambda par: par[0]
+            )
+            for _, key in candidatas[:sobrantes]:
+                del self._entradas[key]
+
+    def stats(self):
+        """Métricas de la caché para monitoreo"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entradas)
+        return stats
@@ -0,0 +1,271 @@
+"""
+Compresión de las respuestas HTTP.
+
+``compress_response`` se registra como ``after_request``: si el cliente
+acepta brotli (con el paquete ``brotli`` instalado) o gzip y el cuerpo es
+de un tipo comprimible y supera ``min_size`` bytes, lo comprime. Las
+respuestas transmitidas por bloques (NDJSON/CSV) se comprimen bloque a
+bloque, vaciando el compresor tras cada uno para no retener filas.
+
+``send_static`` sirve los archivos estáticos con ETag y ``Cache-Control``
+(``immutable`` si el nombre lleva un hash de contenido) y guarda en memoria
+las versiones comprimidas, o usa ``archivo.br``/``archivo.gz`` si ya
+existen junto al original.
+"""
+import gzip
+import mimetypes
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import Response, abort, request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él solo se usa gzip
+    brotli = None
+
+# Tipos que vale la pena comprimir (imágenes y fuentes ya vienen comprimidas)
+COMPRIMIBLES = {
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'application/xml', 'application/manifest+json', 'image/svg+xml',
+}
+
+# main.3f2a1b9c.js, app-5d41402a.css: nombres con hash de contenido
+_CON_HASH = re.compile(r'[.-][0-9a-f]{8,}\.', re.IGNORECASE)
+_EXTENSIONES = {'br': '.br', 'gzip': '.gz'}
+
+min_size = 1024
+gzip_level = 6
+brotli_quality = 4
+static_max_age = 365 * 24 * 3600
+
+_lock = threading.Lock()
+_stats = {'responses': 0, 'streams': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+
+def configure(minimum_size=1024, level=6, quality=4, static_cache_bytes=32 * 1024 * 1024):
+    """Umbral en bytes, nivel de gzip y calidad de brotli para las respuestas dinámicas"""
+    global min_size, gzip_level, brotli_quality
+    min_size = minimum_size
+    gzip_level = level
+    brotli_quality = quality
+    static_cache.max_bytes = static_cache_bytes
+
+
+def comprimible(mimetype):
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in COMPRIMIBLES)
+
+
+def negotiate():
+    """``'br'``, ``'gzip'`` o None según el Accept-Encoding de la solicitud"""
+    aceptadas = request.accept_encodings
+    if brotli is not None and aceptadas.quality('br') > 0:
+        return 'br'
+    if aceptadas.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def compress(datos, codificacion, estatico=False):
+    """Comprime un cuerpo completo; los estáticos usan el nivel máximo"""
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=11 if estatico else brotli_quality)
+    return gzip.compress(datos, compresslevel=9 if estatico else gzip_level, mtime=0)
+
+
+class _Flujo:
+    """Compresor incremental: cada bloque sale completo para el cliente"""
+
+    def __init__(self, codificacion):
+        if codificacion == 'br':
+            self._br = brotli.Compressor(quality=brotli_quality)
+            self._gz = None
+        else:
+            self._br = None
+            self._gz = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def bloque(self, datos):
+        if self._br is not None:
+            return self._br.process(datos) + self._br.flush()
+        return self._gz.compress(datos) + self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def fin(self):
+        if self._br is not None:
+            return self._br.finish()
+        return self._gz.flush()
+
+
+def _comprimir_flujo(bloques, codificacion):
+    flujo = _Flujo(codificacion)
+    for datos in bloques:
+        if datos:
+            salida = flujo.bloque(datos)
+            with _lock:
+                _stats['bytes_in'] += len(datos)
+                _stats['bytes_out'] += len(salida)
+            yield salida
+    yield flujo.fin()
+
+
+def _variante(response, codificacion):
+    response.headers['Content-Encoding'] = codificacion
+    # El cuerpo comprimido no es idéntico byte a byte: el ETag pasa a débil
+    etag, debil = response.get_etag()
+    if etag and not debil:
+        response.set_etag(etag, weak=True)
+
+
+def compress_response(response):
+    """after_request: comprime la respuesta si el cliente lo acepta y conviene"""
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or not comprimible(response.mimetype)):
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.cache_control.no_transform or request.method == 'HEAD':
+        return response
+    codificacion = negotiate()
+    if codificacion is None:
+        return response
+
+    if response.is_streamed:
+        bloques = response.iter_encoded()
+        original = response.response
+        response.response = _comprimir_flujo(bloques, codificacion)
+        # Cerrar el generador original libera la conexión aunque el cliente
+        # se desconecte antes de leer el primer bloque
+        if hasattr(original, 'close'):
+            response.call_on_close(original.close)
+        response.headers.pop('Content-Length', None)
+        _variante(response, codificacion)
+        with _lock:
+            _stats['streams'] += 1
+        return response
+
+    datos = response.get_data()
+    if len(datos) < min_size:
+        return response
+    comprimido = compress(datos, codificacion)
+    response.set_data(comprimido)
+    _variante(response, codificacion)
+    with _lock:
+        _stats['responses'] += 1
+        _stats['bytes_in'] += len(datos)
+        _stats['bytes_out'] += len(comprimido)
+    return response
+
+
+class StaticCache:
+    """Cuerpos comprimidos de archivos estáticos, por ruta, fecha y tamaño (LRU por bytes)"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'precompressed': 0}
+
+    def get(self, ruta, stat, codificacion):
+        clave = (ruta, codificacion)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] == version:
+                self._entradas.move_to_end(clave)
+                self._stats['hits'] += 1
+                return entrada[1]
+            self._stats['misses'] += 1
+
+        cuerpo = self._leer_precomprimido(ruta, stat, codificacion)
+        if cuerpo is None:
+            with open(ruta, 'rb') as archivo:
+                cuerpo = compress(archivo.read(), codificacion, estatico=True)
+
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior[1])
+            if len(cuerpo) <= self.max_bytes:
+                self._entradas[clave] = (version, cuerpo)
+                self._bytes += len(cuerpo)
+                while self._bytes > self.max_bytes:
+                    _, (_, descartado) = self._entradas.popitem(last=False)
+                    self._bytes -= len(descartado)
+        return cuerpo
+
+    def _leer_precomprimido(self, ruta, stat, codificacion):
+        # Versión generada en el build, solo si no es anterior al original
+        comprimido = ruta + _EXTENSIONES[codificacion]
+        try:
+            if os.stat(comprimido).st_mtime_ns < stat.st_mtime_ns:
+                return None
+            with open(comprimido, 'rb') as archivo:
+                cuerpo = archivo.read()
+        except OSError:
+            return None
+        with self._lock:
+            self._stats['precompressed'] += 1
+        return cuerpo
+
+    def clear(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entradas)
+            stats['bytes'] = self._bytes
+        return stats
+
+
+static_cache = StaticCache()
+
+
+def _cache_control(response, path):
+    if _CON_HASH.search(os.path.basename(path)):
+        # El nombre cambia con el contenido: el navegador no necesita revalidar
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = static_max_age
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+
+
+def send_static(directory, path):
+    """Archivo estático con ETag, Cache-Control y compresión cacheada"""
+    ruta = safe_join(directory, path)
+    if ruta is None or not os.path.isfile(ruta):
+        abort(404)
+    stat = os.stat(ruta)
+    mimetype = mimetypes.guess_type(ruta)[0] or 'application/octet-stream'
+    codificacion = negotiate() if comprimible(mimetype) and stat.st_size >= min_size else None
+
+    if codificacion is None:
+        response = send_from_directory(directory, path)
+    else:
+        response = Response(static_cache.get(ruta, stat, codificacion), mimetype=mimetype)
+        response.headers['Content-Encoding'] = codificacion
+        response.set_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}-{codificacion}')
+        response.last_modified = int(stat.st_mtime)
+        response.make_conditional(request)
+    if comprimible(mimetype):
+        response.vary.add('Accept-Encoding')
+    _cache_control(response, path)
+    return response
+
+
+def stats():
+    """Métricas de compresión para el endpoint de salud"""
+    with _lock:
+        resultado = dict(_stats)
+    resultado['brotli'] = brotli is not None
+    resultado['static_cache'] = static_cache.stats()
+    return resultado
@@ -0,0 +1,339 @@
+"""
+Pool de conexiones MySQL compartido por todas las rutas de la API.
+
+Cada solicitud toma una conexión ya autenticada del pool en lugar de abrir
+una nueva (TCP + handshake) y la devuelve al terminar. El pool mantiene un
+número fijo de conexiones en reposo, permite un desborde temporal, recicla
+las conexiones viejas, las valida antes de entregarlas y se reinicia solo
+cuando el proceso se bifurca (servidores con varios workers).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+
+
+class PoolTimeoutError(Error):
+    """No se liberó ninguna conexión dentro del tiempo de espera del pool"""
+
+
+# Conexiones heredadas de un proceso padre. No se cierran en el hijo porque
+# el socket es compartido y cerrarlo terminaría la sesión del padre.
+_conexiones_heredadas = []
+
+
+class StatementCache:
+    """
+    Cursores preparados de una conexión física, del usado hace más tiempo al
+    más reciente. Con más de ``max_size`` se cierra el más viejo, lo que
+    libera su sentencia en el servidor (``max_prepared_stmt_count`` es
+    global para todo MySQL). Solo la usa el hilo que tiene la conexión.
+    """
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self._cursores = OrderedDict()
+
+    def get(self, key):
+        cursor = self._cursores.get(key)
+        if cursor is not None:
+            self._cursores.move_to_end(key)
+        return cursor
+
+    def put(self, key, cursor):
+        self._cursores[key] = cursor
+        self._cursores.move_to_end(key)
+        while len(self._cursores) > self.max_size:
+            _, viejo = self._cursores.popitem(last=False)
+            try:
+                viejo.close()
+            except Error:
+                pass
+
+    def pop(self, key, default=None):
+        return self._cursores.pop(key, default)
+
+    def clear(self):
+        self._cursores.clear()
+
+    def __len__(self):
+        return len(self._cursores)
+
+
+class _Entrada:
+    """Conexión física junto con sus marcas de tiempo y sentencias preparadas"""
+
+    __slots__ = ('cnx', 'creada', 'ultimo_uso', 'sentencias')
+
+    def __init__(self, cnx, max_sentencias=128):
+        self.cnx = cnx
+        self.creada = time.monotonic()
+        self.ultimo_uso = self.creada
+        self.sentencias = StatementCache(max_sentencias)
+
+
+class PooledConnection:
+    """
+    Conexión prestada por el pool.
+
+    Se comporta como una conexión de mysql-connector; ``close()`` no cierra
+    el socket sino que cierra los cursores abiertos y devuelve la conexión
+    al pool.
+    """
+
+    def __init__(self, pool, entrada):
+        self._pool = pool
+        self._entrada = entrada
+        self._cursores = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._entrada.cnx.cursor(*args, **kwargs)
+        self._cursores.append(cursor)
+        return cursor
+
+    def raw_cursor(self, *args, **kwargs):
+        """Cursor que sobrevive a la devolución de la conexión (sentencias preparadas)"""
+        return self._entrada.cnx.cursor(*args, **kwargs)
+
+    @property
+    def statement_cache(self):
+        """Cursores preparados que pertenecen a la conexión física"""
+        return self._entrada.sentencias
+
+    def is_connected(self):
+        return self._entrada is not None and self._entrada.cnx.is_connected()
+
+    def close(self):
+        if self._entrada is None:
+            return
+        entrada, self._entrada = self._entrada, None
+        for cursor in self._cursores:
+            try:
+                cursor.close()
+            except Error:
+                pass
+        self._cursores = []
+        self._pool._release(entrada)
+
+    def discard(self):
+        """Cierra la conexión física en lugar de devolverla (p. ej. con un resultado sin leer)"""
+        if self._entrada is None:
+            return
+        entrada, self._entrada = self._entrada, None
+        self._cursores = []
+        self._pool._release(entrada, descartar=True)
+
+    def __getattr__(self, nombre):
+        if self._entrada is None:
+            raise Error('La conexión ya fue devuelta al pool')
+        return getattr(self._entrada.cnx, nombre)
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones con tamaño fijo, desborde y reciclaje.
+
+    - ``size``: conexiones que se mantienen abiertas en reposo.
+    - ``max_overflow``: conexiones extra permitidas en picos; se cierran al
+      devolverse si el pool ya tiene ``size`` conexiones en reposo.
+    - ``recycle``: segundos de vida máxima de una conexión.
+    - ``timeout``: segundos que una solicitud espera por una conexión libre.
+    - ``pre_ping``: valida con ``ping`` las conexiones que llevan más de
+      ``ping_interval`` segundos sin usarse antes de entregarlas.
+    - ``max_statements``: sentencias preparadas que guarda cada conexión.
+    """
+
+    def __init__(self, connect_args, size=5, max_overflow=10, recycle=1800,
+                 timeout=5, pre_ping=True, ping_interval=30, max_statements=128):
+        self._connect_args = dict(connect_args)
+        self.max_statements = max_statements
+        self.size = size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.ping_interval = ping_interval
+        self._reiniciar_estado()
+
+    def _reiniciar_estado(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._disponible = threading.Condition(self._lock)
+        self._en_reposo = deque()
+        self._abiertas = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'exhausted': 0,
+            'timeouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'invalidated': 0,
+        }
+
+    def _despues_de_fork(self):
+        """Descarta el estado heredado para que el hijo abra sus propias conexiones"""
+        _conexiones_heredadas.extend(self._en_reposo)
+        self._reiniciar_estado()
+
+    def _conectar(self):
+        entrada = _Entrada(mysql.connector.connect(**self._connect_args), self.max_statements)
+        with self._lock:
+            self._stats['created'] += 1
+        return entrada
+
+    def _cerrar(self, entrada):
+        entrada.sentencias.clear()
+        try:
+            entrada.cnx.close()
+        except Error:
+            pass
+
+    def _validar(self, entrada):
+        """Recicla o verifica una conexión en reposo antes de entregarla"""
+        ahora = time.monotonic()
+        if self.recycle and ahora - entrada.creada > self.recycle:
+            self._cerrar(entrada)
+            with self._lock:
+                self._stats['recycled'] += 1
+            return self._conectar()
+        if self.pre_ping and ahora - entrada.ultimo_uso >= self.ping_interval:
+            try:
+                entrada.cnx.ping(reconnect=False)
+            except Error:
+                self._cerrar(entrada)
+                with self._lock:
+                    self._stats['invalidated'] += 1
+                return self._conectar()
+        return entrada
+
+    def acquire(self):
+        """Entrega una conexión del pool, esperando hasta ``timeout`` si está agotado"""
+        if os.getpid() != self._pid:
+            self._despues_de_fork()
+
+        inicio = time.monotonic()
+        espero = False
+        with self._disponible:
+            while True:
+                if self._en_reposo:
+                    # LIFO: la conexión usada más recientemente sigue caliente
+                    entrada = self._en_reposo.pop()
+                    break
+                if self._abiertas < self.size + self.max_overflow:
+                    self._abiertas += 1
+                    entrada = None
+                    break
+                if not espero:
+                    espero = True
+                    self._stats['exhausted'] += 1
+                restante = self.timeout - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        msg=f'Pool agotado: ninguna conexión libre tras {self.timeout}s')
+                self._disponible.wait(restante)
+            self._stats['checkouts'] += 1
+            if espero:
+                self._stats['waits'] += 1
+                self._stats['wait_time'] += time.monotonic() - inicio
+
+        try:
+            entrada = self._conectar() if entrada is None else self._validar(entrada)
+        except Exception:
+            with self._disponible:
+                self._abiertas -= 1
+                self._disponible.notify()
+            raise
+        return PooledConnection(self, entrada)
+
+    def _release(self, entrada, descartar=False):
+        if os.getpid() != self._pid:
+            return
+
+        if not descartar:
+            try:
+                # Cierra cualquier transacción pendiente para no filtrar estado
+                # (ni un snapshot de lectura viejo) a la siguiente solicitud
+                entrada.cnx.rollback()
+            except Error:
+                descartar = True
+
+        with self._disponible:
+            if descartar or len(self._en_reposo) >= self.size:
+                self._abiertas -= 1
+                if descartar:
+                    self._stats['invalidated'] += 1
+            else:
+                entrada.ultimo_uso = time.monotonic()
+                self._en_reposo.append(entrada)
+                entrada = None
+            self._disponible.notify()
+
+        if entrada is not None:
+            self._cerrar(entrada)
+
+    def dispose(self):
+        """Cierra todas las conexiones en reposo"""
+        with self._disponible:
+            entradas = list(self._en_reposo)
+            self._en_reposo.clear()
+            self._abiertas -= len(entradas)
+        for entrada in entradas:
+            self._cerrar(entrada)
+
+    def stats(self):
+        """Métricas del pool para monitoreo"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['max_overflow'] = self.max_overflow
+            stats['open'] = self._abiertas
+            stats['idle'] = len(self._en_reposo)
+            stats['in_use'] = self._abiertas - len(self._en_reposo)
+        stats['wait_time'] = round(stats['wait_time'], 6)
+        return stats
+
+
+_pool = None
+
+
+def _reiniciar_tras_fork():
+    # Un solo hook para el proceso: registrarlo por pool mantendría vivos
+    # todos los pools que se hayan creado
+    if _pool is not None:
+        _pool._despues_de_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+
+def configure_pool(connect_args, **opciones):
+    """Crea el pool global de la aplicación"""
+    global _pool
+    if _pool is not None:
+        _pool.dispose()
+    _pool = ConnectionPool(connect_args, **opciones)
+    return _pool
+
+
+def get_pool():
+    if _pool is None:
+        raise RuntimeError('El pool de conexiones no ha sido configurado')
+    return _pool
+
+
+@contextmanager
+def connection():
+    """Presta una conexión del pool y la devuelve al salir del bloque"""
+    cnx = get_pool().acquire()
+    try:
+        yield cnx
+    finally:
+        cnx.close()
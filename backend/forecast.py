@@ -0,0 +1,90 @@
+"""
+Pronóstico de ocupación por día y franja para planificar el personal.
+
+El punto de partida son las matrices días × franjas de ``heatmap.daily``
+con las últimas semanas completas. Para cada día de la semana y franja se
+calcula un promedio ponderado (las semanas recientes pesan más) y su
+desviación; una recta ajustada a los totales diarios, sin el efecto del día
+de la semana, ajusta ese nivel hacia los días pronosticados. Los días con
+mucha menos ocupación que la habitual para su día de la semana (feriados,
+cierres) no entran en el cálculo.
+"""
+import numpy as np
+
+# Cuantil 90 de la normal: la banda ``alta`` cubre nueve de cada diez días
+Z_ALTO = 1.2816
+
+# Fracción de la ocupación habitual por debajo de la cual un día se descarta
+FRACCION_CIERRE = 0.2
+
+
+def seasonal_baseline(valores, dia_semana, pesos):
+    """
+    Promedio ponderado y desviación por día de la semana de ``valores``
+    (días × franjas). Devuelve dos arreglos 7 × franjas.
+    """
+    franjas = valores.shape[1]
+    suma_pesos = np.bincount(dia_semana, weights=pesos, minlength=7)
+    suma = np.zeros((7, franjas))
+    suma_cuadrados = np.zeros((7, franjas))
+    np.add.at(suma, dia_semana, valores * pesos[:, None])
+    np.add.at(suma_cuadrados, dia_semana, valores ** 2 * pesos[:, None])
+    divisor = np.maximum(suma_pesos, 1e-9)[:, None]
+    media = suma / divisor
+    varianza = np.maximum(suma_cuadrados / divisor - media ** 2, 0)
+    return media, np.sqrt(varianza)
+
+
+def trend_factors(totales, dia_semana, pesos, futuros, minimo=0.5, maximo=1.5):
+    """
+    Factor de tendencia para los días ``futuros`` (índices desde el primer
+    día de la historia): el cociente entre la recta ajustada en ese día y
+    en el centro ponderado de la historia, que es donde está la línea base.
+    """
+    nivel = np.bincount(dia_semana, weights=totales * pesos, minlength=7) / \
+        np.maximum(np.bincount(dia_semana, weights=pesos, minlength=7), 1e-9)
+    dias = np.flatnonzero((pesos > 0) & (nivel[dia_semana] > 0))
+    if len(dias) < 14:
+        return np.ones(len(futuros))
+    desestacionalizado = totales[dias] / nivel[dia_semana[dias]]
+    pendiente, ordenada = np.polyfit(dias, desestacionalizado, 1)
+    centro = np.average(dias, weights=pesos[dias])
+    base = ordenada + pendiente * centro
+    if base <= 0:
+        return np.ones(len(futuros))
+    return np.clip((ordenada + pendiente * np.asarray(futuros)) / base, minimo, maximo)
+
+
+def forecast(ocupacion, llegadas, primer_dia, horizonte=14, decaimiento=0.85):
+    """
+    Pronóstico para los ``horizonte`` días siguientes a la historia.
+
+    - ``ocupacion``/``llegadas``: matrices días × franjas de ``heatmap.daily``
+      que terminan el día anterior al primero pronosticado.
+    - ``primer_dia``: día de la semana (lunes = 0) de la primera fila.
+    - ``decaimiento``: peso de cada semana respecto a la siguiente.
+
+    Devuelve ``esperado`` y ``alto`` (personas presentes) y ``entradas``,
+    matrices ``horizonte`` × franjas, y ``dia_semana`` de cada día.
+    """
+    dias = ocupacion.shape[0]
+    dia_semana = (primer_dia + np.arange(dias)) % 7
+    totales = ocupacion.sum(axis=1)
+    semanas_atras = (dias - 1 - np.arange(dias)) // 7
+    pesos = np.where(totales > 0, decaimiento ** semanas_atras, 0.0)
+    habitual = np.bincount(dia_semana, weights=totales * pesos, minlength=7) / \
+        np.maximum(np.bincount(dia_semana, weights=pesos, minlength=7), 1e-9)
+    pesos[totales < FRACCION_CIERRE * habitual[dia_semana]] = 0.0
+
+    media, desviacion = seasonal_baseline(ocupacion, dia_semana, pesos)
+    media_llegadas, _ = seasonal_baseline(llegadas.astype(np.float64), dia_semana, pesos)
+
+    futuros = dias + np.arange(horizonte)
+    dia_futuro = (primer_dia + futuros) % 7
+    factor = trend_factors(totales, dia_semana, pesos, futuros)[:, None]
+    return {
+        'esperado': media[dia_futuro] * factor,
+        'alto': (media[dia_futuro] + Z_ALTO * desviacion[dia_futuro]) * factor,
+        'entradas': media_llegadas[dia_futuro] * factor,
+        'dia_semana': dia_futuro,
+    }
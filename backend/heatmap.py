@@ -0,0 +1,101 @@
+"""
+Mapa de calor de ocupación por día de la semana y franja horaria.
+
+Las estancias (entrada, salida) se reciben como segundos desde la
+medianoche del primer día del rango y se acumulan con NumPy, sin recorrer
+las visitas en Python: cada estancia suma los segundos que pasó dentro de
+cada franja, así que una persona que entrena de 18:10 a 19:30 cuenta en
+las franjas de 18:00 a 19:15 y no solo en la de su entrada. La ocupación
+de una franja es el promedio de personas presentes durante ella.
+"""
+import numpy as np
+
+DIAS_SEMANA = ('Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom')
+
+
+def franjas(minutos=15):
+    """Etiquetas ``HH:MM`` de las franjas de un día"""
+    return [f'{m // 60:02d}:{m % 60:02d}' for m in range(0, 24 * 60, minutos)]
+
+
+def to_arrays(bloques):
+    """Une los bloques de filas ``(entrada, salida)`` en dos arreglos float (salida NaN si es NULL)"""
+    partes = [np.array(filas, dtype=np.float64).reshape(-1, 2) for filas in bloques if filas]
+    if not partes:
+        return np.empty(0), np.empty(0)
+    pares = np.concatenate(partes)
+    return pares[:, 0], pares[:, 1]
+
+
+def presence(entradas, salidas, total_segundos, minutos=15, ahora=None, max_estancia=4 * 3600):
+    """
+    Segundos de presencia acumulados en cada franja del rango.
+
+    - ``entradas``/``salidas``: segundos desde el inicio del rango; una
+      salida NaN es una sesión abierta, que termina en ``ahora`` (si está en
+      el rango) o tras ``max_estancia``.
+    - Las estancias se recortan a ``max_estancia`` (salidas olvidadas) y al
+      rango ``[0, total_segundos)``.
+    """
+    franja = minutos * 60
+    n = int(total_segundos // franja)
+    fin_abierta = entradas + max_estancia
+    if ahora is not None:
+        fin_abierta = np.minimum(fin_abierta, np.maximum(ahora, entradas))
+    salidas = np.where(np.isnan(salidas), fin_abierta, np.minimum(salidas, entradas + max_estancia))
+    inicio = np.clip(entradas, 0, total_segundos)
+    fin = np.clip(salidas, inicio, total_segundos)
+
+    # Cada estancia cubre las franjas s0..s1; con un arreglo de diferencias
+    # y cumsum se cuentan las estancias que tocan cada franja, y después se
+    # descuenta la parte de la primera y la última franja que no ocupó
+    s0 = (inicio // franja).astype(np.int64)
+    s1 = (fin // franja).astype(np.int64)
+    cubiertas = np.cumsum(np.bincount(s0, minlength=n + 2) - np.bincount(s1 + 1, minlength=n + 2))
+    segundos = cubiertas[:n + 1] * float(franja)
+    segundos -= np.bincount(s0, weights=inicio - s0 * franja, minlength=n + 1)
+    segundos -= np.bincount(s1, weights=(s1 + 1) * franja - fin, minlength=n + 1)
+    return segundos[:n]
+
+
+def daily(entradas, salidas, dias, minutos=15, ahora=None, max_estancia=4 * 3600):
+    """
+    Matrices días × franjas con el promedio de personas presentes y la
+    cantidad de entradas en cada franja del rango.
+    """
+    por_dia = 24 * 60 // minutos
+    total = dias * 24 * 3600
+    ocupacion = presence(entradas, salidas, total, minutos, ahora, max_estancia)
+    ocupacion = (ocupacion / (minutos * 60)).reshape(dias, por_dia)
+    validas = entradas[(entradas >= 0) & (entradas < total)]
+    llegadas = np.bincount((validas // (minutos * 60)).astype(np.int64),
+                           minlength=dias * por_dia).reshape(dias, por_dia)
+    return ocupacion, llegadas
+
+
+def weekly(entradas, salidas, primer_dia, dias, minutos=15, ahora=None, max_estancia=4 * 3600):
+    """
+    Ocupación por día de la semana (lunes = 0) y franja.
+
+    ``primer_dia`` es el día de la semana del inicio del rango y ``dias`` su
+    duración. Devuelve ``promedio`` y ``maximo`` (personas presentes,
+    arreglos 7 × franjas), ``entradas`` (promedio de entradas por franja) y
+    ``dias_por_semana`` (cuántos días de cada tipo tiene el rango).
+    """
+    ocupacion, llegadas = daily(entradas, salidas, dias, minutos, ahora, max_estancia)
+    por_dia = ocupacion.shape[1]
+    dia_semana = (primer_dia + np.arange(dias)) % 7
+    cantidad = np.bincount(dia_semana, minlength=7)
+    divisor = np.maximum(cantidad, 1)[:, None]
+    promedio = np.zeros((7, por_dia))
+    maximo = np.zeros((7, por_dia))
+    np.add.at(promedio, dia_semana, ocupacion)
+    np.maximum.at(maximo, dia_semana, ocupacion)
+    suma_llegadas = np.zeros((7, por_dia))
+    np.add.at(suma_llegadas, dia_semana, llegadas)
+    return {
+        'promedio': promedio / divisor,
+        'maximo': maximo,
+        'entradas': suma_llegadas / divisor,
+        'dias_por_semana': cantidad,
+    }
@@ -40,6 +40,9 @@ CREATE TABLE IF NOT EXISTS miembros (
     especialidad VARCHAR(100),
     horario_trabajo VARCHAR(100),
     certificaciones TEXT,
+    -- Versión de los tokens del miembro: sube al cambiar su rol, estado,
+    -- email o contraseña para que los tokens emitidos antes dejen de aceptarse
+    token_version INT NOT NULL DEFAULT 0,
     fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (rol_id) REFERENCES roles(id)
@@ -54,8 +57,12 @@ CREATE TABLE IF NOT EXISTS asistencias (
     tipo_asistencia VARCHAR(50) DEFAULT 'entrenamiento',
     notas TEXT,
     creado_por INT NOT NULL,
+    -- Entradas con escritura diferida: id generado por la API para poder
+    -- reaplicar el diario sin duplicar filas
+    registro_uuid CHAR(32) NULL,
     fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_asistencias_registro (registro_uuid),
     FOREIGN KEY (miembro_id) REFERENCES miembros(id) ON DELETE CASCADE,
     FOREIGN KEY (creado_por) REFERENCES miembros(id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_spanish_ci;
@@ -125,6 +132,7 @@ CREATE TABLE IF NOT EXISTS clases (
     cupo_maximo INT,
     id_entrenador INT,
     fecha_creacion DATE DEFAULT CURRENT_DATE,
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (id_entrenador) REFERENCES miembros(id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_spanish_ci;
 
@@ -139,7 +147,8 @@ CREATE TABLE IF NOT EXISTS inventario (
     estado ENUM('activo','en reparacion','agotado','dado de baja') DEFAULT 'activo',
     proveedor VARCHAR(100),
     ubicacion VARCHAR(100),
-    precio_unitario DECIMAL(10,2)
+    precio_unitario DECIMAL(10,2),
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_spanish_ci;
 
 -- Crear tabla de asistencias
@@ -159,7 +168,7 @@ CREATE TABLE IF NOT EXISTS asistencias (
 
 -- Índices para búsquedas rápidas
 CREATE INDEX idx_asistencias_miembro ON asistencias(miembro_id);
-CREATE INDEX idx_asistencias_fecha ON asistencias(fecha_hora_entrada);
+CREATE INDEX idx_asistencias_entrada_salida ON asistencias(fecha_hora_entrada, fecha_hora_salida);
 
 -- Insertar algunos datos de ejemplo
 INSERT INTO asistencias (miembro_id, fecha_hora_entrada, fecha_hora_salida, tipo_asistencia, notas, creado_por)
@@ -446,4 +455,296 @@ CREATE INDEX idx_ejercicios_nivel ON ejercicios(nivel);
 CREATE INDEX idx_rutinas_clientes_cliente ON rutinas_clientes(cliente_id);
 CREATE INDEX idx_rutinas_clientes_entrenador ON rutinas_clientes(entrenador_id);
 CREATE INDEX idx_progreso_fecha ON progreso_ejercicios(fecha_ejecucion);
-CREATE INDEX idx_marcas_cliente ON marcas_personales(cliente_id);
\ No newline at end of file
+CREATE INDEX idx_marcas_cliente ON marcas_personales(cliente_id);
+
+-- Refresh tokens: solo se guarda el SHA-256 del token. Cada sesión es una
+-- familia de tokens que rotan en cada renovación
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    miembro_id INT NOT NULL,
+    token_hash BINARY(32) NOT NULL,
+    familia BINARY(16) NOT NULL,
+    expira DATETIME NOT NULL,
+    revocado BOOLEAN NOT NULL DEFAULT FALSE,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_refresh_tokens_hash (token_hash),
+    KEY idx_refresh_tokens_familia (familia),
+    KEY idx_refresh_tokens_miembro (miembro_id),
+    KEY idx_refresh_tokens_expira (expira),
+    FOREIGN KEY (miembro_id) REFERENCES miembros(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_spanish_ci;
+
+-- Contador de versión de roles y permisos: la API recarga sus máscaras de
+-- permisos en memoria cuando cambia
+CREATE TABLE IF NOT EXISTS permisos_version (
+    id TINYINT PRIMARY KEY,
+    version INT NOT NULL DEFAULT 0
+) ENGINE=InnoDB;
+
+INSERT INTO permisos_version (id, version) VALUES (1, 1);
+
+-- Los borrados en cascada no disparan triggers, por eso también se vigilan
+-- las tablas roles y permisos
+CREATE TRIGGER trg_rol_permisos_insert AFTER INSERT ON rol_permisos
+FOR EACH ROW UPDATE permisos_version SET version = version + 1 WHERE id = 1;
+
+CREATE TRIGGER trg_rol_permisos_update AFTER UPDATE ON rol_permisos
+FOR EACH ROW UPDATE permisos_version SET version = version + 1 WHERE id = 1;
+
+CREATE TRIGGER trg_rol_permisos_delete AFTER DELETE ON rol_permisos
+FOR EACH ROW UPDATE permisos_version SET version = version + 1 WHERE id = 1;
+
+CREATE TRIGGER trg_permisos_update AFTER UPDATE ON permisos
+FOR EACH ROW UPDATE permisos_version SET version = version + 1 WHERE id = 1;
+
+CREATE TRIGGER trg_permisos_delete AFTER DELETE ON permisos
+FOR EACH ROW UPDATE permisos_version SET version = version + 1 WHERE id = 1;
+
+CREATE TRIGGER trg_roles_update AFTER UPDATE ON roles
+FOR EACH ROW UPDATE permisos_version SET version = version + 1 WHERE id = 1;
+
+CREATE TRIGGER trg_roles_delete AFTER DELETE ON roles
+FOR EACH ROW UPDATE permisos_version SET version = version + 1 WHERE id = 1;
+
+-- Índices para el listado paginado de miembros (keyset por id o por nombre)
+CREATE INDEX idx_miembros_nombre ON miembros(nombre);
+CREATE INDEX idx_miembros_vencimiento ON miembros(fecha_vencimiento_membresia);
+
+-- Índices que cubren los conteos de los paneles (el filtro por rol del
+-- listado usa el de miembros) y los ingresos por rango de fechas
+CREATE INDEX idx_miembros_rol_activo ON miembros(rol_id, activo);
+CREATE INDEX idx_facturas_estado_fecha ON facturas(estado, fecha, total);
+
+-- Contadores de versión por tabla para los GET condicionales (ETag y
+-- Last-Modified). actualizado se guarda en UTC
+CREATE TABLE IF NOT EXISTS tablas_version (
+    tabla VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    actualizado DATETIME NOT NULL
+) ENGINE=InnoDB;
+
+INSERT INTO tablas_version (tabla, version, actualizado) VALUES
+('miembros', 1, UTC_TIMESTAMP()),
+('roles', 1, UTC_TIMESTAMP()),
+('clases', 1, UTC_TIMESTAMP()),
+('categorias_ejercicios', 1, UTC_TIMESTAMP()),
+('ejercicios', 1, UTC_TIMESTAMP());
+
+CREATE TRIGGER trg_miembros_version_insert AFTER INSERT ON miembros
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'miembros';
+
+CREATE TRIGGER trg_miembros_version_update AFTER UPDATE ON miembros
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'miembros';
+
+CREATE TRIGGER trg_miembros_version_delete AFTER DELETE ON miembros
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'miembros';
+
+CREATE TRIGGER trg_roles_version_insert AFTER INSERT ON roles
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'roles';
+
+CREATE TRIGGER trg_roles_version_update AFTER UPDATE ON roles
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'roles';
+
+CREATE TRIGGER trg_roles_version_delete AFTER DELETE ON roles
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'roles';
+
+CREATE TRIGGER trg_clases_version_insert AFTER INSERT ON clases
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'clases';
+
+CREATE TRIGGER trg_clases_version_update AFTER UPDATE ON clases
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'clases';
+
+CREATE TRIGGER trg_clases_version_delete AFTER DELETE ON clases
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'clases';
+
+CREATE TRIGGER trg_categorias_ejercicios_version_insert AFTER INSERT ON categorias_ejercicios
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'categorias_ejercicios';
+
+CREATE TRIGGER trg_categorias_ejercicios_version_update AFTER UPDATE ON categorias_ejercicios
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'categorias_ejercicios';
+
+CREATE TRIGGER trg_categorias_ejercicios_version_delete AFTER DELETE ON categorias_ejercicios
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'categorias_ejercicios';
+
+CREATE TRIGGER trg_ejercicios_version_insert AFTER INSERT ON ejercicios
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'ejercicios';
+
+CREATE TRIGGER trg_ejercicios_version_update AFTER UPDATE ON ejercicios
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'ejercicios';
+
+CREATE TRIGGER trg_ejercicios_version_delete AFTER DELETE ON ejercicios
+FOR EACH ROW UPDATE tablas_version SET version = version + 1, actualizado = UTC_TIMESTAMP() WHERE tabla = 'ejercicios';
+
+-- Sincronización incremental (/api/sync) por fecha_actualizacion
+CREATE INDEX idx_miembros_actualizacion ON miembros(fecha_actualizacion);
+CREATE INDEX idx_clases_actualizacion ON clases(fecha_actualizacion);
+CREATE INDEX idx_rutinas_actualizacion ON rutinas(fecha_actualizacion);
+CREATE INDEX idx_facturas_actualizacion ON facturas(fecha_actualizacion);
+CREATE INDEX idx_inventario_actualizacion ON inventario(fecha_actualizacion);
+
+-- Registros eliminados de las tablas sincronizadas. Se purgan a diario
+-- pasado el periodo de retención; un terminal más atrasado recibe la copia
+-- completa
+CREATE TABLE IF NOT EXISTS sync_eliminados (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    tabla VARCHAR(32) NOT NULL,
+    registro_id INT NOT NULL,
+    fecha_eliminacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_sync_eliminados_fecha (fecha_eliminacion)
+) ENGINE=InnoDB;
+
+CREATE TRIGGER trg_miembros_sync_delete AFTER DELETE ON miembros
+FOR EACH ROW INSERT INTO sync_eliminados (tabla, registro_id) VALUES ('miembros', OLD.id);
+
+CREATE TRIGGER trg_clases_sync_delete AFTER DELETE ON clases
+FOR EACH ROW INSERT INTO sync_eliminados (tabla, registro_id) VALUES ('clases', OLD.id);
+
+CREATE TRIGGER trg_rutinas_sync_delete AFTER DELETE ON rutinas
+FOR EACH ROW INSERT INTO sync_eliminados (tabla, registro_id) VALUES ('rutinas', OLD.id);
+
+CREATE TRIGGER trg_facturas_sync_delete AFTER DELETE ON facturas
+FOR EACH ROW INSERT INTO sync_eliminados (tabla, registro_id) VALUES ('facturas', OLD.id);
+
+CREATE TRIGGER trg_inventario_sync_delete AFTER DELETE ON inventario
+FOR EACH ROW INSERT INTO sync_eliminados (tabla, registro_id) VALUES ('inventario', OLD.id);
+
+-- Las facturas se borran en cascada con su miembro y la cascada no dispara
+-- triggers: se registran antes de borrar el miembro
+CREATE TRIGGER trg_miembros_sync_facturas BEFORE DELETE ON miembros
+FOR EACH ROW INSERT INTO sync_eliminados (tabla, registro_id)
+SELECT 'facturas', id FROM facturas WHERE miembro_id = OLD.id;
+
+-- Los entrenadores registran la asistencia de sus clientes
+INSERT IGNORE INTO rol_permisos (rol_id, permiso_id)
+SELECT 2, id FROM permisos WHERE nombre = 'gestionar_asistencias';
+
+-- Resumen diario de asistencias de clientes (rol 3) para los reportes. Lo
+-- mantienen los triggers de asistencias; el job diario reconstruye los
+-- últimos días y /api/admin/asistencias-diarias/reconstruir cualquier rango.
+-- Las visitas por miembro y día permiten contar clientes únicos en un rango
+CREATE TABLE IF NOT EXISTS asistencias_diarias (
+    fecha DATE PRIMARY KEY,
+    visitas INT NOT NULL DEFAULT 0,
+    clientes_unicos INT NOT NULL DEFAULT 0,
+    visitas_cerradas INT NOT NULL DEFAULT 0, -- con salida registrada
+    minutos_totales BIGINT NOT NULL DEFAULT 0, -- de las visitas cerradas
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_spanish_ci;
+
+CREATE TABLE IF NOT EXISTS asistencias_diarias_miembros (
+    fecha DATE NOT NULL,
+    miembro_id INT NOT NULL,
+    visitas INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha, miembro_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_spanish_ci;
+
+-- Cada cambio resta la fila anterior y suma la nueva, en este orden (los
+-- triggers del mismo evento se ejecutan en el orden de creación). Un
+-- miembro cuenta como cliente único el día en que su número de visitas
+-- pasa de 0 a 1 o de 1 a 0
+CREATE TRIGGER trg_asistencias_diarias_miembro_resta_update AFTER UPDATE ON asistencias
+FOR EACH ROW UPDATE asistencias_diarias_miembros SET visitas = visitas - 1
+WHERE fecha = DATE(OLD.fecha_hora_entrada) AND miembro_id = OLD.miembro_id;
+
+CREATE TRIGGER trg_asistencias_diarias_resta_update AFTER UPDATE ON asistencias
+FOR EACH ROW UPDATE asistencias_diarias d
+JOIN asistencias_diarias_miembros dm ON dm.fecha = d.fecha AND dm.miembro_id = OLD.miembro_id
+SET d.visitas = d.visitas - 1,
+    d.clientes_unicos = d.clientes_unicos - (dm.visitas = 0),
+    d.visitas_cerradas = d.visitas_cerradas - (OLD.fecha_hora_salida IS NOT NULL),
+    d.minutos_totales = d.minutos_totales - COALESCE(TIMESTAMPDIFF(MINUTE, OLD.fecha_hora_entrada, OLD.fecha_hora_salida), 0)
+WHERE d.fecha = DATE(OLD.fecha_hora_entrada);
+
+CREATE TRIGGER trg_asistencias_diarias_miembro_suma_update AFTER UPDATE ON asistencias
+FOR EACH ROW INSERT INTO asistencias_diarias_miembros (fecha, miembro_id, visitas)
+SELECT DATE(NEW.fecha_hora_entrada), m.id, 1 FROM miembros m WHERE m.id = NEW.miembro_id AND m.rol_id = 3
+ON DUPLICATE KEY UPDATE visitas = visitas + 1;
+
+CREATE TRIGGER trg_asistencias_diarias_suma_update AFTER UPDATE ON asistencias
+FOR EACH ROW INSERT INTO asistencias_diarias (fecha, visitas, clientes_unicos, visitas_cerradas, minutos_totales)
+SELECT dm.fecha, 1, dm.visitas = 1, NEW.fecha_hora_salida IS NOT NULL,
+       COALESCE(TIMESTAMPDIFF(MINUTE, NEW.fecha_hora_entrada, NEW.fecha_hora_salida), 0)
+FROM asistencias_diarias_miembros dm
+WHERE dm.fecha = DATE(NEW.fecha_hora_entrada) AND dm.miembro_id = NEW.miembro_id
+  AND EXISTS (SELECT 1 FROM miembros m WHERE m.id = NEW.miembro_id AND m.rol_id = 3)
+ON DUPLICATE KEY UPDATE
+    visitas = visitas + VALUES(visitas),
+    clientes_unicos = clientes_unicos + VALUES(clientes_unicos),
+    visitas_cerradas = visitas_cerradas + VALUES(visitas_cerradas),
+    minutos_totales = minutos_totales + VALUES(minutos_totales);
+
+CREATE TRIGGER trg_asistencias_diarias_miembro_insert AFTER INSERT ON asistencias
+FOR EACH ROW INSERT INTO asistencias_diarias_miembros (fecha, miembro_id, visitas)
+SELECT DATE(NEW.fecha_hora_entrada), m.id, 1 FROM miembros m WHERE m.id = NEW.miembro_id AND m.rol_id = 3
+ON DUPLICATE KEY UPDATE visitas = visitas + 1;
+
+CREATE TRIGGER trg_asistencias_diarias_insert AFTER INSERT ON asistencias
+FOR EACH ROW INSERT INTO asistencias_diarias (fecha, visitas, clientes_unicos, visitas_cerradas, minutos_totales)
+SELECT dm.fecha, 1, dm.visitas = 1, NEW.fecha_hora_salida IS NOT NULL,
+       COALESCE(TIMESTAMPDIFF(MINUTE, NEW.fecha_hora_entrada, NEW.fecha_hora_salida), 0)
+FROM asistencias_diarias_miembros dm
+WHERE dm.fecha = DATE(NEW.fecha_hora_entrada) AND dm.miembro_id = NEW.miembro_id
+  AND EXISTS (SELECT 1 FROM miembros m WHERE m.id = NEW.miembro_id AND m.rol_id = 3)
+ON DUPLICATE KEY UPDATE
+    visitas = visitas + VALUES(visitas),
+    clientes_unicos = clientes_unicos + VALUES(clientes_unicos),
+    visitas_cerradas = visitas_cerradas + VALUES(visitas_cerradas),
+    minutos_totales = minutos_totales + VALUES(minutos_totales);
+
+CREATE TRIGGER trg_asistencias_diarias_miembro_delete AFTER DELETE ON asistencias
+FOR EACH ROW UPDATE asistencias_diarias_miembros SET visitas = visitas - 1
+WHERE fecha = DATE(OLD.fecha_hora_entrada) AND miembro_id = OLD.miembro_id;
+
+CREATE TRIGGER trg_asistencias_diarias_delete AFTER DELETE ON asistencias
+FOR EACH ROW UPDATE asistencias_diarias d
+JOIN asistencias_diarias_miembros dm ON dm.fecha = d.fecha AND dm.miembro_id = OLD.miembro_id
+SET d.visitas = d.visitas - 1,
+    d.clientes_unicos = d.clientes_unicos - (dm.visitas = 0),
+    d.visitas_cerradas = d.visitas_cerradas - (OLD.fecha_hora_salida IS NOT NULL),
+    d.minutos_totales = d.minutos_totales - COALESCE(TIMESTAMPDIFF(MINUTE, OLD.fecha_hora_entrada, OLD.fecha_hora_salida), 0)
+WHERE d.fecha = DATE(OLD.fecha_hora_entrada);
+
+-- Carga inicial con las asistencias existentes
+INSERT INTO asistencias_diarias_miembros (fecha, miembro_id, visitas)
+SELECT DATE(a.fecha_hora_entrada), a.miembro_id, COUNT(*)
+FROM asistencias a
+JOIN miembros m ON a.miembro_id = m.id
+WHERE m.rol_id = 3
+GROUP BY DATE(a.fecha_hora_entrada), a.miembro_id;
+
+INSERT INTO asistencias_diarias (fecha, visitas, clientes_unicos, visitas_cerradas, minutos_totales)
+SELECT DATE(a.fecha_hora_entrada), COUNT(*), COUNT(DISTINCT a.miembro_id), COUNT(a.fecha_hora_salida),
+       COALESCE(SUM(TIMESTAMPDIFF(MINUTE, a.fecha_hora_entrada, a.fecha_hora_salida)), 0)
+FROM asistencias a
+JOIN miembros m ON a.miembro_id = m.id
+WHERE m.rol_id = 3
+GROUP BY DATE(a.fecha_hora_entrada);
+
+-- Pronóstico de ocupación por día y franja de 15 minutos (forecast.py). Lo
+-- genera el job nocturno para los próximos días; las filas de días pasados
+-- quedan para comparar el pronóstico con la asistencia real
+CREATE TABLE IF NOT EXISTS pronostico_asistencia (
+    fecha DATE NOT NULL,
+    franja SMALLINT NOT NULL, -- 0 = 00:00, 1 = 00:15, ...
+    ocupacion_esperada DECIMAL(8,2) NOT NULL,
+    ocupacion_alta DECIMAL(8,2) NOT NULL, -- percentil 90
+    entradas_esperadas DECIMAL(8,2) NOT NULL,
+    generado DATETIME NOT NULL,
+    PRIMARY KEY (fecha, franja)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_spanish_ci;
+
+-- Permisos para modificar inventario, clases y rutinas (antes bastaba con
+-- cualquier token válido). El administrador los tiene todos; el entrenador
+-- gestiona clases y rutinas
+INSERT IGNORE INTO permisos (nombre, descripcion) VALUES
+('gestionar_inventario', 'Puede crear, editar y eliminar artículos del inventario'),
+('gestionar_clases', 'Puede crear, editar y eliminar clases'),
+('gestionar_rutinas', 'Puede crear, editar y eliminar rutinas');
+
+INSERT IGNORE INTO rol_permisos (rol_id, permiso_id)
+SELECT 1, id FROM permisos
+WHERE nombre IN ('gestionar_inventario', 'gestionar_clases', 'gestionar_rutinas');
+
+INSERT IGNORE INTO rol_permisos (rol_id, permiso_id)
+SELECT 2, id FROM permisos
+WHERE nombre IN ('gestionar_clases', 'gestionar_rutinas');
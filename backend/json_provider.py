@@ -0,0 +1,160 @@
+"""
+Serialización JSON de las respuestas de la API.
+
+Las filas de mysql-connector traen ``Decimal``, ``date``, ``datetime`` y
+``timedelta`` (columnas TIME). Este proveedor los convierte igual que el
+proveedor por defecto de Flask (y agrega ``timedelta``, que Flask no
+admite), pero si orjson está instalado serializa con él: el costo de
+``jsonify`` sobre listados grandes baja varias veces. Además entiende dos
+envoltorios propios:
+
+- ``LazyJSON``: texto JSON guardado en una columna (``condiciones_medicas``)
+  que solo se interpreta al serializar la respuesta.
+- ``ColumnarRows``: filas ya dispuestas por columnas, que se envían como
+  ``{"columns": [...], "rows": [[...], ...]}`` sin armar un diccionario
+  por fila.
+
+``bench_json.py`` compara este proveedor con el de Flask.
+"""
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+
+class LazyJSON:
+    """Texto JSON que se interpreta al serializar; si no es JSON válido se envía como texto"""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def value(self, loads=json.loads):
+        try:
+            return loads(self.text)
+        except ValueError:
+            return self.text
+
+    def __repr__(self):
+        return f'LazyJSON({self.text!r})'
+
+
+class ColumnarRows:
+    """Resultado en formato de columnas: nombres una sola vez y filas como tuplas"""
+
+    __slots__ = ('columns', 'rows')
+
+    def __init__(self, columns, rows):
+        self.columns = list(columns)
+        self.rows = rows
+
+    def as_dict(self):
+        return {'columns': self.columns, 'rows': self.rows}
+
+
+_DIAS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MESES = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def format_http_date(valor):
+    """
+    Fecha en formato HTTP (``'Mon, 01 Jan 2024 00:00:00 GMT'``), igual que
+    ``werkzeug.http.http_date`` pero sin pasar por ``email.utils``.
+    """
+    if isinstance(valor, datetime):
+        if valor.tzinfo is not None:
+            valor = valor.astimezone(timezone.utc)
+        hora = f'{valor.hour:02d}:{valor.minute:02d}:{valor.second:02d}'
+    else:
+        hora = '00:00:00'
+    return (f'{_DIAS[valor.weekday()]}, {valor.day:02d} {_MESES[valor.month - 1]} '
+            f'{valor.year:04d} {hora} GMT')
+
+
+def format_timedelta(valor):
+    """Columna TIME como ``'HH:MM:SS'`` (con signo y más de 24 h si hace falta)"""
+    segundos = int(valor.total_seconds())
+    signo = '-' if segundos < 0 else ''
+    horas, resto = divmod(abs(segundos), 3600)
+    minutos, segundos = divmod(resto, 60)
+    return f'{signo}{horas:02d}:{minutos:02d}:{segundos:02d}'
+
+
+def _default(o):
+    # Mismas conversiones que Flask para no cambiar las respuestas existentes
+    if isinstance(o, date):
+        return format_http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if isinstance(o, timedelta):
+        return format_timedelta(o)
+    if isinstance(o, LazyJSON):
+        return o.value()
+    if isinstance(o, ColumnarRows):
+        return o.as_dict()
+    if dataclasses.is_dataclass(o):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+def _default_orjson(o):
+    if isinstance(o, LazyJSON):
+        return o.value(orjson.loads)
+    return _default(o)
+
+
+class GymJSONProvider(DefaultJSONProvider):
+    """
+    Proveedor JSON de la aplicación.
+
+    Con ``use_orjson`` (activo si orjson está instalado) las respuestas se
+    generan con orjson; ``dumps`` con argumentos propios de la librería
+    estándar (``ensure_ascii``, ``default``...) sigue usando ``json``.
+    """
+
+    default = staticmethod(_default)
+    use_orjson = orjson is not None
+
+    def _opciones(self, indent=False):
+        opciones = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            opciones |= orjson.OPT_SORT_KEYS
+        if indent:
+            opciones |= orjson.OPT_INDENT_2
+        return opciones
+
+    def dumps_bytes(self, obj, indent=False):
+        """Serializa a bytes UTF-8 (con orjson si está disponible)"""
+        if self.use_orjson:
+            return orjson.dumps(obj, default=_default_orjson, option=self._opciones(indent))
+        if indent:
+            return super().dumps(obj, indent=2).encode('utf-8')
+        return super().dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if self.use_orjson and not kwargs:
+            return self.dumps_bytes(obj).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if not self.use_orjson:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
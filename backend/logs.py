@@ -0,0 +1,202 @@
+"""
+Registro estructurado de la API.
+
+Los mensajes se formatean como JSON (una línea por evento) y se escriben
+desde un hilo en segundo plano: los handlers solo encolan el registro, así
+que una solicitud nunca espera a que stdout se vacíe. Cada evento lleva el
+``request_id`` de la solicitud que lo generó. Los loggers muy verbosos
+pueden muestrearse para conservar solo una fracción de sus mensajes de
+nivel inferior a WARNING.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+from flask import g, has_request_context
+
+# Atributos estándar de LogRecord; cualquier otro atributo viene de ``extra``
+_ATRIBUTOS_RECORD = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+
+class RequestIdFilter(logging.Filter):
+    """Agrega el id de la solicitud en curso a cada registro"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Conserva solo una fracción de los mensajes de ciertos loggers.
+
+    ``rates`` asocia nombres de logger con la fracción a conservar (0 a 1);
+    se aplica también a sus loggers hijos. WARNING y superiores nunca se
+    descartan.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self.dropped = 0
+
+    def _rate(self, nombre):
+        while nombre:
+            if nombre in self.rates:
+                return self.rates[nombre]
+            nombre = nombre.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatea cada registro como un objeto JSON en una línea"""
+
+    def format(self, record):
+        evento = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            evento['request_id'] = record.request_id
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_RECORD:
+                evento[clave] = valor
+        if record.exc_info:
+            evento['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            evento['exc'] = record.exc_text
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta el registro si la cola está llena en lugar de bloquear"""
+
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # El mensaje y la excepción se resuelven a texto en el hilo que
+        # registra; el hilo escritor solo formatea el JSON
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_queue_handler = None
+_sampling = None
+_archivos = []
+_lock = threading.Lock()
+
+
+def configure_logging(level='INFO', json_output=True, sample_rates=None, queue_size=10000,
+                      stream=None):
+    """Configura el logger raíz con cola, escritor en segundo plano y muestreo"""
+    global _listener, _queue_handler, _sampling
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+
+        salida = logging.StreamHandler(stream or sys.stdout)
+        if json_output:
+            salida.setFormatter(JsonFormatter())
+        else:
+            salida.setFormatter(logging.Formatter(
+                '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+
+        _sampling = SamplingFilter(sample_rates or {})
+        _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        _queue_handler.addFilter(_sampling)
+        _queue_handler.addFilter(RequestIdFilter())
+
+        raiz = logging.getLogger()
+        for handler in list(raiz.handlers):
+            raiz.removeHandler(handler)
+        raiz.addHandler(_queue_handler)
+        raiz.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, salida)
+        _listener.start()
+    return _listener
+
+
+def add_file_log(nombre, path, max_bytes=5 * 1024 * 1024, backups=5, queue_size=10000):
+    """
+    Envía el logger ``nombre`` a un archivo JSON rotativo en lugar de stdout,
+    también a través de una cola y un hilo escritor propios.
+    """
+    archivo = logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    archivo.setFormatter(JsonFormatter())
+    handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(RequestIdFilter())
+    listener = logging.handlers.QueueListener(handler.queue, archivo)
+    listener.start()
+
+    destino = logging.getLogger(nombre)
+    destino.addHandler(handler)
+    destino.propagate = False
+    with _lock:
+        _archivos.append(listener)
+    return listener
+
+
+def parse_sample_rates(valor):
+    """Convierte ``'gym.auth=0.1,gym.db=0.5'`` en un diccionario de fracciones"""
+    rates = {}
+    for parte in (valor or '').split(','):
+        nombre, _, rate = parte.partition('=')
+        if nombre.strip() and rate.strip():
+            rates[nombre.strip()] = float(rate)
+    return rates
+
+
+def stats():
+    """Mensajes descartados por muestreo o por cola llena"""
+    return {
+        'queued': _queue_handler.queue.qsize() if _queue_handler else 0,
+        'dropped_queue_full': _queue_handler.dropped if _queue_handler else 0,
+        'dropped_sampling': _sampling.dropped if _sampling else 0,
+    }
+
+
+@atexit.register
+def _detener():
+    # Vacía la cola antes de salir para no perder los últimos mensajes
+    global _listener
+    with _lock:
+        listeners = [l for l in [_listener] + _archivos if l is not None]
+        _listener = None
+        _archivos.clear()
+    for listener in listeners:
+        listener.stop()
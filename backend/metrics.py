@@ -0,0 +1,202 @@
+"""
+Métricas de la API en formato de texto de Prometheus.
+
+Cada hilo acumula sus contadores e histogramas en su propio diccionario,
+así que registrar una solicitud o una consulta no toma ningún lock. Solo al
+exportar (``render``) se suman los datos de todos los hilos. Los datos de
+hilos que ya terminaron se consolidan en un acumulado común para que la
+lista de hilos no crezca sin límite.
+"""
+import threading
+import weakref
+
+# Límites superiores (segundos) de los histogramas de latencia
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Hilos registrados antes de consolidar los que ya terminaron
+_MAX_HILOS = 256
+
+
+class _Datos:
+    """Contadores e histogramas de un hilo"""
+
+    __slots__ = ('solicitudes', 'latencias', 'consultas', 'errores_consulta')
+
+    def __init__(self):
+        self.solicitudes = {}       # (method, route, status) -> total
+        self.latencias = {}         # (method, route) -> histograma
+        self.consultas = {}         # query -> histograma
+        self.errores_consulta = {}  # query -> total
+
+    def sumar(self, otro):
+        for clave, valor in list(otro.solicitudes.items()):
+            self.solicitudes[clave] = self.solicitudes.get(clave, 0) + valor
+        for clave, valor in list(otro.errores_consulta.items()):
+            self.errores_consulta[clave] = self.errores_consulta.get(clave, 0) + valor
+        for destino, origen in ((self.latencias, otro.latencias), (self.consultas, otro.consultas)):
+            for clave, hist in list(origen.items()):
+                acumulado = destino.get(clave)
+                if acumulado is None:
+                    destino[clave] = list(hist)
+                else:
+                    for i, valor in enumerate(hist):
+                        acumulado[i] += valor
+
+
+def _nuevo_histograma():
+    # Un contador por bucket, el bucket +Inf, la suma y el total
+    return [0] * (len(BUCKETS) + 1) + [0.0, 0]
+
+
+def _observar(histogramas, clave, valor):
+    hist = histogramas.get(clave)
+    if hist is None:
+        hist = histogramas[clave] = _nuevo_histograma()
+    for i, limite in enumerate(BUCKETS):
+        if valor <= limite:
+            hist[i] += 1
+            break
+    else:
+        hist[len(BUCKETS)] += 1
+    hist[-2] += valor
+    hist[-1] += 1
+
+
+_local = threading.local()
+_lock = threading.Lock()
+_hilos = []  # (weakref al hilo, datos)
+_retirados = _Datos()
+
+
+def _datos_del_hilo():
+    datos = getattr(_local, 'datos', None)
+    if datos is None:
+        datos = _local.datos = _Datos()
+        with _lock:
+            if len(_hilos) >= _MAX_HILOS:
+                _consolidar()
+            _hilos.append((weakref.ref(threading.current_thread()), datos))
+    return datos
+
+
+def _consolidar():
+    """Mueve al acumulado común los datos de hilos terminados (con _lock tomado)"""
+    vivos = []
+    for ref, datos in _hilos:
+        hilo = ref()
+        if hilo is not None and hilo.is_alive():
+            vivos.append((ref, datos))
+        else:
+            _retirados.sumar(datos)
+    _hilos[:] = vivos
+
+
+def observe_request(method, route, status, duration):
+    """Registra una solicitud HTTP atendida"""
+    datos = _datos_del_hilo()
+    clave = (method, route, status)
+    datos.solicitudes[clave] = datos.solicitudes.get(clave, 0) + 1
+    _observar(datos.latencias, (method, route), duration)
+
+
+def observe_query(name, duration, failed=False):
+    """Registra la ejecución de una consulta del registro"""
+    datos = _datos_del_hilo()
+    _observar(datos.consultas, name, duration)
+    if failed:
+        datos.errores_consulta[name] = datos.errores_consulta.get(name, 0) + 1
+
+
+def snapshot():
+    """Suma de los datos de todos los hilos"""
+    total = _Datos()
+    with _lock:
+        _consolidar()
+        total.sumar(_retirados)
+        for _, datos in _hilos:
+            total.sumar(datos)
+    return total
+
+
+def query_summary():
+    """Totales por consulta: ejecuciones, errores y tiempos"""
+    datos = snapshot()
+    resumen = {}
+    for nombre, hist in datos.consultas.items():
+        total, cuenta = hist[-2], hist[-1]
+        resumen[nombre] = {
+            'count': cuenta,
+            'errors': datos.errores_consulta.get(nombre, 0),
+            'total_time': round(total, 6),
+            'avg_time': round(total / cuenta, 6) if cuenta else 0.0,
+        }
+    return resumen
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(**etiquetas):
+    return ','.join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in etiquetas.items())
+
+
+def _histograma(lineas, metrica, etiquetas, hist):
+    acumulado = 0
+    for limite, valor in zip(BUCKETS, hist):
+        acumulado += valor
+        lineas.append(f'{metrica}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+    acumulado += hist[len(BUCKETS)]
+    lineas.append(f'{metrica}_bucket{{{etiquetas},le="+Inf"}} {acumulado}')
+    lineas.append(f'{metrica}_sum{{{etiquetas}}} {hist[-2]:.6f}')
+    lineas.append(f'{metrica}_count{{{etiquetas}}} {hist[-1]}')
+
+
+def render(extra=()):
+    """
+    Exporta las métricas en formato de texto de Prometheus.
+
+    ``extra`` son tuplas ``(nombre, tipo, ayuda, valores)`` con métricas de
+    otros componentes; ``valores`` es un número o un diccionario
+    ``{etiquetas: valor}`` donde etiquetas es una tupla de pares.
+    """
+    datos = snapshot()
+    lineas = [
+        '# HELP gym_http_requests_total Solicitudes HTTP atendidas',
+        '# TYPE gym_http_requests_total counter',
+    ]
+    for (method, route, status), valor in sorted(datos.solicitudes.items()):
+        lineas.append(f'gym_http_requests_total{{{_etiquetas(method=method, route=route, status=status)}}} {valor}')
+
+    lineas += [
+        '# HELP gym_http_request_duration_seconds Latencia de las solicitudes HTTP',
+        '# TYPE gym_http_request_duration_seconds histogram',
+    ]
+    for (method, route), hist in sorted(datos.latencias.items()):
+        _histograma(lineas, 'gym_http_request_duration_seconds',
+                    _etiquetas(method=method, route=route), hist)
+
+    lineas += [
+        '# HELP gym_db_query_duration_seconds Duración de las consultas a la base de datos',
+        '# TYPE gym_db_query_duration_seconds histogram',
+    ]
+    for nombre, hist in sorted(datos.consultas.items()):
+        _histograma(lineas, 'gym_db_query_duration_seconds', _etiquetas(query=nombre), hist)
+
+    lineas += [
+        '# HELP gym_db_query_errors_total Consultas a la base de datos que fallaron',
+        '# TYPE gym_db_query_errors_total counter',
+    ]
+    for nombre, valor in sorted(datos.errores_consulta.items()):
+        lineas.append(f'gym_db_query_errors_total{{{_etiquetas(query=nombre)}}} {valor}')
+
+    for nombre, tipo, ayuda, valores in extra:
+        lineas.append(f'# HELP {nombre} {ayuda}')
+        lineas.append(f'# TYPE {nombre} {tipo}')
+        if isinstance(valores, dict):
+            for etiquetas, valor in valores.items():
+                lineas.append(f'{nombre}{{{_etiquetas(**dict(etiquetas))}}} {valor}')
+        else:
+            lineas.append(f'{nombre} {valores}')
+
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,129 @@
+"""
+Hash y verificación de contraseñas con bcrypt fuera de los hilos de la API.
+
+bcrypt consume CPU a propósito; calcularlo en el hilo de la solicitud hace
+que una ráfaga de inicios de sesión deje sin CPU al resto de rutas. Aquí se
+ejecuta en un pool de procesos de tamaño fijo con un límite de operaciones
+pendientes: cuando el pool está saturado se rechaza de inmediato con
+``HasherBusyError`` en lugar de encolar sin límite.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt
+
+
+class HasherBusyError(Exception):
+    """El pool de bcrypt tiene la cola llena o no respondió a tiempo"""
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+def hash_rounds(hashed):
+    """Factor de costo de un hash bcrypt (``$2b$12$...`` -> 12) o None"""
+    partes = hashed.split('$')
+    if len(partes) < 4 or not partes[2].isdigit():
+        return None
+    return int(partes[2])
+
+
+class PasswordHasher:
+    """
+    Pool de procesos para bcrypt.
+
+    - ``workers``: procesos dedicados a bcrypt.
+    - ``max_pending``: operaciones en curso o en cola antes de rechazar.
+    - ``rounds``: factor de costo para los hashes nuevos.
+    - ``timeout``: segundos máximos de espera por una operación.
+    """
+
+    def __init__(self, workers=2, max_pending=16, rounds=12, timeout=10):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._stats = {
+            'hashes': 0,
+            'verifies': 0,
+            'rejected': 0,
+            'timeouts': 0,
+            'total_time': 0.0,
+            'max_time': 0.0,
+        }
+
+    def _get_executor(self):
+        # Un pool heredado de otro proceso no sirve tras un fork
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, operacion, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats['rejected'] += 1
+                raise HasherBusyError('El servicio de contraseñas está saturado')
+            self._pending += 1
+            executor = self._get_executor()
+        inicio = time.perf_counter()
+        try:
+            future = executor.submit(fn, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise HasherBusyError('El servicio de contraseñas no respondió a tiempo')
+        finally:
+            duracion = time.perf_counter() - inicio
+            with self._lock:
+                self._pending -= 1
+                self._stats[operacion] += 1
+                self._stats['total_time'] += duracion
+                if duracion > self._stats['max_time']:
+                    self._stats['max_time'] = duracion
+
+    def hash(self, password):
+        """Calcula el hash bcrypt de una contraseña con el costo configurado"""
+        return self._run('hashes', _hashpw, password.encode('utf-8'), self.rounds)
+
+    def verify(self, password, hashed):
+        """Comprueba una contraseña contra su hash bcrypt"""
+        return self._run('verifies', _checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        """Indica si el hash se generó con un costo distinto al configurado"""
+        return hash_rounds(hashed) != self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        """Métricas del pool para monitoreo"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = self._pending
+            stats['max_pending'] = self.max_pending
+            stats['workers'] = self.workers
+            stats['rounds'] = self.rounds
+        operaciones = stats['hashes'] + stats['verifies']
+        stats['avg_time'] = round(stats['total_time'] / operaciones, 6) if operaciones else 0.0
+        stats['total_time'] = round(stats['total_time'], 6)
+        stats['max_time'] = round(stats['max_time'], 6)
+        return stats
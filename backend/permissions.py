@@ -0,0 +1,101 @@
+"""
+Motor de permisos basado en roles (tablas permisos y rol_permisos).
+
+Los permisos se cargan una sola vez en memoria: cada permiso recibe un bit
+y cada rol una máscara con los bits de sus permisos, así que comprobar un
+permiso es una operación de bits sin consultar la base de datos. Los
+triggers de init_db.sql incrementan ``permisos_version`` al modificar roles
+o permisos; el motor consulta ese contador cada ``refresh_interval``
+segundos y recarga las máscaras solo si cambió.
+"""
+import threading
+import time
+
+
+class PermissionEngine:
+    """
+    Máscaras de permisos por rol.
+
+    ``loader(version_actual)`` abre la base de datos y devuelve ``None`` si
+    la versión no cambió, o una tupla ``(version, permisos, asignaciones)``
+    donde ``permisos`` son pares ``(id, nombre)`` y ``asignaciones`` pares
+    ``(rol_nombre, permiso_id)``.
+    """
+
+    def __init__(self, loader, refresh_interval=30):
+        self._loader = loader
+        self.refresh_interval = refresh_interval
+        self._refrescando = threading.Lock()
+        self._bits = {}
+        self._mascaras = {}
+        self._version = None
+        self._ultima_revision = None
+        self._stats = {'checks': 0, 'denied': 0, 'reloads': 0}
+
+    @property
+    def loaded(self):
+        return self._version is not None
+
+    def _necesita_revision(self):
+        return (self._ultima_revision is None or
+                time.monotonic() - self._ultima_revision >= self.refresh_interval)
+
+    def refresh(self, force=False):
+        """Recarga las máscaras si el contador de versión cambió"""
+        if not force and not self._necesita_revision():
+            return
+        # Sin datos cargados se espera a la primera carga; después, un solo
+        # hilo revisa la versión y los demás usan las máscaras actuales
+        if not self._refrescando.acquire(blocking=not self.loaded):
+            return
+        try:
+            if not force and not self._necesita_revision():
+                return
+            resultado = self._loader(self._version)
+            if resultado is not None:
+                version, permisos, asignaciones = resultado
+                bits = {nombre: 1 << i for i, (_, nombre) in enumerate(sorted(permisos))}
+                bit_por_id = {pid: bits[nombre] for pid, nombre in permisos}
+                mascaras = {}
+                for rol, permiso_id in asignaciones:
+                    mascaras[rol] = mascaras.get(rol, 0) | bit_por_id.get(permiso_id, 0)
+                # Se reemplazan de una vez para que las lecturas sin lock
+                # vean siempre un estado consistente
+                self._bits, self._mascaras = bits, mascaras
+                self._version = version
+                self._stats['reloads'] += 1
+            self._ultima_revision = time.monotonic()
+        finally:
+            self._refrescando.release()
+
+    def mask(self, *permisos):
+        """Máscara de un conjunto de permisos; None si alguno no existe"""
+        bits = self._bits
+        mascara = 0
+        for permiso in permisos:
+            bit = bits.get(permiso)
+            if bit is None:
+                return None
+            mascara |= bit
+        return mascara
+
+    def allows(self, rol, *permisos):
+        """Indica si el rol tiene todos los permisos indicados"""
+        requerida = self.mask(*permisos)
+        permitido = requerida is not None and self._mascaras.get(rol, 0) & requerida == requerida
+        self._stats['checks'] += 1
+        if not permitido:
+            self._stats['denied'] += 1
+        return permitido
+
+    def permissions_of(self, rol):
+        mascara = self._mascaras.get(rol, 0)
+        return sorted(nombre for nombre, bit in self._bits.items() if mascara & bit)
+
+    def stats(self):
+        """Métricas del motor para monitoreo (contadores aproximados, sin lock)"""
+        stats = dict(self._stats)
+        stats['version'] = self._version
+        stats['permissions'] = len(self._bits)
+        stats['roles'] = len(self._mascaras)
+        return stats
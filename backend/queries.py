@@ -0,0 +1,1049 @@
+"""
+Registro central de consultas SQL de la API.
+
+Todas las consultas que ejecutan los handlers de app.py están declaradas
+aquí con un nombre. Se ejecutan como sentencias preparadas del servidor y
+cada conexión física del pool guarda sus sentencias ya preparadas (las
+``max_statements`` usadas más recientemente), de modo que MySQL analiza
+cada consulta una sola vez por conexión. La duración y los errores de cada
+consulta se registran en el módulo metrics, y las que superan el umbral de
+slowlog quedan en el registro de consultas lentas.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from mysql.connector import Error
+
+import metrics
+import slowlog
+
+
+class Query:
+    """Consulta registrada"""
+
+    __slots__ = ('name', 'sql')
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+
+
+REGISTRY = {}
+# (nombre, columnas) -> Query con la lista de columnas ya resuelta, las
+# usadas más recientemente al final
+_PROJECTIONS = OrderedDict()
+_projections_lock = threading.Lock()
+
+# Proyecciones que se conservan; cada una es una sentencia preparada más
+# en cada conexión que la usa
+MAX_PROJECTIONS = 64
+
+
+def register(name, sql):
+    if name in REGISTRY:
+        raise ValueError(f'Consulta duplicada en el registro: {name}')
+    REGISTRY[name] = Query(name, sql)
+    return REGISTRY[name]
+
+
+def projected(name, columns):
+    """
+    Variante de una consulta registrada cuyo SQL tiene el marcador
+    ``{columns}``. Cada proyección se construye una sola vez, así que se
+    prepara una vez por conexión como cualquier otra consulta. ``columns``
+    debe venir de una lista blanca, nunca directamente del cliente.
+    """
+    key = (name, columns)
+    with _projections_lock:
+        query = _PROJECTIONS.get(key)
+        if query is not None:
+            _PROJECTIONS.move_to_end(key)
+            return query
+    nueva = Query(name, REGISTRY[name].sql.format(columns=', '.join(columns)))
+    with _projections_lock:
+        query = _PROJECTIONS.setdefault(key, nueva)
+        _PROJECTIONS.move_to_end(key)
+        while len(_PROJECTIONS) > MAX_PROJECTIONS:
+            _PROJECTIONS.popitem(last=False)
+    return query
+
+
+def _prepared_cursor(connection, query, dictionary):
+    """Devuelve el cursor preparado de la consulta para esta conexión física"""
+    cache = connection.statement_cache
+    key = (query, dictionary)
+    cursor = cache.get(key)
+    if cursor is None:
+        cursor = connection.raw_cursor(prepared=True, dictionary=dictionary)
+        cache.put(key, cursor)
+    return cursor
+
+
+def _discard(connection, query, dictionary):
+    cursor = connection.statement_cache.pop((query, dictionary), None)
+    if cursor is not None:
+        try:
+            cursor.close()
+        except Error:
+            pass
+
+
+def _run(connection, query, params, dictionary, fetch):
+    name = query.name
+    start = time.perf_counter()
+    try:
+        cursor = _prepared_cursor(connection, query, dictionary)
+        # Se pasa siempre el mismo objeto str para que el cursor reutilice
+        # la sentencia ya preparada en lugar de prepararla otra vez
+        cursor.execute(query.sql, tuple(params))
+        rows = cursor.fetchall() if fetch else None
+    except Error:
+        metrics.observe_query(name, time.perf_counter() - start, failed=True)
+        _discard(connection, query, dictionary)
+        raise
+    elapsed = time.perf_counter() - start
+    metrics.observe_query(name, elapsed)
+    if slowlog.threshold is not None and elapsed >= slowlog.threshold:
+        slowlog.record(connection, name, query.sql, tuple(params), elapsed)
+    return cursor, rows
+
+
+def fetch_all(connection, name, params=(), dictionary=True):
+    """Ejecuta una consulta registrada y devuelve todas sus filas"""
+    return _run(connection, REGISTRY[name], params, dictionary, fetch=True)[1]
+
+
+def fetch_all_projected(connection, name, columns, params=(), dictionary=True):
+    """Como fetch_all, pero devolviendo solo las columnas indicadas (ver ``projected``)"""
+    return _run(connection, projected(name, tuple(columns)), params, dictionary, fetch=True)[1]
+
+
+def fetch_columns(connection, name, params=(), columns=None):
+    """
+    Ejecuta una consulta registrada con un cursor de tuplas.
+
+    Devuelve ``(columnas, filas)``: los nombres salen de la descripción del
+    cursor y las filas quedan como las entrega el conector, sin armar un
+    diccionario por fila. Con ``columns`` se usa la proyección indicada.
+    """
+    query = REGISTRY[name] if columns is None else projected(name, tuple(columns))
+    cursor, rows = _run(connection, query, params, False, fetch=True)
+    return list(cursor.column_names), rows
+
+
+def fetch_one(connection, name, params=(), dictionary=True):
+    """Ejecuta una consulta registrada y devuelve la primera fila o None"""
+    rows = _run(connection, REGISTRY[name], params, dictionary, fetch=True)[1]
+    return rows[0] if rows else None
+
+
+def execute(connection, name, params=()):
+    """Ejecuta una sentencia registrada sin resultados (INSERT, UPDATE, DELETE)
+
+    Devuelve el cursor para consultar ``rowcount`` y ``lastrowid``.
+    """
+    return _run(connection, REGISTRY[name], params, dictionary=False, fetch=False)[0]
+
+
+def execute_many(connection, name, seq_params):
+    """
+    Ejecuta una sentencia registrada con varias filas de parámetros.
+
+    Usa un cursor de texto (no preparado): el conector convierte un
+    ``INSERT ... VALUES`` en un único INSERT de varias filas.
+    """
+    query = REGISTRY[name]
+    seq_params = [tuple(params) for params in seq_params]
+    start = time.perf_counter()
+    cursor = connection.raw_cursor()
+    try:
+        cursor.executemany(query.sql, seq_params)
+        filas = cursor.rowcount
+    except Error:
+        metrics.observe_query(name, time.perf_counter() - start, failed=True)
+        raise
+    finally:
+        cursor.close()
+    metrics.observe_query(name, time.perf_counter() - start)
+    return filas
+
+
+def stream(connection, name, params=(), dictionary=True, chunk_size=500, columns=None):
+    """
+    Ejecuta una consulta registrada sin leer su resultado de una vez.
+
+    Devuelve ``(columnas, bloques)``, donde ``bloques`` entrega listas de
+    hasta ``chunk_size`` filas a medida que llegan del servidor, así que la
+    memoria no crece con el tamaño de la tabla. La conexión queda ocupada
+    hasta agotar ``bloques``; si se abandona antes, la conexión debe
+    descartarse con ``discard()`` porque tiene un resultado sin leer.
+    ``columns`` aplica una proyección como en ``fetch_all_projected``.
+    """
+    query = REGISTRY[name] if columns is None else projected(name, tuple(columns))
+    cursor = _run(connection, query, params, dictionary, fetch=False)[0]
+
+    def bloques():
+        try:
+            while True:
+                filas = cursor.fetchmany(chunk_size)
+                if not filas:
+                    return
+                yield filas
+        except Error:
+            _discard(connection, query, dictionary)
+            raise
+
+    return list(cursor.column_names), bloques()
+
+
+def stats():
+    """Estadísticas de ejecución por consulta"""
+    return metrics.query_summary()
+
+
+# ===========================================
+# AUTENTICACIÓN Y MIEMBROS
+# ===========================================
+
+register('usuario_por_email', """
+    SELECT m.*, r.nombre as rol_nombre
+    FROM miembros m
+    JOIN roles r ON m.rol_id = r.id
+    WHERE m.email = %s
+""")
+
+register('miembro_perfil', """
+    SELECT id, nombre, email, condiciones_medicas FROM miembros WHERE id = %s
+""")
+
+register('miembro_token_version', """
+    SELECT token_version FROM miembros WHERE id = %s
+""")
+
+# Invalida todos los tokens del miembro (cambio de contraseña)
+register('miembro_revocar_tokens', """
+    UPDATE miembros SET token_version = token_version + 1 WHERE id = %s
+""")
+
+register('miembros_token_versiones', """
+    SELECT id, token_version FROM miembros WHERE token_version > 0
+""")
+
+# Índice de búsqueda de miembros (search.py)
+register('miembros_indice_busqueda', """
+    SELECT id, nombre, email, telefono, rol_id, activo, fecha_vencimiento_membresia,
+           fecha_actualizacion
+    FROM miembros
+""")
+
+register('miembros_indice_cambios', """
+    SELECT id, nombre, email, telefono, rol_id, activo, fecha_vencimiento_membresia,
+           fecha_actualizacion
+    FROM miembros
+    WHERE fecha_actualizacion >= %s
+""")
+
+register('miembros_indice_eliminados', """
+    SELECT registro_id AS id, fecha_eliminacion AS fecha_actualizacion
+    FROM sync_eliminados
+    WHERE tabla = 'miembros' AND fecha_eliminacion >= %s
+""")
+
+register('miembro_id_por_email', """
+    SELECT id FROM miembros WHERE email = %s
+""")
+
+register('miembro_existe', """
+    SELECT id FROM miembros WHERE id = %s
+""")
+
+register('miembro_resumen', """
+    SELECT id, nombre FROM miembros WHERE id = %s
+""")
+
+register('miembro_por_id', """
+    SELECT id, nombre, email, telefono, fecha_inscripcion,
+           activo, rol_id, fecha_nacimiento, genero,
+           direccion, tipo_membresia, fecha_vencimiento_membresia,
+           especialidad
+    FROM miembros
+    WHERE id = %s
+""")
+
+# Listado paginado por keyset. Los filtros en NULL no se aplican; MySQL
+# descarta esas condiciones al optimizar cada ejecución
+_FILTROS_MIEMBROS = """
+      AND (%s IS NULL OR m.rol_id = %s)
+      AND (%s IS NULL OR r.nombre = %s)
+      AND (%s IS NULL OR m.activo = %s)
+      AND (%s IS NULL OR m.tipo_membresia = %s)
+      AND (%s IS NULL OR m.fecha_vencimiento_membresia >= %s)
+      AND (%s IS NULL OR m.fecha_vencimiento_membresia <= %s)
+"""
+
+register('miembros_pagina_id', """
+    SELECT {columns}
+    FROM miembros m
+    LEFT JOIN roles r ON m.rol_id = r.id
+    WHERE m.id > %s
+""" + _FILTROS_MIEMBROS + """
+    ORDER BY m.id
+    LIMIT %s
+""")
+
+register('miembros_pagina_nombre', """
+    SELECT {columns}
+    FROM miembros m
+    LEFT JOIN roles r ON m.rol_id = r.id
+    WHERE (m.nombre, m.id) > (%s, %s)
+""" + _FILTROS_MIEMBROS + """
+    ORDER BY m.nombre, m.id
+    LIMIT %s
+""")
+
+# Exportación completa (streaming) con los mismos filtros que el listado
+register('miembros_exportar', """
+    SELECT {columns}
+    FROM miembros m
+    LEFT JOIN roles r ON m.rol_id = r.id
+    WHERE 1 = 1
+""" + _FILTROS_MIEMBROS + """
+    ORDER BY m.id
+""")
+
+register('miembros_contar', """
+    SELECT COUNT(*) as total
+    FROM miembros m
+    LEFT JOIN roles r ON m.rol_id = r.id
+    WHERE 1 = 1
+""" + _FILTROS_MIEMBROS)
+
+register('miembros_proximos_a_vencer', """
+    SELECT m.* FROM miembros m
+    WHERE m.fecha_vencimiento_membresia IS NOT NULL
+      AND m.fecha_vencimiento_membresia >= %s
+      AND m.fecha_vencimiento_membresia <= %s
+      AND m.activo = 1
+    ORDER BY m.fecha_vencimiento_membresia ASC
+""")
+
+register('miembros_activos', """
+    SELECT id, nombre, email, telefono, tipo_membresia, fecha_vencimiento_membresia
+    FROM miembros
+    WHERE activo = 1 AND (fecha_vencimiento_membresia IS NOT NULL AND fecha_vencimiento_membresia >= CURDATE())
+""")
+
+register('miembro_insertar', """
+    INSERT INTO miembros (
+        nombre, email, password_hash, telefono,
+        fecha_inscripcion, activo, rol_id, fecha_vencimiento_membresia,
+        especialidad, tipo_membresia
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+""")
+
+# token_version se evalúa antes de asignar los demás campos: sube cuando
+# cambian el rol, el estado o el email, invalidando los tokens emitidos
+register('miembro_actualizar', """
+    UPDATE miembros SET
+        token_version = token_version + NOT (rol_id <=> %s AND activo <=> %s AND email <=> %s),
+        nombre=%s,
+        email=%s,
+        telefono=%s,
+        fecha_inscripcion=%s,
+        activo=%s,
+        rol_id=%s,
+        fecha_nacimiento=%s,
+        genero=%s,
+        direccion=%s,
+        tipo_membresia=%s,
+        fecha_vencimiento_membresia=%s,
+        condiciones_medicas=%s,
+        observaciones=%s
+    WHERE id=%s
+""")
+
+register('miembro_actualizar_password', """
+    UPDATE miembros SET password_hash = %s WHERE id = %s
+""")
+
+# Antes de eliminar el miembro: el ON DELETE CASCADE no dispara los
+# triggers que mantienen asistencias_diarias
+register('asistencias_eliminar_miembro', """
+    DELETE FROM asistencias WHERE miembro_id = %s
+""")
+
+register('miembro_eliminar', """
+    DELETE FROM miembros WHERE id = %s
+""")
+
+register('miembros_desactivar_vencidos', """
+    UPDATE miembros
+    SET activo = 0
+    WHERE activo = 1
+    AND rol_id = 3
+    AND fecha_vencimiento_membresia IS NOT NULL
+    AND fecha_vencimiento_membresia < CURDATE()
+""")
+
+register('miembro_credenciales', """
+    SELECT m.id, m.email, m.password_hash, m.rol_id, m.token_version, r.nombre as rol_nombre
+    FROM miembros m
+    JOIN roles r ON m.rol_id = r.id
+    WHERE m.id = %s
+""")
+
+# ===========================================
+# PERMISOS
+# ===========================================
+
+register('permisos_version', """
+    SELECT version FROM permisos_version WHERE id = 1
+""")
+
+register('permisos_listar', """
+    SELECT id, nombre FROM permisos
+""")
+
+register('rol_permisos_listar', """
+    SELECT r.nombre, rp.permiso_id
+    FROM rol_permisos rp
+    JOIN roles r ON rp.rol_id = r.id
+""")
+
+# ===========================================
+# REFRESH TOKENS
+# ===========================================
+
+register('refresh_token_insertar', """
+    INSERT INTO refresh_tokens (miembro_id, token_hash, familia, expira)
+    VALUES (%s, %s, %s, %s)
+""")
+
+register('refresh_token_por_hash', """
+    SELECT rt.id, rt.miembro_id, rt.familia, rt.expira, rt.revocado,
+           m.email, m.activo, m.rol_id, m.token_version, r.nombre as rol_nombre
+    FROM refresh_tokens rt
+    JOIN miembros m ON rt.miembro_id = m.id
+    JOIN roles r ON m.rol_id = r.id
+    WHERE rt.token_hash = %s
+""")
+
+register('refresh_token_rotar', """
+    UPDATE refresh_tokens SET revocado = 1 WHERE id = %s AND revocado = 0
+""")
+
+register('refresh_tokens_revocar_familia', """
+    UPDATE refresh_tokens SET revocado = 1 WHERE familia = %s AND revocado = 0
+""")
+
+register('refresh_tokens_revocar_miembro', """
+    UPDATE refresh_tokens SET revocado = 1 WHERE miembro_id = %s AND revocado = 0
+""")
+
+register('refresh_tokens_purgar', """
+    DELETE FROM refresh_tokens WHERE expira < %s
+""")
+
+# ===========================================
+# FACTURAS
+# ===========================================
+
+register('facturas_listar', """
+    SELECT f.*, m.nombre as miembro_nombre, m.email as miembro_email
+    FROM facturas f
+    JOIN miembros m ON f.miembro_id = m.id
+    ORDER BY f.fecha DESC, f.id DESC
+""")
+
+register('factura_por_id', """
+    SELECT f.*, m.nombre as miembro_nombre, m.email as miembro_email
+    FROM facturas f
+    JOIN miembros m ON f.miembro_id = m.id
+    WHERE f.id = %s
+""")
+
+register('factura_insertar', """
+    INSERT INTO facturas (miembro_id, fecha, total, concepto, estado, metodo_pago, notas)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+""")
+
+register('factura_actualizar', """
+    UPDATE facturas SET miembro_id=%s, fecha=%s, total=%s, concepto=%s, estado=%s, metodo_pago=%s, notas=%s
+    WHERE id=%s
+""")
+
+register('factura_eliminar', """
+    DELETE FROM facturas WHERE id=%s
+""")
+
+# ===========================================
+# INVENTARIO
+# ===========================================
+
+register('inventario_listar', """
+    SELECT * FROM inventario
+""")
+
+register('inventario_insertar', """
+    INSERT INTO inventario (nombre, tipo, cantidad, descripcion, fecha_registro, estado, proveedor, ubicacion, precio_unitario)
+    VALUES (%s, %s, %s, %s, CURDATE(), %s, %s, %s, %s)
+""")
+
+register('inventario_actualizar', """
+    UPDATE inventario SET nombre=%s, tipo=%s, cantidad=%s, descripcion=%s, fecha_registro=%s, estado=%s, proveedor=%s, ubicacion=%s, precio_unitario=%s
+    WHERE id=%s
+""")
+
+register('inventario_eliminar', """
+    DELETE FROM inventario WHERE id=%s
+""")
+
+# ===========================================
+# CLASES
+# ===========================================
+
+register('clases_listar', """
+    SELECT c.*, m.nombre AS nombre_entrenador
+    FROM clases c
+    LEFT JOIN miembros m ON c.id_entrenador = m.id
+""")
+
+register('clase_insertar', """
+    INSERT INTO clases (nombre, descripcion, horario, cupo_maximo, id_entrenador, fecha_creacion)
+    VALUES (%s, %s, %s, %s, %s, %s)
+""")
+
+register('clase_actualizar', """
+    UPDATE clases SET nombre=%s, descripcion=%s, horario=%s, cupo_maximo=%s, id_entrenador=%s
+    WHERE id=%s
+""")
+
+register('clase_eliminar', """
+    DELETE FROM clases WHERE id=%s
+""")
+
+# ===========================================
+# RUTINAS
+# ===========================================
+
+register('rutinas_listar', """
+    SELECT r.id, r.nombre, r.descripcion, r.duracion_semanas, r.nivel,
+           r.objetivo, r.id_entrenador, r.fecha_creacion,
+           COUNT(DISTINCT er.id) as total_ejercicios,
+           COUNT(DISTINCT rc.cliente_id) as total_clientes
+    FROM rutinas r
+    LEFT JOIN dias_rutina dr ON r.id = dr.rutina_id
+    LEFT JOIN ejercicios_rutina er ON dr.id = er.dia_rutina_id
+    LEFT JOIN rutinas_clientes rc ON r.id = rc.rutina_id AND rc.estado = 'activa'
+    GROUP BY r.id
+    ORDER BY r.fecha_creacion DESC
+""")
+
+register('rutina_por_id', """
+    SELECT r.*, COUNT(er.id) as total_ejercicios
+    FROM rutinas r
+    LEFT JOIN dias_rutina dr ON r.id = dr.rutina_id
+    LEFT JOIN ejercicios_rutina er ON dr.id = er.dia_rutina_id
+    WHERE r.id = %s
+    GROUP BY r.id
+""")
+
+register('rutina_existe', """
+    SELECT id FROM rutinas WHERE id = %s
+""")
+
+register('rutina_resumen', """
+    SELECT id, nombre FROM rutinas WHERE id = %s
+""")
+
+register('rutina_dias', """
+    SELECT dr.*, COUNT(er.id) as ejercicios_por_dia
+    FROM dias_rutina dr
+    LEFT JOIN ejercicios_rutina er ON dr.id = er.dia_rutina_id
+    WHERE dr.rutina_id = %s
+    GROUP BY dr.id
+    ORDER BY dr.orden
+""")
+
+register('dia_rutina_ejercicios', """
+    SELECT er.*, e.nombre as ejercicio_nombre, e.descripcion as ejercicio_descripcion,
+           e.tipo_ejercicio, e.imagen_url,
+           ce.nombre as categoria_nombre
+    FROM ejercicios_rutina er
+    JOIN ejercicios e ON er.ejercicio_id = e.id
+    JOIN categorias_ejercicios ce ON e.categoria_id = ce.id
+    WHERE er.dia_rutina_id = %s
+    ORDER BY er.orden
+""")
+
+register('rutina_clientes_activos', """
+    SELECT c.id, c.nombre, c.email, c.telefono,
+           rc.fecha_inicio, rc.fecha_fin, rc.estado, rc.notas
+    FROM rutinas_clientes rc
+    JOIN miembros c ON rc.cliente_id = c.id
+    WHERE rc.rutina_id = %s AND rc.estado = 'activa'
+    ORDER BY c.nombre
+""")
+
+register('rutina_clientes_asignados', """
+    SELECT m.id, m.nombre, m.email, rc.fecha_inicio, rc.estado
+    FROM rutinas_clientes rc
+    JOIN miembros m ON rc.cliente_id = m.id
+    WHERE rc.rutina_id = %s AND rc.estado = 'activa'
+    ORDER BY m.nombre
+""")
+
+register('rutina_insertar', """
+    INSERT INTO rutinas (nombre, descripcion, duracion_semanas, nivel_dificultad,
+                         objetivo, creado_por, fecha_creacion, activo)
+    VALUES (%s, %s, %s, %s, %s, %s, NOW(), 1)
+""")
+
+register('dia_rutina_insertar', """
+    INSERT INTO dias_rutina (rutina_id, nombre_dia, descripcion, orden)
+    VALUES (%s, %s, %s, %s)
+""")
+
+register('ejercicio_rutina_insertar', """
+    INSERT INTO ejercicios_rutina (rutina_id, dia_rutina_id, ejercicio_id,
+                                   series, repeticiones, peso, tiempo_descanso, orden)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+""")
+
+register('rutina_actualizar', """
+    UPDATE rutinas
+    SET nombre = %s, descripcion = %s, duracion_semanas = %s,
+        nivel_dificultad = %s, objetivo = %s
+    WHERE id = %s
+""")
+
+register('rutina_desactivar', """
+    UPDATE rutinas SET activo = 0 WHERE id = %s
+""")
+
+register('asignacion_activa', """
+    SELECT rc.id, m.nombre as cliente_nombre
+    FROM rutinas_clientes rc
+    JOIN miembros m ON rc.cliente_id = m.id
+    WHERE rc.rutina_id = %s AND rc.cliente_id = %s AND rc.estado = 'activa'
+""")
+
+register('asignacion_insertar', """
+    INSERT INTO rutinas_clientes (rutina_id, cliente_id, entrenador_id, fecha_inicio, notas, estado)
+    VALUES (%s, %s, %s, %s, %s, 'activa')
+""")
+
+# ===========================================
+# CATEGORÍAS Y EJERCICIOS
+# ===========================================
+
+register('categorias_ejercicios_listar', """
+    SELECT * FROM categorias_ejercicios ORDER BY nombre
+""")
+
+register('ejercicios_listar', """
+    SELECT e.*, ce.nombre as categoria_nombre
+    FROM ejercicios e
+    JOIN categorias_ejercicios ce ON e.categoria_id = ce.id
+    ORDER BY e.nombre
+""")
+
+register('ejercicios_por_categoria', """
+    SELECT e.*, ce.nombre as categoria_nombre
+    FROM ejercicios e
+    JOIN categorias_ejercicios ce ON e.categoria_id = ce.id
+    WHERE e.categoria_id = %s
+    ORDER BY e.nombre
+""")
+
+# ===========================================
+# REPORTES
+# ===========================================
+
+# Los días cerrados se leen del resumen asistencias_diarias (init_db.sql);
+# solo el día en curso se calcula sobre asistencias. Todos los filtros son
+# rangos sobre columnas indexadas
+register('reporte_asistencia_por_dia', """
+    SELECT fecha, visitas as total_asistencias, clientes_unicos
+    FROM asistencias_diarias
+    WHERE fecha BETWEEN %s AND %s AND visitas > 0
+    ORDER BY fecha
+""")
+
+register('reporte_asistencia_totales', """
+    SELECT
+        COALESCE(SUM(visitas), 0) as total_asistencias,
+        COALESCE(SUM(visitas_cerradas), 0) as visitas_cerradas,
+        COALESCE(SUM(minutos_totales), 0) as minutos_totales
+    FROM asistencias_diarias
+    WHERE fecha BETWEEN %s AND %s
+""")
+
+register('reporte_asistencia_en_curso', """
+    SELECT
+        COUNT(*) as total_asistencias,
+        COUNT(DISTINCT a.miembro_id) as clientes_unicos,
+        COUNT(a.fecha_hora_salida) as visitas_cerradas,
+        COALESCE(SUM(TIMESTAMPDIFF(MINUTE, a.fecha_hora_entrada, a.fecha_hora_salida)), 0) as minutos_totales
+    FROM asistencias a
+    JOIN miembros m ON a.miembro_id = m.id
+    WHERE a.fecha_hora_entrada >= %s AND a.fecha_hora_entrada < %s
+    AND m.rol_id = 3  -- Solo clientes
+""")
+
+# Estancias para el mapa de calor, en segundos desde el inicio del rango
+# (cubierta por idx_asistencias_entrada_salida)
+register('asistencias_estancias', """
+    SELECT TIMESTAMPDIFF(SECOND, %s, fecha_hora_entrada) AS entrada,
+           TIMESTAMPDIFF(SECOND, %s, fecha_hora_salida) AS salida
+    FROM asistencias
+    WHERE fecha_hora_entrada >= %s AND fecha_hora_entrada < %s
+""")
+
+register('pronostico_borrar_desde', """
+    DELETE FROM pronostico_asistencia WHERE fecha >= %s
+""")
+
+register('pronostico_insertar_lote', """
+    INSERT INTO pronostico_asistencia
+        (fecha, franja, ocupacion_esperada, ocupacion_alta, entradas_esperadas, generado)
+    VALUES (%s, %s, %s, %s, %s, %s)
+""")
+
+register('pronostico_rango', """
+    SELECT fecha, franja, ocupacion_esperada, ocupacion_alta, entradas_esperadas, generado
+    FROM pronostico_asistencia
+    WHERE fecha >= %s AND fecha < %s
+    ORDER BY fecha, franja
+""")
+
+# Clientes distintos en todo el rango: los de los días cerrados más los de hoy
+register('reporte_asistencia_clientes_unicos', """
+    SELECT COUNT(*) as clientes_unicos FROM (
+        SELECT miembro_id
+        FROM asistencias_diarias_miembros
+        WHERE fecha BETWEEN %s AND %s AND visitas > 0
+        UNION
+        SELECT a.miembro_id
+        FROM asistencias a
+        JOIN miembros m ON a.miembro_id = m.id
+        WHERE a.fecha_hora_entrada >= %s AND a.fecha_hora_entrada < %s
+        AND m.rol_id = 3
+    ) clientes
+""")
+
+register('reporte_rutinas_por_nivel', """
+    SELECT
+        r.nivel,
+        COUNT(*) as total_rutinas,
+        COUNT(rc.id) as rutinas_asignadas
+    FROM rutinas r
+    LEFT JOIN rutinas_clientes rc ON r.id = rc.rutina_id AND rc.estado = 'activa'
+    WHERE r.id_entrenador = %s
+    GROUP BY r.nivel
+""")
+
+register('reporte_rutinas_por_objetivo', """
+    SELECT
+        r.objetivo,
+        COUNT(*) as total_rutinas,
+        COUNT(rc.id) as rutinas_asignadas
+    FROM rutinas r
+    LEFT JOIN rutinas_clientes rc ON r.id = rc.rutina_id AND rc.estado = 'activa'
+    WHERE r.id_entrenador = %s
+    GROUP BY r.objetivo
+""")
+
+register('reporte_rutinas_top', """
+    SELECT
+        r.nombre,
+        r.nivel,
+        r.objetivo,
+        COUNT(rc.id) as total_asignaciones
+    FROM rutinas r
+    LEFT JOIN rutinas_clientes rc ON r.id = rc.rutina_id AND rc.estado = 'activa'
+    WHERE r.id_entrenador = %s
+    GROUP BY r.id, r.nombre, r.nivel, r.objetivo
+    ORDER BY total_asignaciones DESC
+    LIMIT 5
+""")
+
+register('reporte_rutinas_estadisticas', """
+    SELECT
+        COUNT(*) as total_rutinas,
+        COUNT(rc.id) as total_asignaciones,
+        COUNT(DISTINCT rc.cliente_id) as clientes_activos
+    FROM rutinas r
+    LEFT JOIN rutinas_clientes rc ON r.id = rc.rutina_id AND rc.estado = 'activa'
+    WHERE r.id_entrenador = %s
+""")
+
+register('reporte_clientes_por_estado', """
+    SELECT
+        CASE
+            WHEN m.activo = 1 THEN 'Activos'
+            ELSE 'Inactivos'
+        END as estado,
+        COUNT(*) as total
+    FROM miembros m
+    WHERE m.rol_id = 3  -- Solo clientes
+    GROUP BY m.activo
+""")
+
+register('reporte_clientes_con_rutinas', """
+    SELECT
+        m.nombre,
+        m.email,
+        COUNT(rc.id) as rutinas_asignadas,
+        MAX(rc.fecha_inicio) as ultima_asignacion
+    FROM miembros m
+    LEFT JOIN rutinas_clientes rc ON m.id = rc.cliente_id AND rc.estado = 'activa'
+    WHERE m.rol_id = 3
+    GROUP BY m.id, m.nombre, m.email
+    HAVING rutinas_asignadas > 0
+    ORDER BY rutinas_asignadas DESC
+""")
+
+register('reporte_clientes_nuevos', """
+    SELECT COUNT(*) as nuevos_clientes
+    FROM miembros m
+    WHERE m.rol_id = 3
+    AND MONTH(m.fecha_inscripcion) = MONTH(CURDATE())
+    AND YEAR(m.fecha_inscripcion) = YEAR(CURDATE())
+""")
+
+register('reporte_clientes_estadisticas', """
+    SELECT
+        COUNT(*) as total_clientes,
+        COUNT(CASE
+            WHEN m.activo = 1 AND
+                 (m.fecha_vencimiento_membresia IS NULL OR
+                  m.fecha_vencimiento_membresia >= CURDATE())
+            THEN 1
+        END) as clientes_activos,
+        COUNT(CASE
+            WHEN m.activo = 0 OR
+                 (m.fecha_vencimiento_membresia IS NOT NULL AND
+                  m.fecha_vencimiento_membresia < CURDATE())
+            THEN 1
+        END) as clientes_inactivos
+    FROM miembros m
+    WHERE m.rol_id = 3  -- Solo clientes
+""")
+
+register('reporte_progreso_clientes', """
+    SELECT
+        m.nombre as cliente,
+        COUNT(pe.id) as sesiones_completadas,
+        AVG(pe.dificultad_percibida) as dificultad_promedio,
+        MAX(pe.fecha_ejecucion) as ultima_sesion
+    FROM miembros m
+    JOIN rutinas_clientes rc ON m.id = rc.cliente_id
+    LEFT JOIN progreso_ejercicios pe ON rc.id = pe.rutina_cliente_id
+    WHERE rc.entrenador_id = %s
+    AND rc.estado = 'activa'
+    AND pe.fecha_ejecucion >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+    GROUP BY m.id, m.nombre
+    ORDER BY sesiones_completadas DESC
+""")
+
+register('reporte_progreso_marcas', """
+    SELECT
+        m.nombre as cliente,
+        e.nombre as ejercicio,
+        mp.peso_maximo,
+        mp.repeticiones_maximas,
+        mp.fecha_establecida
+    FROM marcas_personales mp
+    JOIN miembros m ON mp.cliente_id = m.id
+    JOIN ejercicios e ON mp.ejercicio_id = e.id
+    WHERE mp.fecha_establecida >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+    ORDER BY mp.fecha_establecida DESC
+    LIMIT 10
+""")
+
+register('reporte_progreso_estadisticas', """
+    SELECT
+        COUNT(DISTINCT pe.rutina_cliente_id) as clientes_con_progreso,
+        AVG(pe.dificultad_percibida) as dificultad_promedio,
+        COUNT(pe.id) as total_sesiones
+    FROM progreso_ejercicios pe
+    JOIN rutinas_clientes rc ON pe.rutina_cliente_id = rc.id
+    WHERE rc.entrenador_id = %s
+    AND pe.fecha_ejecucion >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+""")
+
+# ===========================================
+# CONTEOS PARA LOS PANELES
+# ===========================================
+
+# Se resuelven con índices que cubren las columnas usadas, sin leer filas
+register('miembros_conteo_por_rol', """
+    SELECT c.rol_id, r.nombre as rol_nombre, c.activo, c.total
+    FROM (
+        SELECT rol_id, activo, COUNT(*) as total
+        FROM miembros
+        GROUP BY rol_id, activo
+    ) c
+    LEFT JOIN roles r ON c.rol_id = r.id
+""")
+
+register('clases_contar', """
+    SELECT COUNT(*) as total FROM clases
+""")
+
+# Una clase está activa si tiene horario asignado
+register('clases_contar_activas', """
+    SELECT COUNT(*) as total FROM clases
+    WHERE horario IS NOT NULL AND horario <> ''
+""")
+
+register('facturas_conteo_por_estado', """
+    SELECT estado, COUNT(*) as total, COALESCE(SUM(total), 0) as monto
+    FROM facturas
+    GROUP BY estado
+""")
+
+register('asistencias_conteo_rango', """
+    SELECT COUNT(*) as total,
+           COALESCE(SUM(fecha_hora_salida IS NULL), 0) as en_curso
+    FROM asistencias
+    WHERE fecha_hora_entrada >= %s AND fecha_hora_entrada < %s
+""")
+
+register('miembros_por_vencer_contar', """
+    SELECT COUNT(*) as total
+    FROM miembros
+    WHERE fecha_vencimiento_membresia >= %s
+      AND fecha_vencimiento_membresia <= %s
+      AND activo = 1
+""")
+
+register('facturas_ingresos_rango', """
+    SELECT COALESCE(SUM(total), 0) as total, COUNT(*) as facturas
+    FROM facturas
+    WHERE estado = 'pagada' AND fecha >= %s AND fecha < %s
+""")
+
+register('inventario_alertas', """
+    SELECT
+        COALESCE(SUM(estado = 'agotado' OR (estado = 'activo' AND cantidad <= 0)), 0) as agotados,
+        COALESCE(SUM(estado = 'activo' AND cantidad > 0 AND cantidad <= %s), 0) as stock_bajo,
+        COALESCE(SUM(estado = 'en reparacion'), 0) as en_reparacion
+    FROM inventario
+""")
+
+# ===========================================
+# VERSIONES DE TABLAS (GET CONDICIONAL)
+# ===========================================
+
+register('tablas_version_listar', """
+    SELECT tabla, version, actualizado FROM tablas_version
+""")
+
+# ===========================================
+# SINCRONIZACIÓN INCREMENTAL (/api/sync)
+# ===========================================
+
+# Columnas que se replican en los terminales por tabla
+_SINCRONIZABLES = {
+    'miembros': """id, nombre, email, telefono, fecha_inscripcion, activo, rol_id,
+        fecha_nacimiento, genero, direccion, tipo_membresia, fecha_vencimiento_membresia,
+        especialidad, horario_trabajo, certificaciones, condiciones_medicas, fecha_actualizacion""",
+    'clases': '*',
+    'rutinas': '*',
+    'facturas': '*',
+    'inventario': '*',
+}
+
+for _tabla, _columnas in _SINCRONIZABLES.items():
+    register(f'sync_{_tabla}_todos', f"""
+    SELECT {_columnas} FROM {_tabla} ORDER BY id
+""")
+    register(f'sync_{_tabla}_cambios', f"""
+    SELECT {_columnas} FROM {_tabla}
+    WHERE fecha_actualizacion >= %s
+    ORDER BY fecha_actualizacion, id
+""")
+
+register('sync_ahora', """
+    SELECT NOW() AS ahora
+""")
+
+register('sync_eliminados_desde', """
+    SELECT tabla, registro_id FROM sync_eliminados
+    WHERE fecha_eliminacion >= %s
+    ORDER BY id
+""")
+
+register('sync_eliminados_purgar', """
+    DELETE FROM sync_eliminados WHERE fecha_eliminacion < %s
+""")
+
+# ===========================================
+# ENTRADAS Y SALIDAS (attendance.py)
+# ===========================================
+
+# Insertada en lotes con execute_many; IGNORE descarta las entradas que ya
+# se guardaron (mismo registro_uuid) al reaplicar el diario
+register('asistencias_insertar_lote', """
+    INSERT IGNORE INTO asistencias
+        (registro_uuid, miembro_id, fecha_hora_entrada, tipo_asistencia, notas, creado_por)
+    VALUES (%s, %s, %s, %s, %s, %s)
+""")
+
+register('asistencia_cerrar_por_uuid', """
+    UPDATE asistencias SET fecha_hora_salida = %s
+    WHERE registro_uuid = %s AND fecha_hora_salida IS NULL
+""")
+
+register('asistencia_cerrar_por_id', """
+    UPDATE asistencias SET fecha_hora_salida = %s
+    WHERE id = %s AND fecha_hora_salida IS NULL
+""")
+
+register('asistencias_abiertas_hoy', """
+    SELECT id, registro_uuid, miembro_id, fecha_hora_entrada
+    FROM asistencias
+    WHERE fecha_hora_entrada >= CURDATE() AND fecha_hora_salida IS NULL
+""")
+
+register('asistencias_del_dia', """
+    SELECT a.id, a.registro_uuid, a.miembro_id, m.nombre AS miembro_nombre,
+           a.fecha_hora_entrada, a.fecha_hora_salida, a.tipo_asistencia
+    FROM asistencias a
+    JOIN miembros m ON a.miembro_id = m.id
+    WHERE a.fecha_hora_entrada >= %s AND a.fecha_hora_entrada < %s
+    ORDER BY a.fecha_hora_entrada
+""")
+# Reconstrucción del resumen diario para un rango [desde, hasta) de días
+register('asistencias_diarias_miembros_borrar', """
+    DELETE FROM asistencias_diarias_miembros WHERE fecha >= %s AND fecha < %s
+""")
+
+register('asistencias_diarias_miembros_reconstruir', """
+    INSERT INTO asistencias_diarias_miembros (fecha, miembro_id, visitas)
+    SELECT DATE(a.fecha_hora_entrada), a.miembro_id, COUNT(*)
+    FROM asistencias a
+    JOIN miembros m ON a.miembro_id = m.id
+    WHERE a.fecha_hora_entrada >= %s AND a.fecha_hora_entrada < %s
+    AND m.rol_id = 3
+    GROUP BY DATE(a.fecha_hora_entrada), a.miembro_id
+""")
+
+register('asistencias_diarias_borrar', """
+    DELETE FROM asistencias_diarias WHERE fecha >= %s AND fecha < %s
+""")
+
+register('asistencias_diarias_reconstruir', """
+    INSERT INTO asistencias_diarias (fecha, visitas, clientes_unicos, visitas_cerradas, minutos_totales)
+    SELECT DATE(a.fecha_hora_entrada), COUNT(*), COUNT(DISTINCT a.miembro_id), COUNT(a.fecha_hora_salida),
+           COALESCE(SUM(TIMESTAMPDIFF(MINUTE, a.fecha_hora_entrada, a.fecha_hora_salida)), 0)
+    FROM asistencias a
+    JOIN miembros m ON a.miembro_id = m.id
+    WHERE a.fecha_hora_entrada >= %s AND a.fecha_hora_entrada < %s
+    AND m.rol_id = 3
+    GROUP BY DATE(a.fecha_hora_entrada)
+""")
+
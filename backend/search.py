@@ -0,0 +1,548 @@
+"""
+Índice de búsqueda de miembros en memoria.
+
+Indexa nombre, email y teléfono: cada término normalizado (minúsculas, sin
+acentos ni signos) apunta a los miembros que lo contienen y se descompone
+en trigramas para encontrar términos parecidos aunque tengan errores de
+escritura; los términos alfabéticos guardan además sus variantes con una
+letra menos para reconocer letras cambiadas o transpuestas. Una búsqueda no
+consulta la base de datos; los handlers que crean, modifican o eliminan
+miembros actualizan el índice al momento y los cambios hechos por otros
+workers se leen cada ``refresh_interval`` segundos a partir de
+``fecha_actualizacion``.
+"""
+import bisect
+import heapq
+import itertools
+import math
+import re
+import threading
+import time
+import unicodedata
+
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+_NO_DIGITO = re.compile(r'\D+')
+
+# Peso de cada campo en la puntuación
+PESOS = {'nombre': 1.0, 'email': 0.8, 'telefono': 0.7}
+
+# Puntuación de un término según cómo coincide con el buscado
+EXACTO = 1.0
+PREFIJO = 0.9
+APROXIMADO = 0.7
+
+# Similitud mínima de trigramas para aceptar un término con errores
+SIMILITUD_MINIMA = 0.35
+
+# Términos revisados como máximo por prefijo (búsquedas de una o dos letras)
+MAX_PREFIJOS = 200
+
+# Términos revisados como máximo al buscar por trigramas (errores mayores)
+MAX_APROXIMADOS = 200
+
+# Con varios términos buscados, miembros que los tienen todos hasta los que
+# se puntúan uno por uno; con más se recorren por puntuación
+MAX_INTERSECCION = 1000
+
+# Cambios que se acumulan fuera del índice principal antes de rearmarlo
+MAX_PENDIENTES = 1000
+
+# Largo de los términos que admiten una letra errada
+LARGO_MINIMO_ERRATA = 4
+LARGO_MAXIMO_ERRATA = 15
+
+# Columnas de cada miembro que se guardan y se devuelven en los resultados
+# (la fecha de vencimiento la usa también el control de acceso)
+CAMPOS = ('id', 'nombre', 'email', 'telefono', 'rol_id', 'activo', 'fecha_vencimiento_membresia')
+
+
+def normalize(texto):
+    """Minúsculas sin acentos ni signos: ``'José.Pérez'`` -> ``'jose perez'``"""
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def trigrams(termino):
+    # Con relleno, para que el inicio del término pese más que el resto
+    relleno = f'  {termino} '
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def _variantes(termino):
+    """El término y sus variantes con una letra menos"""
+    return {termino} | {termino[:i] + termino[i + 1:] for i in range(len(termino))}
+
+
+def _admite_errata(termino):
+    return termino.isalpha() and LARGO_MINIMO_ERRATA <= len(termino) <= LARGO_MAXIMO_ERRATA
+
+
+def _distancia(a, b):
+    """Distancia de edición con transposiciones (Damerau restringida)"""
+    anterior2, anterior = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        actual = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            costo = a[i - 1] != b[j - 1]
+            actual[j] = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + costo)
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                actual[j] = min(actual[j], anterior2[j - 2] + 1)
+        anterior2, anterior = anterior, actual
+    return anterior[-1]
+
+
+def _local(email):
+    # El dominio lo comparten casi todos los miembros y no sirve para buscar
+    return (email or '').partition('@')[0]
+
+
+def _terminos_de(miembro):
+    """Términos de un miembro con el campo de mayor peso en que aparecen"""
+    terminos = {}
+    for campo, texto in (('nombre', miembro.get('nombre')), ('email', _local(miembro.get('email')))):
+        for termino in normalize(texto or '').split():
+            terminos.setdefault(termino, campo)
+    telefono = _NO_DIGITO.sub('', miembro.get('telefono') or '')
+    if telefono:
+        terminos.setdefault(telefono, 'telefono')
+    return terminos
+
+
+def _orden(miembro):
+    # Orden de los resultados con la misma puntuación
+    return (miembro.get('nombre') or '', miembro['id'])
+
+
+def _terminos_de_consulta(consulta):
+    # Un teléfono se busca con sus dígitos juntos ("555-12 34" -> "5551234")
+    if not re.search(r'[^\W\d_]', consulta):
+        digitos = _NO_DIGITO.sub('', consulta)
+        return [digitos] if digitos else []
+    if '@' in consulta:
+        consulta = _local(consulta)
+    return list(dict.fromkeys(normalize(consulta).split()))
+
+
+class _Indice:
+    """
+    Estructuras del índice; no es seguro entre hilos por sí solo.
+
+    Un índice armado con ``build`` queda fijo: los miembros se agregan en
+    orden de nombre, así que cada posting ya está en el orden en que se
+    muestran los resultados (``rango``), y las listas de trigramas se
+    ordenan por largo. No se modifica después, y por eso se puede recorrer
+    sin lock.
+    """
+
+    def __init__(self):
+        self.miembros = {}      # id -> datos del miembro
+        self.terminos = {}      # id -> {término: campo}
+        self.postings = {}      # término -> {id: campo}
+        self.trigramas = {}     # trigrama -> términos que lo contienen
+        self.variantes = {}     # variante con una letra menos -> términos
+        self.vocabulario = []   # términos ordenados, para buscar por prefijo
+        self.rango = None       # id -> posición por nombre (solo con ``build``)
+
+    @classmethod
+    def build(cls, filas):
+        """Índice fijo completo; el vocabulario se ordena una sola vez al final"""
+        indice = cls()
+        filas = sorted(filas, key=_orden)
+        for fila in filas:
+            indice.add(fila, ordenado=False)
+        indice.vocabulario.sort()
+        indice.trigramas = {
+            trigrama: tuple(sorted(terminos, key=len))
+            for trigrama, terminos in indice.trigramas.items()
+        }
+        indice.rango = {fila['id']: posicion for posicion, fila in enumerate(filas)}
+        return indice
+
+    def add(self, miembro, ordenado=True):
+        miembro_id = miembro['id']
+        self.remove(miembro_id)
+        terminos = _terminos_de(miembro)
+        self.miembros[miembro_id] = {campo: miembro.get(campo) for campo in CAMPOS}
+        self.terminos[miembro_id] = terminos
+        for termino, campo in terminos.items():
+            posting = self.postings.get(termino)
+            if posting is None:
+                posting = self.postings[termino] = {}
+                for trigrama in trigrams(termino):
+                    self.trigramas.setdefault(trigrama, set()).add(termino)
+                if _admite_errata(termino):
+                    for variante in _variantes(termino):
+                        self.variantes.setdefault(variante, set()).add(termino)
+                if ordenado:
+                    bisect.insort(self.vocabulario, termino)
+                else:
+                    self.vocabulario.append(termino)
+            posting[miembro_id] = campo
+
+    def remove(self, miembro_id):
+        terminos = self.terminos.pop(miembro_id, None)
+        if terminos is None:
+            return
+        del self.miembros[miembro_id]
+        for termino in terminos:
+            posting = self.postings[termino]
+            del posting[miembro_id]
+            if posting:
+                continue
+            # Término sin miembros: se quita del vocabulario
+            del self.postings[termino]
+            for trigrama in trigrams(termino):
+                contenedores = self.trigramas[trigrama]
+                contenedores.discard(termino)
+                if not contenedores:
+                    del self.trigramas[trigrama]
+            if _admite_errata(termino):
+                for variante in _variantes(termino):
+                    contenedores = self.variantes[variante]
+                    contenedores.discard(termino)
+                    if not contenedores:
+                        del self.variantes[variante]
+            del self.vocabulario[bisect.bisect_left(self.vocabulario, termino)]
+
+    def _candidatos(self, buscado):
+        """Términos del índice parecidos a ``buscado`` con su puntuación"""
+        candidatos = {}
+        if buscado in self.postings:
+            candidatos[buscado] = EXACTO
+
+        inicio = bisect.bisect_left(self.vocabulario, buscado)
+        for termino in self.vocabulario[inicio:inicio + MAX_PREFIJOS]:
+            if not termino.startswith(buscado):
+                break
+            candidatos.setdefault(termino, PREFIJO)
+
+        # Los teléfonos solo se buscan completos o por prefijo
+        if buscado.isdigit():
+            return candidatos
+
+        # Una letra de más, de menos, cambiada o transpuesta
+        if _admite_errata(buscado):
+            for variante in _variantes(buscado):
+                for termino in self.variantes.get(variante, ()):
+                    if termino not in candidatos and _distancia(buscado, termino) <= 1:
+                        candidatos[termino] = APROXIMADO
+
+        # Errores mayores: términos con suficientes trigramas en común. Con la
+        # similitud mínima un término comparte al menos ``necesarios``
+        # trigramas, así que contiene alguno de los ``len - necesarios + 1``
+        # menos frecuentes: solo esas listas se recorren, y hasta
+        # MAX_APROXIMADOS términos
+        if len(buscado) >= 3:
+            propios = trigrams(buscado)
+            orden = sorted(propios, key=lambda trigrama: len(self.trigramas.get(trigrama, ())))
+            necesarios = max(1, math.ceil(SIMILITUD_MINIMA * len(propios)))
+            revisados = set()
+            for trigrama in orden[:len(orden) - necesarios + 1]:
+                contenedores = self.trigramas.get(trigrama, ())
+                restantes = MAX_APROXIMADOS - len(revisados)
+                if len(contenedores) > restantes:
+                    # Con los mismos trigramas en común, el más corto es el más similar
+                    if self.rango is None:
+                        contenedores = sorted(contenedores, key=len)
+                    contenedores = contenedores[:restantes]
+                revisados.update(contenedores)
+                if len(revisados) >= MAX_APROXIMADOS:
+                    break
+            for termino in revisados:
+                if termino in candidatos:
+                    continue
+                n = len(propios & trigrams(termino))
+                similitud = n / (len(propios) + len(termino) + 1 - n)
+                if similitud >= SIMILITUD_MINIMA:
+                    candidatos[termino] = APROXIMADO * similitud
+        return candidatos
+
+    def _recorrido(self, candidatos):
+        """
+        ``(puntuación, id)`` de cada miembro con alguno de los ``candidatos``,
+        una sola vez y con su mejor puntuación: de mayor a menor y, en un
+        índice fijo, por nombre dentro de cada puntuación.
+        """
+        niveles = {}
+        for termino, valor in candidatos.items():
+            for campo in set(self.postings[termino].values()):
+                niveles.setdefault(valor * PESOS[campo], []).append((termino, campo))
+        vistos = set()
+        for nivel, pares in sorted(niveles.items(), reverse=True):
+            ids = [self._ids(termino, campo) for termino, campo in pares]
+            if len(ids) == 1:
+                ids = ids[0]
+            elif self.rango is not None:
+                ids = heapq.merge(*ids, key=self.rango.__getitem__)
+            else:
+                ids = itertools.chain(*ids)
+            for miembro_id in ids:
+                if miembro_id not in vistos:
+                    vistos.add(miembro_id)
+                    yield nivel, miembro_id
+
+    def _ids(self, termino, campo):
+        posting = self.postings[termino]
+        for miembro_id, campo_miembro in posting.items():
+            if campo_miembro == campo:
+                yield miembro_id
+
+    def _mejor(self, miembro_id, candidatos):
+        """Mejor puntuación del miembro entre los ``candidatos`` de un término buscado"""
+        mejor = 0.0
+        for termino, campo in self.terminos[miembro_id].items():
+            valor = candidatos.get(termino)
+            if valor is not None and valor * PESOS[campo] > mejor:
+                mejor = valor * PESOS[campo]
+        return mejor
+
+    def search(self, consulta, limit=20, rol_id=None, excluir=()):
+        """Mejores miembros para ``consulta``, sin los ids de ``excluir``"""
+        terminos = _terminos_de_consulta(consulta)
+        if not terminos:
+            return []
+        candidatos = [self._candidatos(buscado) for buscado in terminos]
+        if not all(candidatos):
+            return []
+
+        # Todos los términos buscados deben coincidir con algo del miembro. Se
+        # intersecan los miembros de cada uno empezando por el menos frecuente;
+        # si quedan pocos se puntúan todos, y si no se recorren los del menos
+        # frecuente de mayor a menor puntuación hasta que ninguno de los que
+        # faltan pueda entrar entre los mejores
+        candidatos.sort(key=lambda terminos_: sum(len(self.postings[t]) for t in terminos_))
+        guia, otros = candidatos[0], candidatos[1:]
+        comunes = None
+        if otros:
+            comunes = set().union(*(self.postings[t] for t in guia))
+            for terminos_ in otros:
+                comunes.intersection_update(set().union(*(self.postings[t] for t in terminos_)))
+        if comunes is not None and len(comunes) <= MAX_INTERSECCION:
+            recorrido = ((self._mejor(i, guia), i) for i in comunes)
+            rango = None
+        else:
+            recorrido = self._recorrido(guia)
+            rango = self.rango
+
+        miembros = self.miembros
+        encontrados = []
+        peores = []     # (total, -rango) de los ``limit`` mejores, el peor primero
+        for nivel, miembro_id in recorrido:
+            if rango is not None and len(peores) == limit:
+                techo = nivel
+                for terminos_ in otros:
+                    techo += max(terminos_.values())
+                total, posicion = peores[0]
+                if total > techo or (total == techo and -posicion < rango[miembro_id]):
+                    break
+            if (miembro_id in excluir or (comunes is not None and miembro_id not in comunes) or
+                    (rol_id is not None and miembros[miembro_id]['rol_id'] != rol_id)):
+                continue
+            total = nivel
+            for terminos_ in otros:
+                total += self._mejor(miembro_id, terminos_)
+            encontrados.append((-total, miembro_id))
+            if rango is not None:
+                if len(peores) < limit:
+                    heapq.heappush(peores, (total, -rango[miembro_id]))
+                elif (total, -rango[miembro_id]) > peores[0]:
+                    heapq.heapreplace(peores, (total, -rango[miembro_id]))
+
+        mejores = heapq.nsmallest(
+            limit, [(valor, _orden(miembros[i]), i) for valor, i in encontrados]
+        )
+        return [
+            dict(miembros[miembro_id], score=round(-valor / len(terminos), 4))
+            for valor, _, miembro_id in mejores
+        ]
+
+
+class MemberIndex:
+    """
+    Índice de búsqueda de miembros.
+
+    ``loader(desde)`` abre la base de datos y devuelve ``(filas, eliminados)``:
+    todos los miembros si ``desde`` es None, o solo los modificados desde esa
+    fecha junto con los ids eliminados desde entonces (``{'id',
+    'fecha_actualizacion'}``, con la fecha del borrado), así las bajas de
+    otros workers también llegan al índice. Además se reconstruye completo
+    cada ``rebuild_interval`` segundos, por si se perdió algún borrado.
+
+    El índice principal no se modifica: las búsquedas lo recorren sin lock.
+    Las altas, modificaciones y bajas se guardan en ``_pendientes`` y en un
+    índice chico aparte, que se busca con el lock y tapa al principal; con
+    más de ``MAX_PENDIENTES`` se arma un principal nuevo fuera del lock y se
+    reemplaza.
+    """
+
+    def __init__(self, loader, refresh_interval=30, rebuild_interval=3600):
+        self._loader = loader
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._refrescando = threading.Lock()
+        self._indice = _Indice.build([])
+        self._cambios = _Indice()
+        self._pendientes = {}   # id -> fila, o None si se eliminó
+        self._cargado = False
+        self._marca = None
+        self._ultima_revision = None
+        self._ultima_carga = None
+        self._stats = {'searches': 0, 'total_time': 0.0, 'max_time': 0.0,
+                       'updates': 0, 'reloads': 0, 'compactions': 0}
+
+    @property
+    def loaded(self):
+        return self._cargado
+
+    def _necesita_revision(self):
+        return (self._ultima_revision is None or
+                time.monotonic() - self._ultima_revision >= self.refresh_interval)
+
+    def _avanzar_marca(self, filas):
+        for fila in filas:
+            fecha = fila.get('fecha_actualizacion')
+            if fecha is not None and (self._marca is None or fecha > self._marca):
+                self._marca = fecha
+
+    def _aplicar(self, miembro_id, fila):
+        # Con el lock tomado
+        self._pendientes[miembro_id] = fila
+        if fila is None:
+            self._cambios.remove(miembro_id)
+        else:
+            self._cambios.add(fila)
+
+    def _total(self):
+        # Con el lock tomado
+        miembros = self._indice.miembros
+        total = len(miembros)
+        for miembro_id, fila in self._pendientes.items():
+            total += (fila is not None) - (miembro_id in miembros)
+        return total
+
+    def _reemplazar(self, indice, pendientes):
+        """
+        Pone ``indice`` como principal. ``pendientes`` son los cambios que ya
+        incluye; los que se hicieron mientras se armaba siguen pendientes.
+        """
+        with self._lock:
+            self._indice = indice
+            for miembro_id, fila in pendientes.items():
+                if self._pendientes[miembro_id] is fila:
+                    del self._pendientes[miembro_id]
+                    self._cambios.remove(miembro_id)
+
+    def _compactar(self):
+        """Arma un principal nuevo con los cambios pendientes, sin consultar la base"""
+        with self._lock:
+            principal = self._indice
+            pendientes = dict(self._pendientes)
+        filas = [miembro for miembro_id, miembro in principal.miembros.items() if miembro_id not in pendientes]
+        filas.extend(fila for fila in pendientes.values() if fila is not None)
+        self._reemplazar(_Indice.build(filas), pendientes)
+        self._stats['compactions'] += 1
+
+    def refresh(self, force=False):
+        """Carga el índice la primera vez y luego aplica los cambios recientes"""
+        if not force and not self._necesita_revision():
+            return
+        # Igual que el motor de permisos: sin índice se espera a la carga,
+        # después un solo hilo revisa y los demás buscan con lo que hay
+        if not self._refrescando.acquire(blocking=not self.loaded):
+            return
+        try:
+            if not force and not self._necesita_revision():
+                return
+            completo = False
+            if self._cargado and time.monotonic() - self._ultima_carga < self.rebuild_interval:
+                # Se repite el último segundo: TIMESTAMP no guarda fracciones
+                filas, eliminados = self._loader(self._marca)
+                if len(filas) + len(eliminados) <= MAX_PENDIENTES:
+                    with self._lock:
+                        for fila in filas:
+                            self._aplicar(fila['id'], {campo: fila.get(campo) for campo in CAMPOS})
+                        # Después de las filas: los ids no se reutilizan, así
+                        # que un id leído en ambas se eliminó después
+                        for fila in eliminados:
+                            self._aplicar(fila['id'], None)
+                    self._avanzar_marca(filas)
+                    self._avanzar_marca(eliminados)
+                    completo = True
+            if not completo:
+                # Los cambios anteriores a la consulta ya están en las filas
+                with self._lock:
+                    pendientes = dict(self._pendientes)
+                filas, _ = self._loader(None)
+                self._reemplazar(_Indice.build(filas), pendientes)
+                self._marca = None
+                self._avanzar_marca(filas)
+                self._cargado = True
+                self._ultima_carga = time.monotonic()
+                self._stats['reloads'] += 1
+            elif len(self._pendientes) > MAX_PENDIENTES:
+                self._compactar()
+            self._ultima_revision = time.monotonic()
+        finally:
+            self._refrescando.release()
+
+    def upsert(self, miembro):
+        """Agrega o reemplaza un miembro (fila con las columnas de ``CAMPOS``)"""
+        if not self._cargado:
+            return
+        with self._lock:
+            self._aplicar(miembro['id'], {campo: miembro.get(campo) for campo in CAMPOS})
+            self._stats['updates'] += 1
+
+    def remove(self, miembro_id):
+        if not self._cargado:
+            return
+        with self._lock:
+            self._aplicar(miembro_id, None)
+            self._stats['updates'] += 1
+
+    def get(self, miembro_id):
+        """Datos guardados de un miembro (copia) o None si no está en el índice"""
+        with self._lock:
+            if miembro_id in self._pendientes:
+                miembro = self._pendientes[miembro_id]
+            else:
+                miembro = self._indice.miembros.get(miembro_id)
+        return dict(miembro) if miembro is not None else None
+
+    def search(self, consulta, limit=20, rol_id=None):
+        """
+        Miembros que coinciden con todos los términos de ``consulta``,
+        ordenados por puntuación (exacto > prefijo > aproximado, nombre >
+        email > teléfono).
+        """
+        self.refresh()
+        inicio = time.perf_counter()
+        with self._lock:
+            principal = self._indice
+            excluir = frozenset(self._pendientes)
+            resultados = self._cambios.search(consulta, limit=limit, rol_id=rol_id) if self._cambios.miembros else []
+        resultados += principal.search(consulta, limit=limit, rol_id=rol_id, excluir=excluir)
+        resultados = heapq.nsmallest(limit, resultados, key=lambda miembro: (-miembro['score'], _orden(miembro)))
+        duracion = time.perf_counter() - inicio
+        with self._lock:
+            self._stats['searches'] += 1
+            self._stats['total_time'] += duracion
+            if duracion > self._stats['max_time']:
+                self._stats['max_time'] = duracion
+        return resultados
+
+    def stats(self):
+        """Métricas del índice para monitoreo"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['members'] = self._total()
+            stats['pending'] = len(self._pendientes)
+            stats['terms'] = len(self._indice.postings)
+            stats['trigrams'] = len(self._indice.trigramas)
+            stats['variants'] = len(self._indice.variantes)
+        stats['avg_time'] = round(stats['total_time'] / stats['searches'], 6) if stats['searches'] else 0.0
+        stats['total_time'] = round(stats['total_time'], 6)
+        stats['max_time'] = round(stats['max_time'], 6)
+        return stats
@@ -0,0 +1,158 @@
+"""
+Registro de consultas lentas.
+
+Cuando una consulta del registro supera el umbral configurado se guarda su
+SQL, parámetros, duración, la ruta que la originó y el plan de ``EXPLAIN``
+en un archivo JSON rotativo (escrito en segundo plano por logs). Además se
+mantiene en memoria un resumen por consulta para consultar las peores
+desde el endpoint de administración.
+"""
+import logging
+import threading
+import time
+
+from flask import has_request_context, request
+from mysql.connector import Error
+
+import logs
+
+logger = logging.getLogger('gym.slowquery')
+
+# Consultas cuyos parámetros se guardan: solo ids, fechas, cantidades y
+# valores de catálogo. Las demás llevan datos personales o médicos (nombre,
+# email, contacto, condiciones médicas, notas), contraseñas o tokens, y una
+# consulta nueva no guarda sus parámetros hasta que se agregue aquí
+CON_PARAMETROS = {
+    'miembro_perfil', 'miembro_token_version', 'miembro_revocar_tokens', 'miembros_indice_cambios',
+    'miembros_indice_eliminados',
+    'miembro_existe', 'miembro_resumen', 'miembro_por_id', 'miembro_credenciales',
+    'miembro_eliminar', 'asistencias_eliminar_miembro', 'miembros_pagina_id', 'miembros_exportar', 'miembros_contar',
+    'miembros_proximos_a_vencer', 'miembros_por_vencer_contar',
+    'refresh_token_rotar', 'refresh_tokens_revocar_miembro', 'refresh_tokens_purgar',
+    'factura_por_id', 'factura_eliminar', 'facturas_ingresos_rango',
+    'inventario_insertar', 'inventario_actualizar', 'inventario_eliminar', 'inventario_alertas',
+    'clase_insertar', 'clase_actualizar', 'clase_eliminar',
+    'rutina_por_id', 'rutina_existe', 'rutina_resumen', 'rutina_dias', 'dia_rutina_ejercicios',
+    'rutina_clientes_activos', 'rutina_clientes_asignados', 'rutina_insertar',
+    'dia_rutina_insertar', 'ejercicio_rutina_insertar', 'rutina_actualizar',
+    'rutina_desactivar', 'asignacion_activa', 'ejercicios_por_categoria',
+    'reporte_asistencia_por_dia', 'reporte_asistencia_totales', 'reporte_asistencia_en_curso',
+    'reporte_asistencia_clientes_unicos', 'asistencias_estancias', 'asistencias_conteo_rango',
+    'asistencias_del_dia', 'asistencia_cerrar_por_uuid', 'asistencia_cerrar_por_id',
+    'asistencias_diarias_borrar', 'asistencias_diarias_reconstruir',
+    'asistencias_diarias_miembros_borrar', 'asistencias_diarias_miembros_reconstruir',
+    'pronostico_borrar_desde', 'pronostico_insertar_lote', 'pronostico_rango',
+    'reporte_rutinas_por_nivel', 'reporte_rutinas_por_objetivo', 'reporte_rutinas_top',
+    'reporte_rutinas_estadisticas', 'reporte_progreso_clientes', 'reporte_progreso_estadisticas',
+    'sync_miembros_cambios', 'sync_clases_cambios', 'sync_rutinas_cambios',
+    'sync_facturas_cambios', 'sync_inventario_cambios', 'sync_eliminados_desde',
+    'sync_eliminados_purgar',
+}
+
+# Solo estas sentencias admiten un EXPLAIN útil
+_EXPLICABLES = ('SELECT', 'UPDATE', 'DELETE')
+
+threshold = None  # segundos; None desactiva el registro
+explain_interval = 60
+_lock = threading.Lock()
+_resumen = {}
+
+
+class _Resumen:
+    """Acumulado de las ejecuciones lentas de una consulta"""
+
+    __slots__ = ('count', 'total_time', 'max_time', 'last_seen', 'last_route',
+                 'plan', 'plan_time')
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_seen = None
+        self.last_route = None
+        self.plan = None
+        self.plan_time = None
+
+
+def configure(threshold_ms, path=None, max_bytes=5 * 1024 * 1024, backups=5, explain_every=60):
+    """Activa el registro para consultas que tarden al menos ``threshold_ms``"""
+    global threshold, explain_interval
+    threshold = threshold_ms / 1000.0 if threshold_ms else None
+    explain_interval = explain_every
+    if path:
+        logs.add_file_log('gym.slowquery', path, max_bytes=max_bytes, backups=backups)
+
+
+def _explain(connection, sql, params):
+    cursor = connection.raw_cursor(dictionary=True)
+    try:
+        cursor.execute('EXPLAIN ' + sql, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def record(connection, name, sql, params, duration):
+    """Registra una ejecución lenta; el EXPLAIN se repite a lo sumo cada ``explain_interval``"""
+    ruta = request.url_rule.rule if has_request_context() and request.url_rule else None
+    ahora = time.time()
+    with _lock:
+        resumen = _resumen.get(name)
+        if resumen is None:
+            resumen = _resumen[name] = _Resumen()
+        resumen.count += 1
+        resumen.total_time += duration
+        resumen.max_time = max(resumen.max_time, duration)
+        resumen.last_seen = ahora
+        resumen.last_route = ruta
+        explicar = (sql.lstrip().upper().startswith(_EXPLICABLES) and
+                    (resumen.plan_time is None or ahora - resumen.plan_time >= explain_interval))
+        if explicar:
+            # Se marca antes de ejecutar para que otro hilo no repita el EXPLAIN
+            resumen.plan_time = ahora
+
+    plan = None
+    if explicar:
+        try:
+            plan = _explain(connection, sql, params)
+        except Error as e:
+            plan = [{'error': str(e)}]
+        with _lock:
+            resumen.plan = plan
+
+    logger.warning(
+        "Consulta lenta: %s (%.1f ms)", name, duration * 1000,
+        extra={
+            'query': name,
+            'duration_ms': round(duration * 1000, 3),
+            'route': ruta,
+            'sql': ' '.join(sql.split()),
+            'params': [str(p) for p in params] if name in CON_PARAMETROS else None,
+            'plan': plan,
+        }
+    )
+
+
+def top(limit=20, order_by='total_time'):
+    """Consultas lentas ordenadas por ``total_time``, ``max_time`` o ``count``"""
+    with _lock:
+        filas = [
+            {
+                'query': name,
+                'count': r.count,
+                'total_time': round(r.total_time, 6),
+                'avg_time': round(r.total_time / r.count, 6),
+                'max_time': round(r.max_time, 6),
+                'last_seen': r.last_seen,
+                'last_route': r.last_route,
+                'plan': r.plan,
+            }
+            for name, r in _resumen.items()
+        ]
+    filas.sort(key=lambda fila: fila[order_by], reverse=True)
+    return filas[:limit]
+
+
+def reset():
+    with _lock:
+        _resumen.clear()
@@ -0,0 +1,119 @@
+"""
+Respuestas por streaming para los listados grandes.
+
+Con ``Accept: application/x-ndjson`` (o ``?format=ndjson``) el listado se
+envía como un objeto JSON por línea, y con ``?format=csv`` como CSV. Las
+filas se leen del servidor MySQL por bloques mientras se escriben en la
+respuesta: el primer byte sale en cuanto llega el primer bloque y la
+memoria usada no depende del número de filas.
+"""
+import csv
+import io
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from flask import Response, current_app, request
+
+import db
+import queries
+
+logger = logging.getLogger('gym.api')
+
+NDJSON = 'application/x-ndjson'
+CSV = 'text/csv'
+
+chunk_size = 500
+
+
+def requested_format():
+    """``'ndjson'``, ``'csv'`` o None si el cliente pidió la respuesta JSON normal"""
+    formato = request.args.get('format')
+    if formato in ('ndjson', 'csv'):
+        return formato
+    if formato is None and request.accept_mimetypes.best == NDJSON:
+        return 'ndjson'
+    return None
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return valor.isoformat(sep=' ')
+    if isinstance(valor, (date, Decimal, timedelta)):
+        return str(valor)
+    if isinstance(valor, (bytes, bytearray)):
+        return valor.decode('utf-8', 'replace')
+    return valor
+
+
+def _ndjson(columnas, bloques, proveedor, transform):
+    for filas in bloques:
+        lineas = []
+        for fila in filas:
+            if transform is not None:
+                fila = transform(fila)
+            lineas.append(proveedor.dumps(fila))
+        yield '\n'.join(lineas) + '\n'
+
+
+def _csv(columnas, bloques, transform):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    for filas in bloques:
+        for fila in filas:
+            if transform is not None:
+                fila = transform(fila)
+            escritor.writerow([_valor_csv(fila.get(c)) for c in columnas])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_query(name, params=(), formato='ndjson', columns=None, transform=None, filename=None):
+    """
+    Respuesta que recorre la consulta registrada ``name`` por bloques.
+
+    La consulta se ejecuta antes de responder, así que un error de SQL
+    todavía produce un 500; la conexión se presta durante toda la
+    transmisión y se devuelve al terminar. ``transform`` recibe cada fila
+    (diccionario) y devuelve la fila a enviar.
+    """
+    proveedor = current_app.json
+    conexion = db.get_pool().acquire()
+    try:
+        columnas, bloques = queries.stream(conexion, name, params, chunk_size=chunk_size, columns=columns)
+    except Exception:
+        conexion.close()
+        raise
+
+    def generar():
+        completo = False
+        try:
+            if formato == 'csv':
+                yield from _csv(columnas, bloques, transform)
+            else:
+                yield from _ndjson(columnas, bloques, proveedor, transform)
+            completo = True
+        except Exception:
+            # Los encabezados ya se enviaron; solo queda cortar la respuesta
+            logger.exception("Error al transmitir %s", name)
+        finally:
+            if completo:
+                conexion.close()
+            else:
+                # El cliente se desconectó o falló la lectura: quedan filas sin leer
+                conexion.discard()
+
+    headers = {'X-Accel-Buffering': 'no'}
+    if formato == 'csv':
+        mimetype = CSV
+        if filename:
+            headers['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    else:
+        mimetype = NDJSON
+    return Response(generar(), mimetype=mimetype, headers=headers)
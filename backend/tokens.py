@@ -0,0 +1,237 @@
+"""
+Caché de tokens JWT ya verificados.
+
+Un panel hace varias solicitudes por carga de página con el mismo token; en
+lugar de verificar la firma HMAC en cada una, los claims de un token válido
+se guardan en una caché LRU acotada, indexada por el digest SHA-256 del
+token. Cada entrada vive como máximo ``ttl`` segundos y nunca más allá del
+``exp`` del propio token. Los tokens revocados se rechazan aunque su firma
+siga siendo válida.
+
+El token lleva además la identidad tipada del miembro (``Principal``): id,
+rol, permisos y una versión. Si el rol de un miembro cambia o se revocan sus
+sesiones (cambio de contraseña), su versión sube y los tokens emitidos con
+la versión anterior dejan de aceptarse.
+"""
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class Principal:
+    """Identidad del miembro autenticado, tal como viaja en el token"""
+
+    __slots__ = ('id', 'email', 'role', 'permissions', 'version')
+
+    def __init__(self, id, email, role, permissions=(), version=0):
+        self.id = id
+        self.email = email
+        self.role = role
+        self.permissions = frozenset(permissions)
+        self.version = version
+
+    @classmethod
+    def from_claims(cls, claims):
+        """Construye el principal a partir de los claims de un token verificado"""
+        try:
+            return cls(
+                id=int(claims['uid']),
+                email=claims['email'],
+                role=claims['rol'],
+                permissions=claims.get('perms', ()),
+                version=int(claims.get('ver', 0))
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def to_claims(self):
+        return {
+            'uid': self.id,
+            'email': self.email,
+            'rol': self.role,
+            'perms': sorted(self.permissions),
+            'ver': self.version,
+        }
+
+    def has_permission(self, permiso):
+        return permiso in self.permissions
+
+    def __repr__(self):
+        return f'Principal(id={self.id}, email={self.email!r}, role={self.role!r})'
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+def new_refresh_token():
+    """Genera un refresh token opaco; en la base de datos solo se guarda su digest"""
+    token = secrets.token_urlsafe(32)
+    return token, token_digest(token)
+
+
+def new_session_family():
+    """Identificador de la cadena de refresh tokens de una sesión"""
+    return secrets.token_bytes(16)
+
+
+class TokenCache:
+    """
+    Caché LRU con TTL de claims verificados.
+
+    - ``max_size``: número máximo de tokens en caché.
+    - ``ttl``: segundos que un token se considera verificado sin volver a
+      comprobar la firma; se recorta al ``exp`` del token.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        # digest -> exp del token revocado (se purga cuando el token expira)
+        self._revocados = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'revoked': 0,
+        }
+
+    def get(self, token):
+        """Devuelve los claims verificados del token o None si no está en caché"""
+        digest = token_digest(token)
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(digest)
+            if entrada is None:
+                self._stats['misses'] += 1
+                return None
+            claims, vence = entrada
+            if ahora >= vence:
+                del self._entradas[digest]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entradas.move_to_end(digest)
+            self._stats['hits'] += 1
+            return claims
+
+    def put(self, token, claims):
+        """Guarda los claims de un token cuya firma ya fue verificada"""
+        ahora = time.time()
+        vence = ahora + self.ttl
+        exp = claims.get('exp')
+        if exp is not None:
+            vence = min(vence, float(exp))
+        if vence <= ahora:
+            return
+        digest = token_digest(token)
+        with self._lock:
+            self._entradas[digest] = (claims, vence)
+            self._entradas.move_to_end(digest)
+            while len(self._entradas) > self.max_size:
+                self._entradas.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def is_revoked(self, token):
+        """Indica si el token fue revocado individualmente"""
+        with self._lock:
+            return token_digest(token) in self._revocados
+
+    def revoke(self, token, exp=None):
+        """Revoca un token concreto hasta su expiración"""
+        digest = token_digest(token)
+        ahora = time.time()
+        with self._lock:
+            self._entradas.pop(digest, None)
+            self._revocados[digest] = float(exp) if exp is not None else ahora + self.ttl
+            self._stats['revoked'] += 1
+            self._purgar_revocados(ahora)
+
+    def revoke_user(self, email):
+        """
+        Quita de la caché los tokens de un usuario, para que el siguiente uso
+        vuelva a leer su versión. Los rechaza la ``token_version`` del
+        miembro, que el llamador sube (``TokenVersions.bump``).
+        """
+        with self._lock:
+            for digest in [d for d, (claims, _) in self._entradas.items()
+                           if claims.get('email') == email]:
+                del self._entradas[digest]
+                self._stats['revoked'] += 1
+
+    def _purgar_revocados(self, ahora):
+        for digest in [d for d, exp in self._revocados.items() if exp <= ahora]:
+            del self._revocados[digest]
+
+    def clear(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def stats(self):
+        """Métricas de la caché para monitoreo"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entradas)
+            stats['max_size'] = self.max_size
+            stats['revoked_tokens'] = len(self._revocados)
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0.0
+        return stats
+
+
+class TokenVersions:
+    """
+    Versión vigente de los tokens de cada miembro.
+
+    Se conocen solo las versiones mayores que cero; los cambios hechos por
+    este proceso se registran al momento y los de otros workers se leen de
+    la base de datos cada ``refresh_interval`` segundos.
+    """
+
+    def __init__(self, refresh_interval=30):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._refrescando = threading.Lock()
+        self._versiones = {}
+        self._ultima_carga = None
+
+    def current(self, miembro_id):
+        return self._versiones.get(miembro_id, 0)
+
+    def is_outdated(self, principal):
+        return principal.version < self.current(principal.id)
+
+    def bump(self, miembro_id, version):
+        """Registra la nueva versión de un miembro"""
+        with self._lock:
+            if version > self._versiones.get(miembro_id, 0):
+                self._versiones[miembro_id] = version
+
+    def needs_refresh(self):
+        return (self._ultima_carga is None or
+                time.monotonic() - self._ultima_carga >= self.refresh_interval)
+
+    def refresh(self, loader):
+        """
+        Recarga las versiones con ``loader()``, que devuelve pares
+        ``(miembro_id, version)``. Solo un hilo recarga a la vez; los demás
+        siguen con las versiones conocidas.
+        """
+        if not self._refrescando.acquire(blocking=False):
+            return
+        try:
+            versiones = {int(mid): int(ver) for mid, ver in loader()}
+            with self._lock:
+                # Conserva los cambios locales que aún no se vean en la consulta
+                for mid, ver in self._versiones.items():
+                    if ver > versiones.get(mid, 0):
+                        versiones[mid] = ver
+                self._versiones = versiones
+                self._ultima_carga = time.monotonic()
+        finally:
+            self._refrescando.release()
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
-import { getClientes } from '../../services/clientesService';
+import dashboardService from '../../services/dashboardService';
 import { getClases, getClasesPopulares } from '../../services/clasesService';
 import { format } from 'date-fns';
 import { es } from 'date-fns/locale';
@@ -42,16 +42,13 @@ const Dashboard = () => {
   const [expiringLoading, setExpiringLoading] = useState(true);
   const [expiringError, setExpiringError] = useState(null);
   const [stats, setStats] = useState({
+    clients: 0,
     trainers: 0,
     activeClasses: 0,
     monthlyIncome: 0,
     loading: true,
     error: null
   });
-  const [clientes, setClientes] = useState([]);
-  const [clientesLoading, setClientesLoading] = useState(true);
-  const [entrenadores, setEntrenadores] = useState([]);
-  const [entrenadoresLoading, setEntrenadoresLoading] = useState(true);
   const [clases, setClases] = useState([]);
   const [clasesLoading, setClasesLoading] = useState(true);
   const [clasesPopulares, setClasesPopulares] = useState([]);
@@ -83,10 +80,14 @@ const Dashboard = () => {
     const fetchDashboardData = async () => {
       try {
         setStats(prev => ({ ...prev, loading: true, error: null }));
-        const income = 0; // Puedes restaurar lógica de ingresos si lo necesitas
+        // Todos los indicadores llegan en una sola solicitud
+        const data = await dashboardService.getDashboardStats();
         setStats(prev => ({
           ...prev,
-          monthlyIncome: income,
+          clients: data.miembros.clientes,
+          trainers: data.miembros.entrenadores,
+          activeClasses: data.clases.activas,
+          monthlyIncome: data.ingresos_mes.total,
           loading: false,
           error: null
         }));
@@ -100,49 +101,19 @@ const Dashboard = () => {
       }
     };
 
-    const fetchClientes = async () => {
-      try {
-        setClientesLoading(true);
-        const data = await getClientes();
-        setClientes(data);
-      } catch (err) {
-        setClientes([]);
-      } finally {
-        setClientesLoading(false);
-      }
-    };
-
-    const fetchEntrenadores = async () => {
-      try {
-        setEntrenadoresLoading(true);
-        const data = await getClientes('entrenador');
-        setEntrenadores(data);
-        setStats(prev => ({ ...prev, trainers: data.length }));
-      } catch (err) {
-        setEntrenadores([]);
-        setStats(prev => ({ ...prev, trainers: 0 }));
-      } finally {
-        setEntrenadoresLoading(false);
-      }
-    };
-
     const fetchClases = async () => {
       try {
         setClasesLoading(true);
         const data = await getClases();
         setClases(data);
-        setStats(prev => ({ ...prev, activeClasses: data.length }));
       } catch (err) {
         setClases([]);
-        setStats(prev => ({ ...prev, activeClasses: 0 }));
       } finally {
         setClasesLoading(false);
       }
     };
 
     fetchDashboardData();
-    fetchClientes();
-    fetchEntrenadores();
     fetchClases();
 
     // Obtener clases populares
@@ -193,19 +164,19 @@ const Dashboard = () => {
           <div className="admin-card clients">
             <span className="card-icon"><i className="bi bi-people-fill"></i></span>
             <span className="card-title">Total de Clientes</span>
-            <span className="card-value">{clientesLoading ? '...' : clientes.length}</span>
+            <span className="card-value">{stats.clients}</span>
             <Link to="/clientes" className="card-btn">Ver Clientes →</Link>
           </div>
           <div className="admin-card trainers">
             <span className="card-icon"><i className="bi bi-person-badge"></i></span>
             <span className="card-title">Entrenadores</span>
-            <span className="card-value">{entrenadoresLoading ? '...' : entrenadores.length}</span>
+            <span className="card-value">{stats.trainers}</span>
             <Link to="/entrenadores" className="card-btn">Ver Entrenadores →</Link>
           </div>
           <div className="admin-card classes">
             <span className="card-icon"><i className="bi bi-calendar-event"></i></span>
             <span className="card-title">Clases Activas</span>
-            <span className="card-value">{clasesLoading ? '...' : clases.length}</span>
+            <span className="card-value">{stats.activeClasses}</span>
             <Link to="/clases" className="card-btn">Ver Clases →</Link>
           </div>
           <div className="admin-card income">
@@ -22,6 +22,7 @@ export function AuthProvider({ children }) {
         } catch (error) {
           console.error('Error verificando la sesión:', error);
           localStorage.removeItem('token');
+          localStorage.removeItem('refresh_token');
           setCurrentUser(null);
         }
       }
@@ -25,6 +25,7 @@ const Clientes = () => {
   const [page, setPage] = useState(0);
   const [rowsPerPage, setRowsPerPage] = useState(5);
   const [searchTerm, setSearchTerm] = useState('');
+  const [resultadosBusqueda, setResultadosBusqueda] = useState(null);
   const [refresh, setRefresh] = useState(false);
   const [selectedMember, setSelectedMember] = useState(null);
   const [snackbar, setSnackbar] = useState({
@@ -151,25 +152,49 @@ const Clientes = () => {
     setSnackbar(prev => ({ ...prev, open: false }));
   };
 
-  // Filtrar clientes por término de búsqueda
-  const filteredClientes = clientes.filter(cliente => {
-    // Asegurarse de que el cliente y sus propiedades existan
-    if (!cliente) return false;
+  // Buscar en el servidor (índice por nombre, email y teléfono) al dejar de escribir
+  useEffect(() => {
+    const termino = searchTerm.trim();
+    if (!termino) {
+      setResultadosBusqueda(null);
+      return undefined;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const response = await api.get('/clientes/search', { params: { q: termino, limit: 100 } });
+        setResultadosBusqueda(response.data.miembros.map(miembro => miembro.id));
+      } catch (error) {
+        console.error('Error al buscar clientes:', error);
+        setResultadosBusqueda(null);
+      }
+    }, 250);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
+  // Resultados del servidor en orden de relevancia; si la búsqueda falla
+  // se filtra localmente
+  const filteredClientes = resultadosBusqueda
+    ? resultadosBusqueda
+        .map(id => clientes.find(cliente => cliente.id === id))
+        .filter(Boolean)
+    : clientes.filter(cliente => {
+        // Asegurarse de que el cliente y sus propiedades existan
+        if (!cliente) return false;
     
-    // Buscar en las propiedades relevantes
-    const searchableFields = [
-      'id',
-      'nombre',
-      'email',
-      'telefono',
-      'tipoMembresia'
-    ];
+        // Buscar en las propiedades relevantes
+        const searchableFields = [
+          'id',
+          'nombre',
+          'email',
+          'telefono',
+          'tipoMembresia'
+        ];
     
-    return searchableFields.some(field => {
-      const value = cliente[field];
-      return value && value.toString().toLowerCase().includes(searchTerm.toLowerCase());
-    });
-  });
+        return searchableFields.some(field => {
+          const value = cliente[field];
+          return value && value.toString().toLowerCase().includes(searchTerm.toLowerCase());
+        });
+      });
 
   // Paginación
   const emptyRows = rowsPerPage - Math.min(rowsPerPage, filteredClientes.length - page * rowsPerPage);
@@ -44,7 +44,7 @@ const Clientes = () => {
   // Función para cargar las asistencias de hoy
   const fetchAsistenciasHoy = async () => {
     try {
-      const response = await api.get('/api/asistencias/hoy');
+      const response = await api.get('/asistencias/hoy');
       setAsistenciasHoy(response.data?.asistencias || []);
     } catch (error) {
       console.error('Error al cargar asistencias de hoy:', error);
@@ -69,7 +69,7 @@ const Clientes = () => {
       }
 
       // Marcar asistencia
-      const url = '/api/asistencias/registrar_entrada';
+      const url = '/asistencias/registrar_entrada';
       console.log('Llamando a la API con URL:', api.defaults.baseURL + url);
       const response = await api.post(url, {
         miembro_id: clienteId,
@@ -43,11 +43,12 @@ const EntrenadorDashboard = () => {
       try {
         // Obtener el conteo de clientes y rutinas recientes con información de clientes
         const [clientesResponse, rutinasResponse] = await Promise.all([
-          api.get('/miembros'),
+          // Solo se necesita el total de clientes (rol_id = 3), no el listado
+          api.get('/miembros', { params: { rol: 3, limit: 1, fields: 'id' } }),
           api.get('/rutinas?limit=4&sort=fecha_asignacion:desc&expand=cliente')
         ]);
         
-        const todosLosMiembros = Array.isArray(clientesResponse.data) ? clientesResponse.data : [];
+        const paginacionClientes = clientesResponse.data?.paginacion || {};
         
         // Procesar las rutinas recientes
         if (rutinasResponse.data && Array.isArray(rutinasResponse.data.rutinas)) {
@@ -90,9 +91,8 @@ const EntrenadorDashboard = () => {
           setRecentActivities(actividades);
         }
 
-        // Filtrar solo los clientes (rol_id = 3 según la base de datos)
-        const clientes = todosLosMiembros.filter(miembro => miembro.rol_id === 3);
-        const totalClientes = clientes.length;
+        // Total de clientes (rol_id = 3 según la base de datos)
+        const totalClientes = paginacionClientes.total || 0;
 
         // Obtener clases de hoy basándose en los horarios
         let clasesHoy = 0;
@@ -245,10 +245,7 @@ const EntrenadorDashboard = () => {
         console.log('Dashboard data loaded:', {
           totalClientes,
           clasesHoy,
-          asistenciasHoy,
-          todosLosMiembros: todosLosMiembros.length,
-          clientesFiltrados: clientes.length,
-          rolesEncontrados: [...new Set(todosLosMiembros.map(m => m.rol_id))]
+          asistenciasHoy
         });
 
       } catch (error) {
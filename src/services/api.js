@@ -54,6 +54,41 @@ api.interceptors.response.use(
   }
 );
 
+// Formato compacto de listados (?format=columns): el backend envía
+// { columns: [...], rows: [[...], ...] } en lugar de un objeto por fila
+const esColumnar = (valor) =>
+  valor !== null && typeof valor === 'object' && Array.isArray(valor.columns) && Array.isArray(valor.rows);
+
+// Convierte { columns, rows } en la lista de objetos habitual
+export const decodeColumns = (valor) => {
+  if (!esColumnar(valor)) {
+    return valor;
+  }
+  const { columns, rows } = valor;
+  return rows.map((fila) => {
+    const objeto = {};
+    for (let i = 0; i < columns.length; i++) {
+      objeto[columns[i]] = fila[i];
+    }
+    return objeto;
+  });
+};
+
+// Las respuestas pedidas con format: 'columns' se decodifican aquí, así los
+// servicios reciben la misma forma que con el formato normal
+api.interceptors.response.use(response => {
+  if (response.config.params?.format === 'columns' && response.data && typeof response.data === 'object') {
+    if (esColumnar(response.data)) {
+      response.data = decodeColumns(response.data);
+    } else {
+      for (const clave of Object.keys(response.data)) {
+        response.data[clave] = decodeColumns(response.data[clave]);
+      }
+    }
+  }
+  return response;
+});
+
 // Asegurarse de que no haya doble barra en las URLs
 api.interceptors.request.use(config => {
   if (config.url) {
@@ -76,15 +111,55 @@ api.interceptors.request.use(
   }
 );
 
+// Renovación del access token con el refresh token. Las solicitudes que
+// fallen a la vez comparten la misma renovación
+let refreshEnCurso = null;
+
+const renovarToken = () => {
+  if (!refreshEnCurso) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    refreshEnCurso = axios
+      .post(`${API_CONFIG.BASE_URL}/auth/refresh`, { refresh_token: refreshToken }, {
+        timeout: API_CONFIG.TIMEOUT,
+        withCredentials: API_CONFIG.WITH_CREDENTIALS
+      })
+      .then((response) => {
+        localStorage.setItem('token', response.data.token);
+        localStorage.setItem('refresh_token', response.data.refresh_token);
+        return response.data.token;
+      })
+      .finally(() => {
+        refreshEnCurso = null;
+      });
+  }
+  return refreshEnCurso;
+};
+
 // Interceptor para manejar respuestas de error
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
     if (error.response) {
       // Token expirado o no válido
       if (error.response.status === 401) {
+        const original = error.config;
+        const esRutaAuth = /\/auth\/(login|refresh)/.test(original.url || '');
+
+        // Intentar una vez renovar el access token antes de cerrar la sesión
+        if (!original._reintento && !esRutaAuth && localStorage.getItem('refresh_token')) {
+          original._reintento = true;
+          try {
+            const token = await renovarToken();
+            original.headers.Authorization = `Bearer ${token}`;
+            return api(original);
+          } catch (refreshError) {
+            // La sesión ya no es válida; continuar con el cierre
+          }
+        }
+
         // Limpiar el token expirado
         localStorage.removeItem('token');
+        localStorage.removeItem('refresh_token');
         // Redirigir al login
         if (window.location.pathname !== '/login') {
           window.location.href = '/login?sessionExpired=true';
@@ -99,10 +174,11 @@ api.interceptors.response.use(
 export const authService = {
   login: async (credentials) => {
     const response = await api.post('/auth/login', credentials);
-    const { user, token } = response.data;
+    const { user, token, refresh_token } = response.data;
 
-    // Guardar el token en localStorage
+    // Guardar los tokens en localStorage
     localStorage.setItem('token', token);
+    localStorage.setItem('refresh_token', refresh_token);
 
     // Mapear los roles del backend a los roles del frontend
     const roleMap = {
@@ -139,11 +215,14 @@ export const authService = {
   },
   logout: async () => {
     try {
-      await api.post('/auth/logout');
+      await api.post('/auth/logout', {
+        refresh_token: localStorage.getItem('refresh_token')
+      });
     } catch (error) {
       console.error('Error en logout del servidor:', error);
     } finally {
       localStorage.removeItem('token');
+      localStorage.removeItem('refresh_token');
     }
   },
 };
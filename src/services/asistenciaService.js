@@ -89,3 +89,20 @@ export const obtenerAsistenciasPorMiembro = async (miembroId) => {
     throw error.response?.data || { message: 'Error al obtener el historial de asistencias' };
   }
 };
+
+/**
+ * Escucha la ocupación del gimnasio en vivo (pantallas de recepción)
+ * @param {Function} onOcupacion - Recibe { ocupacion, aforo, disponible, actualizado }
+ * @returns {Function} Función para dejar de escuchar
+ */
+export const escucharOcupacion = (onOcupacion) => {
+  // EventSource no envía encabezados: el token va en la URL
+  const token = localStorage.getItem('token');
+  const fuente = new EventSource(
+    `${API_URL}/asistencias/ocupacion/stream?access_token=${encodeURIComponent(token)}`
+  );
+  fuente.addEventListener('ocupacion', (evento) => {
+    onOcupacion(JSON.parse(evento.data));
+  });
+  return () => fuente.close();
+};
@@ -1,5 +1,6 @@
 import axios from 'axios';
 import API_CONFIG from '../config';
+import { listarMiembros } from './miembrosService';
 
 const API_URL = `${API_CONFIG.BASE_URL}/miembros`;
 
@@ -31,21 +32,9 @@ export const getClientes = async (rol = 'cliente', entrenadorId = null) => {
       return response.data;
     }
     
-    // Si no se especifica entrenadorId, obtenemos todos los clientes
-    const response = await axios.get(API_URL, config);
-    
-    // Si no se especifica un rol, devolvemos todos los miembros
-    if (!rol) {
-      return response.data;
-    }
-    
-    // Filtrar miembros por el rol especificado (insensible a mayúsculas/minúsculas)
-    const miembrosFiltrados = response.data.filter(miembro => {
-      const nombreRol = miembro.rol_nombre || 'cliente';
-      return nombreRol.toLowerCase() === rol.toLowerCase();
-    });
-    
-    return miembrosFiltrados;
+    // Si no se especifica entrenadorId, obtenemos los miembros del rol
+    // (el backend filtra por rol; sin rol devuelve todos)
+    return await listarMiembros(rol ? { rol: rol.toLowerCase() } : {});
   } catch (error) {
     console.error('Error al obtener los clientes:', error);
     throw error;
@@ -13,20 +13,8 @@ const dashboardService = {
   
   async getActiveClientsCount() {
     try {
-      // Primero intentamos con el endpoint de conteo
-      try {
-        const response = await api.get('/miembros/count?rol=cliente');
-        return response.data.count || 0;
-      } catch (apiError) {
-        console.log('Endpoint de conteo no disponible, contando localmente...');
-        // Si falla, obtenemos todos los clientes y contamos localmente
-        const response = await api.get('/miembros');
-        const clientes = Array.isArray(response.data) ? 
-          response.data.filter(miembro => 
-            String(miembro.rol || '').toLowerCase() === 'cliente'
-          ) : [];
-        return clientes.length;
-      }
+      const response = await api.get('/miembros/count', { params: { rol: 'cliente', activo: 1 } });
+      return response.data.count || 0;
     } catch (error) {
       console.error('Error contando clientes:', error);
       return 0;
@@ -35,26 +23,34 @@ const dashboardService = {
   
   async getTrainersCount() {
     try {
-      // Primero intentamos con el endpoint de conteo
-      try {
-        const response = await api.get('/miembros/count?rol=entrenador');
-        return response.data.count || 0;
-      } catch (apiError) {
-        console.log('Endpoint de conteo no disponible, contando localmente...');
-        // Si falla, obtenemos todos los entrenadores y contamos localmente
-        const response = await api.get('/miembros');
-        const entrenadores = Array.isArray(response.data) ? 
-          response.data.filter(miembro => 
-            String(miembro.rol || '').toLowerCase() === 'entrenador'
-          ) : [];
-        return entrenadores.length;
-      }
+      const response = await api.get('/miembros/count', { params: { rol: 'entrenador' } });
+      return response.data.count || 0;
     } catch (error) {
       console.error('Error contando entrenadores:', error);
       return 0;
     }
   },
   
+  async getPendingInvoicesCount() {
+    try {
+      const response = await api.get('/facturas/count', { params: { estado: 'pendiente' } });
+      return response.data.count || 0;
+    } catch (error) {
+      console.error('Error contando facturas pendientes:', error);
+      return 0;
+    }
+  },
+  
+  async getTodayAttendanceCount() {
+    try {
+      const response = await api.get('/asistencias/count');
+      return response.data.count || 0;
+    } catch (error) {
+      console.error('Error contando asistencias de hoy:', error);
+      return 0;
+    }
+  },
+  
   async getActiveClassesCount() {
     try {
       const response = await api.get('/clases/count?estado=activo');
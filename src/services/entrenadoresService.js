@@ -1,5 +1,6 @@
 import axios from 'axios';
 import API_CONFIG from '../config';
+import { listarMiembros } from './miembrosService';
 
 const API_URL = `${API_CONFIG.BASE_URL}/miembros`;
 
@@ -9,21 +10,9 @@ const API_URL = `${API_CONFIG.BASE_URL}/miembros`;
  */
 export const getEntrenadores = async () => {
   try {
-    const response = await axios.get(API_URL, {
-      withCredentials: true,
-      headers: {
-        'Content-Type': 'application/json',
-        'Authorization': `Bearer ${localStorage.getItem('token')}`
-      }
-    });
-    
-    // Filtrar solo los miembros con rol 'entrenador' y asegurar que tengan los campos necesarios
-    const entrenadores = response.data
-      .filter(miembro => {
-        const nombreRol = miembro.rol_nombre || '';
-        const esEntrenador = (miembro.rol_id === 2) || (nombreRol.toLowerCase() === 'entrenador');
-        return esEntrenador;
-      })
+    // Solo los miembros con rol 'entrenador' (rol_id = 2), asegurando los campos necesarios
+    const miembros = await listarMiembros({ rol: 2 });
+    const entrenadores = miembros
       .map(entrenador => {
         console.log('Procesando entrenador:', entrenador); // Para depuración
         return {
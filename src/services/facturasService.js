@@ -1,7 +1,7 @@
 import api from './api';
 
 export const getFacturas = async () => {
-  const { data } = await api.get('/facturas');
+  const { data } = await api.get('/facturas', { params: { format: 'columns' } });
   return data;
 };
 
@@ -1,10 +1,23 @@
 import api from './api';
 
+// Recorre todas las páginas de /miembros siguiendo el cursor
+export const listarMiembros = async (params = {}) => {
+  const miembros = [];
+  let cursor = null;
+  do {
+    const response = await api.get('/miembros', {
+      params: { limit: 500, format: 'columns', ...params, ...(cursor ? { cursor } : {}) }
+    });
+    miembros.push(...response.data.miembros);
+    cursor = response.data.paginacion.siguiente_cursor;
+  } while (cursor);
+  return miembros;
+};
+
 // Obtener todos los miembros
 export const getMiembros = async () => {
   try {
-    const response = await api.get('/miembros');
-    return response.data.miembros;
+    return await listarMiembros();
   } catch (error) {
     console.error('Error al obtener miembros:', error);
     throw error;
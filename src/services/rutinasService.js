@@ -45,7 +45,7 @@ export const getCategoriasEjercicios = async () => {
 // Obtener todos los ejercicios
 export const getEjercicios = async () => {
   try {
-    const response = await api.get('/ejercicios');
+    const response = await api.get('/ejercicios', { params: { format: 'columns' } });
     return response.data.ejercicios;
   } catch (error) {
     console.error('Error al obtener ejercicios:', error);
@@ -67,7 +67,7 @@ export const getEjerciciosPorCategoria = async (categoriaId) => {
 // Obtener todas las rutinas del entrenador
 export const getRutinas = async () => {
   try {
-    const response = await api.get('/rutinas');
+    const response = await api.get('/rutinas', { params: { format: 'columns' } });
     return response.data.rutinas;
   } catch (error) {
     console.error('Error al obtener rutinas:', error);
@@ -0,0 +1,49 @@
+import api from './api';
+
+// Réplica local de las tablas sincronizadas con /sync. Cada llamada trae
+// solo lo que cambió desde el token anterior
+const CLAVE_TOKEN = 'sync_token';
+
+const replica = {};
+
+const aplicarCambios = ({ completo, cambios, eliminados }) => {
+  for (const [tabla, filas] of Object.entries(cambios)) {
+    if (completo || !replica[tabla]) {
+      replica[tabla] = new Map();
+    }
+    for (const fila of filas) {
+      replica[tabla].set(fila.id, fila);
+    }
+  }
+  for (const [tabla, ids] of Object.entries(eliminados)) {
+    for (const id of ids) {
+      replica[tabla]?.delete(id);
+    }
+  }
+};
+
+// Trae los cambios pendientes y devuelve la réplica como listas por tabla
+export const sincronizar = async (tablas) => {
+  const params = {};
+  // Sin réplica en memoria (recarga de la página) se pide la copia completa
+  const token = localStorage.getItem(CLAVE_TOKEN);
+  if (token && Object.keys(replica).length > 0) {
+    params.since = token;
+  }
+  if (tablas) {
+    params.tablas = tablas.join(',');
+  }
+  const { data } = await api.get('/sync', { params });
+  aplicarCambios(data);
+  localStorage.setItem(CLAVE_TOKEN, data.token);
+  return Object.fromEntries(
+    Object.entries(replica).map(([tabla, filas]) => [tabla, Array.from(filas.values())])
+  );
+};
+
+export const reiniciarSincronizacion = () => {
+  localStorage.removeItem(CLAVE_TOKEN);
+  for (const tabla of Object.keys(replica)) {
+    delete replica[tabla];
+  }
+};
@@ -0,0 +1,138 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+import attendance
+
+
+class BaseCaida(Exception):
+    pass
+
+
+def cola(journal_dir, flush, **opciones):
+    # Sin hilo de guardado: los tests llaman a flush_pending
+    opciones.setdefault('interval', 3600)
+    opciones.setdefault('fsync', False)
+    return attendance.WriteBehindQueue(flush, str(journal_dir), name='prueba', **opciones)
+
+
+def entrada(miembro_id, uuid):
+    return {'tipo': 'entrada', 'registro_uuid': uuid, 'miembro_id': miembro_id,
+            'fecha_hora_entrada': '2026-01-05T18:10:00'}
+
+
+def test_flush_pending_writes_in_order(tmp_path):
+    guardados = []
+    queue = cola(tmp_path, guardados.extend, batch_size=2)
+    queue.start()
+    for i in range(5):
+        queue.submit(entrada(i, f'u{i}'))
+    # Con el lote lleno el hilo puede haber guardado una parte antes
+    assert queue.flush_pending()
+    assert [r['miembro_id'] for r in guardados] == list(range(5))
+    assert queue.pending() == []
+    queue.stop()
+
+
+def test_journal_replay_after_crash(tmp_path):
+    def caida(lote):
+        raise BaseCaida()
+
+    anterior = cola(tmp_path, caida)
+    anterior.start()
+    anterior.submit(entrada(1, 'a'))
+    anterior.submit(entrada(2, 'b'))
+    assert not anterior.flush_pending()
+    # El proceso se detiene sin guardar: el diario queda en disco
+    anterior._detenida = True
+
+    guardados = []
+    nueva = cola(tmp_path, guardados.extend)
+    nueva.start()
+    assert nueva.stats()['replayed'] == 2
+    assert [r['registro_uuid'] for r in nueva.pending()] == ['a', 'b']
+    assert nueva.flush_pending()
+    assert [r['registro_uuid'] for r in guardados] == ['a', 'b']
+    nueva.stop()
+    assert not [f for f in os.listdir(tmp_path) if f.endswith('.jsonl')]
+
+
+def test_journal_replay_skips_partial_line(tmp_path):
+    with open(tmp_path / f'prueba-{os.getpid()}-000001.jsonl', 'w', encoding='utf-8') as diario:
+        diario.write(json.dumps(entrada(1, 'a')) + '\n' + '{"tipo": "entr')
+    queue = cola(tmp_path, lambda lote: None)
+    queue.start()
+    assert [r['registro_uuid'] for r in queue.pending()] == ['a']
+    queue.stop()
+
+
+def test_transient_failure_keeps_records(tmp_path):
+    estado = {'caida': True}
+    guardados = []
+
+    def flush(lote):
+        if estado['caida']:
+            raise BaseCaida()
+        guardados.extend(lote)
+
+    queue = cola(tmp_path, flush)
+    queue.start()
+    queue.submit(entrada(1, 'a'))
+    assert not queue.flush_pending()
+    assert len(queue.pending()) == 1
+    estado['caida'] = False
+    assert queue.flush_pending()
+    assert [r['registro_uuid'] for r in guardados] == ['a']
+    queue.stop()
+
+
+def test_invalid_record_goes_to_dead_letter(tmp_path):
+    guardados = []
+
+    def flush(lote):
+        for registro in lote:
+            if registro['miembro_id'] < 0:
+                raise ValueError('miembro inválido')
+        guardados.extend(lote)
+
+    queue = cola(tmp_path, flush, batch_size=10)
+    queue.start()
+    for miembro_id, uuid in ((1, 'a'), (-1, 'b'), (2, 'c')):
+        queue.submit(entrada(miembro_id, uuid))
+    assert queue.flush_pending()
+    assert [r['registro_uuid'] for r in guardados] == ['a', 'c']
+    assert queue.stats()['dead_lettered'] == 1
+    with open(tmp_path / 'prueba-dead-letter.jsonl', encoding='utf-8') as descartes:
+        descartado = json.loads(descartes.readline())
+    assert descartado['registro']['registro_uuid'] == 'b'
+    queue.stop()
+
+
+def test_aplicar_registro():
+    sesiones = {}
+    attendance.aplicar_registro(sesiones, entrada(1, 'a'))
+    assert sesiones[1]['fecha_hora_entrada'] == datetime(2026, 1, 5, 18, 10)
+    attendance.aplicar_registro(sesiones, {'tipo': 'salida', 'miembro_id': 1, 'registro_uuid': 'otro'})
+    assert 1 in sesiones
+    attendance.aplicar_registro(sesiones, {'tipo': 'salida', 'miembro_id': 1, 'registro_uuid': 'a'})
+    assert sesiones == {}
+
+
+def test_session_tracker_merges_pending():
+    guardadas = [{'id': 10, 'registro_uuid': 'x', 'miembro_id': 1,
+                  'fecha_hora_entrada': datetime(2026, 1, 5, 8, 0)}]
+    pendientes = [entrada(2, 'a'), {'tipo': 'salida', 'miembro_id': 1, 'id': 10}]
+    tracker = attendance.SessionTracker(lambda: guardadas, lambda: pendientes)
+    tracker.refresh()
+    assert [s['miembro_id'] for s in tracker.sessions()] == [2]
+    version = tracker.occupancy()['version']
+    assert tracker.open({'id': None, 'registro_uuid': 'b', 'miembro_id': 3,
+                         'fecha_hora_entrada': datetime.now()}) is None
+    assert tracker.open({'id': None, 'registro_uuid': 'c', 'miembro_id': 3,
+                         'fecha_hora_entrada': datetime.now()})['registro_uuid'] == 'b'
+    assert tracker.occupancy()['ocupacion'] == 2
+    assert tracker.occupancy()['version'] == version + 1
+    assert tracker.close(3)['registro_uuid'] == 'b'
+    assert tracker.close(3) is None
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import cache
+
+
+def test_computes_once_within_ttl():
+    resultados = cache.ResultCache(ttl=60)
+    llamadas = []
+    calcular = lambda: llamadas.append(1) or len(llamadas)
+    assert resultados.get('a', calcular) == 1
+    assert resultados.get('a', calcular) == 1
+    assert len(llamadas) == 1
+
+
+def test_expires_after_ttl():
+    resultados = cache.ResultCache()
+    resultados.get('a', lambda: 1, ttl=0.01)
+    time.sleep(0.02)
+    assert resultados.get('a', lambda: 2) == 2
+
+
+def test_invalidate_by_table():
+    resultados = cache.ResultCache(ttl=60)
+    resultados.get('pagos', lambda: 1, tables=('facturas',))
+    resultados.get('miembros', lambda: 1, tables=('miembros',))
+    resultados.invalidate('facturas')
+    assert resultados.get('pagos', lambda: 2, tables=('facturas',)) == 2
+    assert resultados.get('miembros', lambda: 2, tables=('miembros',)) == 1
+
+
+def test_value_invalidated_while_computing_is_not_kept():
+    resultados = cache.ResultCache(ttl=60)
+
+    def calcular():
+        resultados.invalidate('facturas')
+        return 'viejo'
+
+    assert resultados.get('a', calcular, tables=('facturas',)) == 'viejo'
+    assert resultados.get('a', lambda: 'nuevo', tables=('facturas',)) == 'nuevo'
+
+
+def test_concurrent_misses_compute_once():
+    resultados = cache.ResultCache(ttl=60)
+    llamadas = []
+    listo = threading.Event()
+
+    def calcular():
+        llamadas.append(1)
+        listo.wait(1)
+        return 42
+
+    valores = []
+    hilos = [threading.Thread(target=lambda: valores.append(resultados.get('a', calcular))) for _ in range(5)]
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(0.05)
+    listo.set()
+    for hilo in hilos:
+        hilo.join()
+    assert valores == [42] * 5
+    assert len(llamadas) == 1
+
+
+def test_error_is_not_cached():
+    resultados = cache.ResultCache(ttl=60)
+
+    def falla():
+        raise RuntimeError('base de datos caída')
+
+    try:
+        resultados.get('a', falla)
+    except RuntimeError:
+        pass
+    assert resultados.get('a', lambda: 1) == 1
+
+
+def test_max_entries():
+    resultados = cache.ResultCache(ttl=60, max_entries=3)
+    for i in range(10):
+        resultados.get(i, lambda: i)
+    assert resultados.stats()['entries'] <= 3
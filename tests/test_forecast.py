@@ -0,0 +1,48 @@
+import numpy as np
+
+import forecast
+
+
+def historia(semanas=8, valor=4.0):
+    ocupacion = np.zeros((semanas * 7, 96))
+    ocupacion[:, 40:48] = valor
+    llegadas = np.zeros((semanas * 7, 96), dtype=np.int64)
+    llegadas[:, 40] = 3
+    return ocupacion, llegadas
+
+
+def test_flat_history_forecasts_the_same_level():
+    ocupacion, llegadas = historia()
+    resultado = forecast.forecast(ocupacion, llegadas, primer_dia=0, horizonte=14)
+    assert resultado['esperado'].shape == (14, 96)
+    assert np.allclose(resultado['esperado'][:, 40:48], 4.0)
+    assert np.allclose(resultado['alto'], resultado['esperado'])
+    assert np.allclose(resultado['entradas'][:, 40], 3.0)
+    assert resultado['dia_semana'].tolist() == [d % 7 for d in range(14)]
+
+
+def test_closed_days_are_ignored():
+    ocupacion, llegadas = historia()
+    ocupacion[-7] = 0.0  # Un lunes cerrado
+    resultado = forecast.forecast(ocupacion, llegadas, primer_dia=0, horizonte=7)
+    assert np.allclose(resultado['esperado'][0, 40:48], 4.0)
+
+
+def test_high_band_covers_variation():
+    ocupacion, llegadas = historia()
+    ocupacion[::2, 40:48] = 6.0
+    resultado = forecast.forecast(ocupacion, llegadas, primer_dia=0, horizonte=7)
+    assert np.all(resultado['alto'][:, 40:48] > resultado['esperado'][:, 40:48])
+
+
+def test_trend_raises_forecast():
+    ocupacion, llegadas = historia()
+    crecimiento = np.linspace(0.7, 1.3, len(ocupacion))[:, None]
+    resultado = forecast.forecast(ocupacion * crecimiento, llegadas, primer_dia=0, horizonte=7)
+    ultimo = (ocupacion * crecimiento)[-7:, 40].mean()
+    assert resultado['esperado'][:, 40].mean() > ultimo * 0.98
+
+
+def test_trend_factors_need_two_weeks():
+    factores = forecast.trend_factors(np.ones(10), np.arange(10) % 7, np.ones(10), [10, 11])
+    assert factores.tolist() == [1.0, 1.0]
@@ -0,0 +1,65 @@
+import numpy as np
+
+import heatmap
+
+HORA = 3600
+DIA = 24 * HORA
+
+
+def test_franjas():
+    etiquetas = heatmap.franjas()
+    assert len(etiquetas) == 96
+    assert etiquetas[:2] == ['00:00', '00:15'] and etiquetas[-1] == '23:45'
+
+
+def test_presence_splits_stay_across_slots():
+    # 18:10 a 19:30
+    segundos = heatmap.presence(np.array([18 * HORA + 600.0]), np.array([19.5 * HORA]), DIA)
+    franja = 18 * 4
+    assert segundos[franja] == 300
+    assert np.all(segundos[franja + 1:franja + 6] == 900)
+    assert segundos[franja - 1] == 0 and segundos[franja + 6] == 0
+    assert segundos.sum() == 80 * 60
+
+
+def test_presence_caps_open_and_forgotten_sessions():
+    entradas = np.array([HORA, 10 * HORA])
+    salidas = np.array([np.nan, 20 * HORA])
+    segundos = heatmap.presence(entradas, salidas, DIA, max_estancia=2 * HORA)
+    assert segundos.sum() == 4 * HORA
+    # Con ahora, la sesión abierta termina en ese instante
+    segundos = heatmap.presence(entradas[:1], salidas[:1], DIA, ahora=HORA + 900, max_estancia=2 * HORA)
+    assert segundos.sum() == 900
+
+
+def test_presence_clips_to_range():
+    segundos = heatmap.presence(np.array([-HORA]), np.array([HORA]), DIA)
+    assert segundos.sum() == HORA
+
+
+def test_daily_counts_arrivals():
+    entradas = np.array([8 * HORA, 8 * HORA + 60, DIA + 9 * HORA])
+    salidas = entradas + HORA
+    ocupacion, llegadas = heatmap.daily(entradas, salidas, 2)
+    assert ocupacion.shape == llegadas.shape == (2, 96)
+    assert llegadas[0, 32] == 2 and llegadas[1, 36] == 1 and llegadas.sum() == 3
+    assert ocupacion[0, 33] == 2.0
+
+
+def test_weekly_averages_by_weekday():
+    # Dos lunes seguidos (primer día lunes, 8 días): 1 y 3 personas a las 10:00
+    entradas = np.array([10 * HORA, 7 * DIA + 10 * HORA, 7 * DIA + 10 * HORA, 7 * DIA + 10 * HORA])
+    salidas = entradas + 900
+    semana = heatmap.weekly(entradas, salidas, 0, 8)
+    assert semana['dias_por_semana'].tolist() == [2, 1, 1, 1, 1, 1, 1]
+    assert semana['promedio'][0, 40] == 2.0
+    assert semana['maximo'][0, 40] == 3.0
+    assert semana['entradas'][0, 40] == 2.0
+
+
+def test_to_arrays():
+    entradas, salidas = heatmap.to_arrays([[(1, 2), (3, None)], [], [(5, 6)]])
+    assert entradas.tolist() == [1, 3, 5]
+    assert np.isnan(salidas[1])
+    entradas, salidas = heatmap.to_arrays([])
+    assert len(entradas) == 0
@@ -0,0 +1,51 @@
+import permissions
+
+PERMISOS = [(1, 'gestionar_clientes'), (2, 'ver_reportes'), (3, 'gestionar_usuarios')]
+
+
+def engine(asignaciones, version=1):
+    estado = {'version': version, 'asignaciones': asignaciones, 'cargas': 0}
+
+    def loader(actual):
+        estado['cargas'] += 1
+        if actual == estado['version']:
+            return None
+        return estado['version'], PERMISOS, estado['asignaciones']
+
+    return permissions.PermissionEngine(loader, refresh_interval=0), estado
+
+
+def test_allows_by_role():
+    motor, _ = engine([('admin', 1), ('admin', 2), ('admin', 3), ('entrenador', 1)])
+    motor.refresh()
+    assert motor.allows('admin', 'gestionar_clientes', 'ver_reportes')
+    assert motor.allows('entrenador', 'gestionar_clientes')
+    assert not motor.allows('entrenador', 'ver_reportes')
+    assert not motor.allows('cliente', 'gestionar_clientes')
+
+
+def test_unknown_permission_is_denied():
+    motor, _ = engine([('admin', 1)])
+    motor.refresh()
+    assert motor.mask('no_existe') is None
+    assert not motor.allows('admin', 'no_existe')
+
+
+def test_permissions_of():
+    motor, _ = engine([('entrenador', 2), ('entrenador', 1)])
+    motor.refresh()
+    assert motor.permissions_of('entrenador') == ['gestionar_clientes', 'ver_reportes']
+    assert motor.permissions_of('otro') == []
+
+
+def test_reloads_only_when_version_changes():
+    motor, estado = engine([('entrenador', 1)])
+    motor.refresh()
+    motor.refresh()
+    assert motor.stats()['reloads'] == 1
+    estado['version'] = 2
+    estado['asignaciones'] = [('entrenador', 2)]
+    motor.refresh()
+    assert motor.stats()['reloads'] == 2
+    assert motor.allows('entrenador', 'ver_reportes')
+    assert not motor.allows('entrenador', 'gestionar_clientes')
@@ -0,0 +1,111 @@
+import search
+
+MIEMBROS = [
+    {'id': 1, 'nombre': 'José Pérez', 'email': 'jperez@gym.com', 'telefono': '555-123-4567', 'rol_id': 3},
+    {'id': 2, 'nombre': 'María García', 'email': 'maria.garcia@gym.com', 'telefono': '5559876543', 'rol_id': 3},
+    {'id': 3, 'nombre': 'Mario Gómez', 'email': 'mgomez@gym.com', 'telefono': None, 'rol_id': 2},
+    {'id': 4, 'nombre': 'Ana Martínez', 'email': 'ana@gym.com', 'telefono': '5550001111', 'rol_id': 3},
+]
+
+
+def fila(miembro, fecha=1):
+    return dict({campo: None for campo in search.CAMPOS}, **miembro, activo=1, fecha_actualizacion=fecha)
+
+
+def ids(resultados):
+    return [miembro['id'] for miembro in resultados]
+
+
+def test_normalize():
+    assert search.normalize('José.Pérez') == 'jose perez'
+    assert search.normalize('  MARÍA  ') == 'maria'
+
+
+def test_exact_prefix_and_accents():
+    indice = search._Indice.build([fila(m) for m in MIEMBROS])
+    assert ids(indice.search('jose perez')) == [1]
+    assert ids(indice.search('perez')) == [1]
+    assert set(ids(indice.search('mar'))) == {2, 3, 4}
+    assert ids(indice.search('garcía')) == [2]
+
+
+def test_typo_tolerance():
+    indice = search._Indice.build([fila(m) for m in MIEMBROS])
+    assert ids(indice.search('garica'))[:1] == [2]
+    assert ids(indice.search('martinex'))[:1] == [4]
+
+
+def test_exact_scores_above_prefix():
+    indice = search._Indice.build([fila(m) for m in MIEMBROS])
+    resultados = indice.search('mario')
+    assert resultados[0]['id'] == 3
+    assert resultados[0]['score'] == search.EXACTO
+
+
+def test_phone_and_email():
+    indice = search._Indice.build([fila(m) for m in MIEMBROS])
+    assert ids(indice.search('555 123 4567')) == [1]
+    assert ids(indice.search('mgomez@gym.com')) == [3]
+
+
+def test_role_filter_and_limit():
+    indice = search._Indice.build([fila(m) for m in MIEMBROS])
+    assert ids(indice.search('mar', rol_id=2)) == [3]
+    assert len(indice.search('mar', limit=2)) == 2
+
+
+def test_member_index_applies_changes_and_deletions():
+    filas = {m['id']: fila(m) for m in MIEMBROS}
+    eliminados = []
+
+    def loader(desde):
+        if desde is None:
+            return list(filas.values()), []
+        return ([f for f in filas.values() if f['fecha_actualizacion'] >= desde],
+                [e for e in eliminados if e['fecha_actualizacion'] >= desde])
+
+    indice = search.MemberIndex(loader, refresh_interval=0)
+    indice.refresh()
+    assert ids(indice.search('maria garcia')) == [2]
+
+    # Otro worker elimina a María y agrega a alguien: el total no cambia
+    del filas[2]
+    eliminados.append({'id': 2, 'fecha_actualizacion': 2})
+    filas[5] = fila({'id': 5, 'nombre': 'Lucía Garrido', 'email': 'lucia@gym.com'}, fecha=2)
+    indice.refresh()
+    assert indice.search('maria garcia') == []
+    assert ids(indice.search('lucia')) == [5]
+    assert indice.get(2) is None
+    assert indice.stats()['reloads'] == 1
+
+
+def test_member_index_full_rebuild():
+    cargas = []
+
+    def loader(desde):
+        cargas.append(desde)
+        return [fila(m) for m in MIEMBROS], []
+
+    indice = search.MemberIndex(loader, refresh_interval=0, rebuild_interval=0)
+    indice.refresh()
+    indice.refresh()
+    assert cargas == [None, None]
+
+
+def test_member_index_upsert_remove_and_compaction(monkeypatch):
+    monkeypatch.setattr(search, 'MAX_PENDIENTES', 2)
+    indice = search.MemberIndex(
+        lambda desde: ([fila(m) for m in MIEMBROS] if desde is None else [], []), refresh_interval=0)
+    indice.refresh()
+    indice.upsert(fila({'id': 1, 'nombre': 'José Pereira', 'email': 'jpereira@gym.com'}))
+    indice.remove(4)
+    indice.upsert(fila({'id': 6, 'nombre': 'Ana Torres', 'email': 'atorres@gym.com'}))
+    assert ids(indice.search('pereira')) == [1]
+    assert ids(indice.search('ana')) == [6]
+
+    indice._compactar()
+    assert indice.stats()['pending'] == 0
+    assert ids(indice.search('pereira')) == [1]
+    assert ids(indice.search('ana')) == [6]
+    assert indice.get(4) is None
+    assert indice.stats()['members'] == 4
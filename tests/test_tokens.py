@@ -0,0 +1,80 @@
+import time
+
+import tokens
+
+
+def claims(email='ana@gym.com', exp=None):
+    return dict(tokens.Principal(1, email, 'admin', ['ver_reportes']).to_claims(),
+                exp=exp if exp is not None else time.time() + 60)
+
+
+def test_principal_round_trip():
+    principal = tokens.Principal(7, 'ana@gym.com', 'entrenador', ['b', 'a'], version=3)
+    copia = tokens.Principal.from_claims(principal.to_claims())
+    assert (copia.id, copia.email, copia.role, copia.version) == (7, 'ana@gym.com', 'entrenador', 3)
+    assert copia.has_permission('a') and not copia.has_permission('c')
+
+
+def test_principal_from_incomplete_claims():
+    assert tokens.Principal.from_claims({'email': 'ana@gym.com'}) is None
+    assert tokens.Principal.from_claims({'uid': 'x', 'email': 'a', 'rol': 'admin'}) is None
+
+
+def test_cache_hit_and_miss():
+    cache = tokens.TokenCache()
+    assert cache.get('a') is None
+    cache.put('a', claims())
+    assert cache.get('a')['email'] == 'ana@gym.com'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_cache_does_not_outlive_exp():
+    cache = tokens.TokenCache(ttl=300)
+    cache.put('vencido', claims(exp=time.time() - 1))
+    assert cache.get('vencido') is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = tokens.TokenCache(max_size=2)
+    cache.put('a', claims())
+    cache.put('b', claims())
+    cache.get('a')
+    cache.put('c', claims())
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+
+
+def test_revoke_single_token():
+    cache = tokens.TokenCache()
+    cache.put('a', claims())
+    cache.revoke('a', exp=time.time() + 60)
+    assert cache.is_revoked('a')
+    assert not cache.is_revoked('b')
+    assert cache.get('a') is None
+
+
+def test_revoke_user_evicts_only_that_user():
+    cache = tokens.TokenCache()
+    cache.put('a', claims('ana@gym.com'))
+    cache.put('b', claims('luis@gym.com'))
+    cache.revoke_user('ana@gym.com')
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+
+
+def test_versions_reject_older_tokens():
+    versiones = tokens.TokenVersions()
+    principal = tokens.Principal(1, 'ana@gym.com', 'admin', version=0)
+    assert not versiones.is_outdated(principal)
+    versiones.bump(1, 1)
+    assert versiones.is_outdated(principal)
+    assert not versiones.is_outdated(tokens.Principal(1, 'ana@gym.com', 'admin', version=1))
+
+
+def test_versions_refresh_keeps_newer_local_bumps():
+    versiones = tokens.TokenVersions()
+    versiones.bump(1, 5)
+    versiones.refresh(lambda: [(1, 4), (2, 2)])
+    assert versiones.current(1) == 5
+    assert versiones.current(2) == 2
+    assert not versiones.needs_refresh()